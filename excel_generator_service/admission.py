@@ -0,0 +1,152 @@
+"""Control de admisión con carriles de prioridad para las exportaciones.
+
+Las solicitudes se clasifican por costo estimado (filas × columnas del payload):
+los formularios y listas pequeñas van al carril ``interactive`` y las
+exportaciones grandes al carril ``bulk``. Cada carril tiene su propio límite
+de concurrencia y una cola acotada; cuando la cola está llena se rechaza la
+solicitud con ``LaneFullError`` (el servicio responde 429 + ``Retry-After``).
+"""
+import asyncio
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+LANE_INTERACTIVE = "interactive"
+LANE_BULK = "bulk"
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class LaneFullError(Exception):
+    """La cola del carril está llena; el cliente debe reintentar más tarde."""
+
+    def __init__(self, lane: str, retry_after: int):
+        super().__init__(f"Queue for lane '{lane}' is full")
+        self.lane = lane
+        self.retry_after = retry_after
+
+
+class _Lane:
+    """Carril con concurrencia limitada, cola acotada y métricas de espera."""
+
+    def __init__(self, name: str, concurrency: int, max_queue: int):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max(0, max_queue)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self.active = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.total_wait_s = 0.0
+        self.max_wait_s = 0.0
+        self.last_wait_s = 0.0
+        self.total_service_s = 0.0
+
+    def retry_after(self) -> int:
+        """Segundos estimados hasta que se libere lugar en la cola."""
+        avg_service = (self.total_service_s / self.completed) if self.completed else 1.0
+        return max(1, math.ceil(avg_service * (self.queued + 1) / self.concurrency))
+
+    async def acquire(self) -> float:
+        if self.active >= self.concurrency and self.queued >= self.max_queue:
+            self.rejected += 1
+            raise LaneFullError(self.name, self.retry_after())
+
+        self.queued += 1
+        started = time.monotonic()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+
+        waited = time.monotonic() - started
+        self.active += 1
+        self.admitted += 1
+        self.total_wait_s += waited
+        self.last_wait_s = waited
+        self.max_wait_s = max(self.max_wait_s, waited)
+        return waited
+
+    def release(self, service_s: float):
+        self.active -= 1
+        self.completed += 1
+        self.total_service_s += service_s
+        self._semaphore.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queue_depth": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "wait_ms_avg": round(1000 * self.total_wait_s / self.admitted, 2) if self.admitted else 0.0,
+            "wait_ms_max": round(1000 * self.max_wait_s, 2),
+            "wait_ms_last": round(1000 * self.last_wait_s, 2),
+            "service_ms_avg": round(1000 * self.total_service_s / self.completed, 2) if self.completed else 0.0,
+        }
+
+
+class AdmissionController:
+    """Enruta cada exportación al carril que le corresponde según su costo."""
+
+    def __init__(
+        self,
+        bulk_cost_threshold: int,
+        interactive_concurrency: int,
+        interactive_max_queue: int,
+        bulk_concurrency: int,
+        bulk_max_queue: int,
+    ):
+        self.bulk_cost_threshold = bulk_cost_threshold
+        self.lanes = {
+            LANE_INTERACTIVE: _Lane(LANE_INTERACTIVE, interactive_concurrency, interactive_max_queue),
+            LANE_BULK: _Lane(LANE_BULK, bulk_concurrency, bulk_max_queue),
+        }
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        cpus = os.cpu_count() or 1
+        return cls(
+            bulk_cost_threshold=_env_int("EXCEL_BULK_COST_THRESHOLD", 5000),
+            interactive_concurrency=_env_int("EXCEL_INTERACTIVE_CONCURRENCY", 4),
+            interactive_max_queue=_env_int("EXCEL_INTERACTIVE_MAX_QUEUE", 32),
+            bulk_concurrency=_env_int("EXCEL_BULK_CONCURRENCY", max(1, cpus // 2)),
+            bulk_max_queue=_env_int("EXCEL_BULK_MAX_QUEUE", 4),
+        )
+
+    def classify(self, cost: int) -> str:
+        return LANE_BULK if cost >= self.bulk_cost_threshold else LANE_INTERACTIVE
+
+    @asynccontextmanager
+    async def admit(self, cost: int, lane: Optional[str] = None):
+        """Reserva un lugar en el carril; lanza ``LaneFullError`` si la cola está llena."""
+        selected = self.lanes[lane or self.classify(cost)]
+        await selected.acquire()
+        started = time.monotonic()
+        try:
+            yield selected
+        finally:
+            selected.release(time.monotonic() - started)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "bulk_cost_threshold": self.bulk_cost_threshold,
+            "lanes": {name: lane.snapshot() for name, lane in self.lanes.items()},
+        }
+
+
+def estimate_cost(rows: int, columns: int) -> int:
+    """Costo aproximado de una exportación: número de celdas a escribir."""
+    return max(0, rows) * max(1, columns)
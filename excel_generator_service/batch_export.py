@@ -0,0 +1,376 @@
+"""Exportación por lotes fuera de línea, con los mismos generadores que los endpoints.
+
+Cada job es un objeto JSON con el mismo payload que recibe el endpoint del
+reporte (``items``, ``years_data``, ``source``, ``format``, ``strings``,
+``split``...) más tres llaves propias:
+
+- ``report``: jumpers, computo, sicor, bitacora o sdr;
+- ``id`` (opcional): nombre del job; por defecto el nombre del archivo (y el
+  número de línea en NDJSON);
+- ``output`` (opcional): ruta del archivo dentro de ``--out``; la extensión la
+  decide el formato (``.xlsx``, ``.csv`` o ``.zip`` si se divide en libros).
+
+Las entradas pueden ser archivos ``.json`` (un job o una lista de jobs),
+archivos NDJSON (un job por línea), directorios (se recorren los ``.json`` y
+``.ndjson``) o ``-`` para leer NDJSON de la entrada estándar.
+
+Los jobs se reparten en un pool de procesos (``EXCEL_WORKER_PROCESSES``, por
+defecto todos los núcleos) y cada proceso escribe su archivo. En
+``--out/.batch_manifest.json`` se guarda la huella de cada job (payload,
+versión de la plantilla y de openpyxl); en la siguiente corrida se omiten los
+jobs cuya huella no cambió y cuyo archivo sigue en disco (``--force`` los
+regenera todos). Los jobs con ``source`` se generan siempre: sus filas salen
+de Postgres y pueden cambiar sin que cambie el job.
+
+Uso (desde excel_generator_service/):
+    python batch_export.py jobs/ --out salida/
+    cat jobs.ndjson | python batch_export.py - --out salida/ --workers 4
+"""
+import argparse
+import asyncio
+import glob
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+import zipfile
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import openpyxl
+from fastapi import HTTPException
+
+import main
+from fast_formats import FORMAT_XLSX, FORMATS
+from sheet_cache import template_version
+from split_policy import MODE_WORKBOOKS
+from string_table import STRING_ENCODINGS, STRINGS_INLINE
+from workers import worker_count
+from xlsx_parts import zip_entry
+
+logger = logging.getLogger(__name__)
+
+# Se incrementa cuando cambia lo que se genera para un mismo job
+BATCH_FORMAT_VERSION = 1
+MANIFEST_NAME = ".batch_manifest.json"
+
+BATCH_REPORTS = ("jumpers", "computo", "sicor", "bitacora", "sdr")
+JOB_KEYS = ("id", "report", "output")
+
+
+class JobError(ValueError):
+    """El job no es válido o su reporte no se pudo generar"""
+
+
+@dataclass
+class JobResult:
+    job_id: str
+    fingerprint: str
+    output: Optional[str] = None
+    rows: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+
+def _stem(path: str) -> str:
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _iter_ndjson(lines, stem: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if line:
+            yield f"{stem}-{number:04d}", json.loads(line)
+
+
+def _iter_file(path: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    stem = _stem(path)
+    with open(path, encoding="utf-8") as f:
+        if not path.endswith(".json"):
+            yield from _iter_ndjson(f, stem)
+            return
+        data = json.load(f)
+    if isinstance(data, list):
+        for number, job in enumerate(data, start=1):
+            yield f"{stem}-{number:04d}", job
+    else:
+        yield stem, data
+
+
+def iter_jobs(inputs: List[str]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """(id, job) de cada entrada, en orden; falla si dos jobs tienen el mismo id"""
+    seen = set()
+    for source in inputs:
+        if source == "-":
+            jobs = _iter_ndjson(sys.stdin, "stdin")
+        elif os.path.isdir(source):
+            paths = sorted(glob.glob(os.path.join(source, "**", "*.json"), recursive=True)
+                           + glob.glob(os.path.join(source, "**", "*.ndjson"), recursive=True))
+            jobs = (job for path in paths for job in _iter_file(path))
+        else:
+            jobs = _iter_file(source)
+        for default_id, job in jobs:
+            if not isinstance(job, dict):
+                raise JobError(f"{default_id}: job must be a JSON object")
+            job_id = str(job.get("id") or default_id)
+            if job_id in seen:
+                raise JobError(f"duplicated job id: {job_id}")
+            seen.add(job_id)
+            yield job_id, job
+
+
+def _report_template(report: str) -> str:
+    if report == "bitacora":
+        return main.TEMPLATE_PATH_BITACORA
+    if report == "sdr":
+        return main.TEMPLATE_PATH_SDR
+    return main.REPORTS[report].template_path
+
+
+def job_fingerprint(job: Dict[str, Any]) -> str:
+    """Huella del job: payload, versión de la plantilla del reporte y de openpyxl"""
+    template = _report_template(job["report"]) if job.get("report") in BATCH_REPORTS else ""
+    version = template_version(template) if template and os.path.exists(template) else ""
+    h = hashlib.sha256()
+    h.update(json.dumps([BATCH_FORMAT_VERSION, version, openpyxl.__version__]).encode("utf-8"))
+    h.update(json.dumps(job, sort_keys=True, default=str, ensure_ascii=False).encode("utf-8"))
+    return h.hexdigest()
+
+
+_LOOP: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _init_worker():
+    # Un event loop por proceso: las consultas de "source" reutilizan el pool de Postgres entre jobs
+    global _LOOP
+    logging.getLogger().setLevel(logging.WARNING)
+    _LOOP = asyncio.new_event_loop()
+
+
+@contextmanager
+def _payload_errors():
+    # Las validaciones de los endpoints responden HTTPException: aquí son errores del job
+    try:
+        yield
+    except HTTPException as e:
+        raise JobError(str(e.detail))
+
+
+def _run(coroutine):
+    if _LOOP is None:
+        _init_worker()
+    with _payload_errors():
+        return _LOOP.run_until_complete(coroutine)
+
+
+def _output_path(out_dir: str, job_id: str, job: Dict[str, Any], extension: str) -> str:
+    relative = os.path.splitext(job.get("output") or job_id)[0] + f".{extension}"
+    path = os.path.abspath(os.path.join(out_dir, relative))
+    if os.path.commonpath([path, os.path.abspath(out_dir)]) != os.path.abspath(out_dir):
+        raise JobError(f"output must be inside the output directory: {relative}")
+    return path
+
+
+def _write_atomic(path: str, chunks) -> int:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    size = 0
+    try:
+        with open(tmp_path, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                size += len(chunk)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return size
+
+
+def _write_parts(path: str, parts, strings: str) -> int:
+    """ZIP con un libro por parte (como la respuesta dividida del endpoint), generados en orden"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        # Los .xlsx ya vienen comprimidos; guardarlos sin recomprimir
+        with zipfile.ZipFile(tmp_path, mode="w", compression=zipfile.ZIP_STORED) as zf:
+            for filename, builder, arg in parts:
+                file_bytes = main._render_encoded_workbook(strings, builder, arg)
+                zf.writestr(zip_entry(filename, zipfile.ZIP_STORED), file_bytes)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return os.path.getsize(path)
+
+
+def _render_job(job_id: str, job: Dict[str, Any], out_dir: str) -> Tuple[str, int, int]:
+    """Genera el archivo del job; regresa (ruta, filas, bytes)"""
+    report = job.get("report")
+    if report not in BATCH_REPORTS:
+        raise JobError(f"report must be one of: {', '.join(BATCH_REPORTS)}")
+    fmt = job.get("format") or FORMAT_XLSX
+    if fmt not in FORMATS:
+        raise JobError(f"format must be one of: {', '.join(FORMATS)}")
+    strings = job.get("strings") or STRINGS_INLINE
+    if strings not in STRING_ENCODINGS:
+        raise JobError(f"strings must be one of: {', '.join(STRING_ENCODINGS)}")
+    payload = {key: value for key, value in job.items() if key not in JOB_KEYS}
+    datestamp = main._datestamp()
+
+    if report == "bitacora":
+        years_data = _run(main._resolve_years_data(payload))
+        rows = sum(len(yd.get("items") or []) for yd in years_data)
+        if fmt != FORMAT_XLSX:
+            body, _, extension = main._fast_format_body(fmt, main._bitacora_fast_sheets(years_data),
+                                                        leading_header="AÑO", strings=strings)
+            path = _output_path(out_dir, job_id, job, extension)
+            return path, rows, _write_atomic(path, body)
+        with _payload_errors():
+            policy = main._get_split_policy(payload, main.BITACORA_FIRST_ROW)
+        year_plans = main._plan_bitacora(policy, years_data)
+        if any(plan.mode == MODE_WORKBOOKS for _, plan in year_plans):
+            path = _output_path(out_dir, job_id, job, "zip")
+            return path, rows, _write_parts(path, main._bitacora_parts(year_plans, datestamp), strings)
+        # El paralelismo es entre jobs: cada proceso construye el libro completo (sin el pool por año)
+        file_bytes = main._render_encoded_workbook(strings, main._build_bitacora_workbook, years_data,
+                                                   policy.max_rows_per_sheet)
+        path = _output_path(out_dir, job_id, job, "xlsx")
+        return path, rows, _write_atomic(path, [file_bytes])
+
+    if report == "sdr":
+        with _payload_errors():
+            items = main._get_items(payload)
+        if fmt != FORMAT_XLSX:
+            body, _, extension = main._fast_format_body(fmt, main._sdr_fast_sheets(items))
+            path = _output_path(out_dir, job_id, job, extension)
+            return path, len(items), _write_atomic(path, body)
+        path = _output_path(out_dir, job_id, job, "xlsx")
+        return path, 1, _write_atomic(path, [main._render_sdr(items)])
+
+    spec = main.REPORTS[report]
+    items = _run(main._resolve_items(report, payload))
+    if fmt != FORMAT_XLSX:
+        sheets = [(spec.name, main.report_headers(spec.name), main._report_rows(spec.name, items))]
+        body, _, extension = main._fast_format_body(fmt, sheets, strings=strings)
+        path = _output_path(out_dir, job_id, job, extension)
+        return path, len(items), _write_atomic(path, body)
+    with _payload_errors():
+        plan = main._plan_list_report(spec, payload, items)
+    if plan.mode == MODE_WORKBOOKS:
+        path = _output_path(out_dir, job_id, job, "zip")
+        return path, len(items), _write_parts(path, main._list_report_parts(spec, plan, datestamp), strings)
+    path = _output_path(out_dir, job_id, job, "xlsx")
+    return path, len(items), _write_atomic(path, [main._render_list_report(strings, spec, plan)])
+
+
+def run_job(job_id: str, job: Dict[str, Any], fingerprint: str, out_dir: str) -> JobResult:
+    start = time.perf_counter()
+    try:
+        path, rows, size = _render_job(job_id, job, out_dir)
+    except (JobError, ValueError, OSError) as e:
+        return JobResult(job_id, fingerprint, error=str(e), seconds=time.perf_counter() - start)
+    except Exception as e:
+        logger.exception(f"Error generating job {job_id}")
+        return JobResult(job_id, fingerprint, error=f"{type(e).__name__}: {e}", seconds=time.perf_counter() - start)
+    return JobResult(job_id, fingerprint, os.path.relpath(path, out_dir), rows, size, time.perf_counter() - start)
+
+
+def load_manifest(out_dir: str) -> Dict[str, Dict[str, Any]]:
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f).get("jobs", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(out_dir: str, jobs: Dict[str, Dict[str, Any]]):
+    data = json.dumps({"format": BATCH_FORMAT_VERSION, "jobs": jobs}, indent=1, ensure_ascii=False)
+    _write_atomic(os.path.join(out_dir, MANIFEST_NAME), [data.encode("utf-8")])
+
+
+def _is_current(job: Dict[str, Any], entry: Optional[Dict[str, Any]], fingerprint: str, out_dir: str) -> bool:
+    # La huella no incluye las filas de Postgres: un job con "source" nunca está al día
+    if job.get("source") is not None:
+        return False
+    return (entry is not None and entry.get("fingerprint") == fingerprint and entry.get("output") is not None
+            and os.path.exists(os.path.join(out_dir, entry["output"])))
+
+
+def run_batch(inputs: List[str], out_dir: str, workers: int, force: bool = False) -> Dict[str, Any]:
+    """Genera los jobs de ``inputs`` en ``out_dir`` con ``workers`` procesos; regresa el resumen"""
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = load_manifest(out_dir)
+    summary = {"jobs": 0, "generated": 0, "skipped": 0, "failed": 0, "rows": 0, "bytes": 0, "workers": workers}
+    start = time.perf_counter()
+
+    def record(result: JobResult):
+        if result.error is not None:
+            summary["failed"] += 1
+            manifest.pop(result.job_id, None)
+            print(f"❌ {result.job_id}: {result.error}")
+            return
+        summary["generated"] += 1
+        summary["rows"] += result.rows
+        summary["bytes"] += result.bytes
+        manifest[result.job_id] = {key: value for key, value in asdict(result).items()
+                                   if key not in ("job_id", "error")}
+        print(f"✅ {result.job_id} -> {result.output} ({result.rows} filas, {result.bytes / 1024:.0f} KB, "
+              f"{result.seconds:.2f} s)")
+
+    pending = set()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        try:
+            for job_id, job in iter_jobs(inputs):
+                summary["jobs"] += 1
+                fingerprint = job_fingerprint(job)
+                if not force and _is_current(job, manifest.get(job_id), fingerprint, out_dir):
+                    summary["skipped"] += 1
+                    continue
+                # Máximo dos jobs en vuelo por proceso: la memoria no depende del tamaño del lote
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        record(future.result())
+                pending.add(pool.submit(run_job, job_id, job, fingerprint, out_dir))
+            for future in wait(pending).done:
+                record(future.result())
+        finally:
+            save_manifest(out_dir, manifest)
+
+    summary["seconds"] = time.perf_counter() - start
+    return summary
+
+
+def print_summary(summary: Dict[str, Any]):
+    seconds = max(summary["seconds"], 1e-9)
+    print(f"\n📊 {summary['jobs']} jobs: {summary['generated']} generados, {summary['skipped']} sin cambios, "
+          f"{summary['failed']} con error ({summary['workers']} procesos, {summary['seconds']:.1f} s)")
+    print(f"   {summary['generated'] / seconds:.2f} archivos/s, {summary['rows'] / seconds:,.0f} filas/s, "
+          f"{summary['bytes'] / seconds / (1024 * 1024):.2f} MB/s ({summary['bytes'] / (1024 * 1024):.1f} MB)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", nargs="+", help="archivos .json/.ndjson, directorios o - (NDJSON por stdin)")
+    parser.add_argument("--out", required=True, help="directorio de salida")
+    parser.add_argument("--workers", type=int, default=worker_count(), help="procesos (default: todos los núcleos)")
+    parser.add_argument("--force", action="store_true", help="regenera también los jobs sin cambios")
+    parser.add_argument("--json", action="store_true", help="imprime el resumen como JSON")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    try:
+        result = run_batch(args.inputs, args.out, max(1, args.workers), args.force)
+    except (JobError, ValueError, OSError) as e:
+        print(f"❌ {e}")
+        sys.exit(2)
+    if args.json:
+        print(json.dumps(result))
+    else:
+        print_summary(result)
+    sys.exit(1 if result["failed"] else 0)
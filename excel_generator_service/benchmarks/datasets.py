@@ -0,0 +1,121 @@
+"""Datos sintéticos reproducibles para los benchmarks del servicio.
+
+Cada generador recibe el número de filas y una semilla y devuelve la lista de
+items tal como la envía la app (mismas llaves que los servicios de exportación).
+Los campos siguen los de los reportes reales: jumpers con varios contenedores,
+cómputo con los 40 campos y grupos de ID/EQUIPO PM, SICOR con artículos en
+stock y fuera de stock, y bitácora repartida en varios años.
+"""
+import random
+from typing import Any, Dict, List
+
+TECNICOS = ["JUAN PEREZ", "MARIA LOPEZ", "PEDRO RUIZ"]
+JUMPER_TIPOS = ["FC-FC", "FC-LC", "LC-LC", "SC-LC", "SC-SC"]
+NOMBRES = [("JUAN", "PEREZ", "GARCIA"), ("MARIA", "LOPEZ", "HERNANDEZ"), ("PEDRO", "RUIZ", "MARTINEZ"),
+           ("ANA", "TORRES", "SANCHEZ")]
+BITACORA_YEARS = (2023, 2024, 2025)
+
+
+def jumpers_items(n: int, seed: int = 1) -> List[Dict[str, Any]]:
+    r = random.Random(seed)
+    return [{
+        "tipo": r.choice(JUMPER_TIPOS), "tamano": r.choice([1, 2, 3, 5, 10, 15]), "cantidad": r.randint(1, 40),
+        "contenedores": [{"rack": f"Rack {r.randint(1, 8)}", "contenedor": f"C{r.randint(1, 12)}"}
+                         for _ in range(r.choice([0, 1, 1, 2, 3, 6]))],
+    } for _ in range(n)]
+
+
+def _persona(r: random.Random, suffix: str) -> Dict[str, Any]:
+    nombre, paterno, materno = r.choice(NOMBRES)
+    return {
+        f"expediente_{suffix}": f"{r.randint(100000, 999999)}",
+        f"nombre_completo_{suffix}": f"{nombre} {paterno} {materno}", f"apellido_paterno_{suffix}": paterno,
+        f"apellido_materno_{suffix}": materno, f"nombre_{suffix}": nombre,
+        f"empresa_{suffix}": r.choice(["TELMEX", "TELNOR"]), f"puesto_{suffix}": r.choice(["TECNICO", "SUPERVISOR"]),
+    }
+
+
+def computo_items(n: int, seed: int = 1) -> List[Dict[str, Any]]:
+    """Grupos de 1 a 4 equipos (CPU + monitor, teclado...) con el mismo ID y EQUIPO PM"""
+    r = random.Random(seed)
+    marcas, modelos = ["DELL", "HP", "LENOVO"], ["OPTIPLEX 7090", "ELITEDESK 800", "THINKCENTRE M70"]
+    items: List[Dict[str, Any]] = []
+    group = 0
+    while len(items) < n:
+        group += 1
+        responsable = _persona(r, "responsable")
+        final = _persona(r, "final")
+        ubicacion = {"estado": "VERACRUZ", "ciudad": r.choice(["XALAPA", "VERACRUZ", "COATZACOALCOS"]),
+                     "tipo_edificio": r.choice(["CENTRAL", "ADMINISTRATIVO"]),
+                     "nombre_edificio": f"EDIFICIO {r.randint(1, 30)}",
+                     "direccion_fisica": f"AV. {r.randint(1, 999)} COL. CENTRO"}
+        for position, tipo in enumerate(["CPU", "MONITOR", "TECLADO", "MOUSE"][:r.randint(1, 4)]):
+            i = len(items)
+            items.append({
+                "id": group, "equipo_pm": f"PM{group:06d}", "inventario": f"INV{i:08d}",
+                "fecha_registro": f"2025-{r.randint(1, 12):02d}-{r.randint(1, 28):02d}",
+                "tipo_equipo": tipo, "marca": r.choice(marcas), "modelo": r.choice(modelos) if position == 0 else "",
+                "procesador": "INTEL CORE I5" if position == 0 else "", "numero_serie": f"MXL{r.getrandbits(40):012X}",
+                "disco_duro": "512 GB SSD" if position == 0 else "", "memoria": "16 GB" if position == 0 else "",
+                "sistema_operativo_instalado": "WINDOWS 11 PRO" if position == 0 else "",
+                "etiqueta_sistema_operativo": r.choice(["SI", "NO"]), "office_instalado": r.choice(["SI", "NO"]),
+                "tipo_uso": r.choice(["ADMINISTRATIVO", "OPERATIVO"]), "nombre_equipo_dominio": f"VER{group:06d}",
+                "status": r.choice(["ASIGNADO", "RESGUARDO"]), "direccion_administrativa": "DIRECCION SURESTE",
+                "subdireccion": "SUBDIRECCION VERACRUZ", "gerencia": r.choice(["PLANTA", "OPERACIONES"]),
+                "observaciones": f"Revisión {r.getrandbits(32):08x}" if r.random() < 0.7 else "",
+                **ubicacion, **responsable, **final,
+            })
+    return items[:n]
+
+
+def sicor_items(n: int, seed: int = 1) -> List[Dict[str, Any]]:
+    r = random.Random(seed)
+    return [{
+        "en_stock": r.choice(["SI", "SI", "NO", "si "]), "numero": i + 1, "codigo": f"03{r.randint(0, 40):04d}",
+        "serie": f"21{r.getrandbits(36):010X}", "marca": r.choice(["HUAWEI", "ZTE"]),
+        "posicion": f"R{r.randint(1, 8)}-{r.randint(1, 20)}", "comentarios": "",
+    } for i in range(n)]
+
+
+def bitacora_items(n: int, year: int = 2025, seed: int = 1) -> List[Dict[str, Any]]:
+    r = random.Random(seed)
+    return [{
+        "consecutivo": f"{year}-{i:05d}", "fecha": f"{year}-{r.randint(1, 12):02d}-{r.randint(1, 28):02d}",
+        "tecnico": r.choice(TECNICOS), "tarjeta": r.choice(["OSN", "RTN", "MW"]), "codigo": f"03{r.randint(0, 40):04d}",
+        "serie": f"21{r.getrandbits(36):010X}", "folio": f"F{i:06d}", "envia": r.choice(TECNICOS),
+        "recibe": "ALMACEN", "guia": f"{r.getrandbits(40):013d}", "observaciones": f"Envío {r.getrandbits(32):08x}",
+    } for i in range(n)]
+
+
+def bitacora_years(n: int, years=BITACORA_YEARS, seed: int = 1) -> List[Dict[str, Any]]:
+    """``years_data`` de bitácora con ``n`` registros repartidos entre ``years``"""
+    per_year = [n // len(years) + (1 if i < n % len(years) else 0) for i in range(len(years))]
+    return [{"year": year, "items": bitacora_items(count, year, seed + i)}
+            for i, (year, count) in enumerate(zip(years, per_year))]
+
+
+def sdr_item(seed: int = 1) -> Dict[str, Any]:
+    """Un formulario SDR con todos los campos del mapa de celdas"""
+    r = random.Random(seed)
+    return {
+        "fecha": f"2025-{r.randint(1, 12):02d}-{r.randint(1, 28):02d}", "descripcion_aviso": "FALLA EN TARJETA OSN",
+        "grupo_planificador": "TX VERACRUZ", "puesto_trabajo_responsable": "TX-VER-01",
+        "autor_aviso": r.choice(TECNICOS),
+        "motivo_intervencion": "CORRECTIVO", "modelo_dano": "TARJETA", "causa_averia": "DESGASTE",
+        "repercusion_funcionamiento": "PARCIAL", "estado_instalacion": "EN SERVICIO",
+        "motivo_intervencion_afectacion": "SIN AFECTACION", "atencion_dano": "REEMPLAZO", "prioridad": "ALTA",
+        "centro_emplazamiento": "XALAPA", "area_empresa": "TRANSMISION", "puesto_trabajo_emplazamiento": "SALA 1",
+        "division": "SURESTE", "estado_instalacion_lugar": "OPERANDO", "datos_disponibles": "SI",
+        "emplazamiento_1": f"RACK {r.randint(1, 8)}", "emplazamiento_2": f"SUBRACK {r.randint(1, 4)}",
+        "local": "CENTRAL XALAPA", "campo_clasificacion": "OSN", "tipo_unidad_danada": "SL16",
+        "no_serie_unidad_danada": f"21{r.getrandbits(36):010X}", "tipo_unidad_montada": "SL16",
+        "no_serie_unidad_montada": f"21{r.getrandbits(36):010X}",
+    }
+
+
+GENERATORS = {
+    "jumpers": jumpers_items,
+    "computo": computo_items,
+    "sicor": sicor_items,
+    "bitacora": bitacora_items,
+}
@@ -0,0 +1,103 @@
+"""Equivalencia semántica de los motores de generación contra la salida de referencia con openpyxl.
+
+Para cada reporte se genera el libro de referencia (plantilla cargada y llenada
+con openpyxl) y el de cada motor alternativo que usa el servicio con los datos
+sintéticos de ``datasets.py``, y se comparan con ``xlsx_equivalence``:
+
+- jumpers, cómputo y SICOR: libro con cadenas compartidas y ``auto`` (``strings``);
+- bitácora: hojas por año generadas en el pool de procesos y ensambladas (con caché);
+- SDR: llenado rápido de la plantilla compilada (``form_fill``).
+
+Termina con código 1 si algún motor difiere de la referencia.
+
+Uso (desde excel_generator_service/):
+    python benchmarks/equivalence.py --rows 300
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+from columns import SDR_FORM_CELLS  # noqa: E402
+from string_table import STRINGS_AUTO, STRINGS_SHARED  # noqa: E402
+from xlsx_equivalence import compare_workbooks  # noqa: E402
+
+from datasets import GENERATORS, bitacora_years, sdr_item  # noqa: E402
+
+REPORTS = ("jumpers", "computo", "sicor", "bitacora", "sdr")
+
+
+def _payload(report: str, rows: int):
+    if report == "bitacora":
+        return bitacora_years(rows)
+    if report == "sdr":
+        return [sdr_item()]
+    return GENERATORS[report](rows)
+
+
+def reference(report: str, payload) -> bytes:
+    """Salida de referencia: la plantilla llenada con openpyxl"""
+    if report == "bitacora":
+        return main._render_workbook(main._build_bitacora_workbook, payload)
+    if report == "sdr":
+        return main._render_workbook(main._build_sdr_workbook, payload)
+    return main._render_workbook(main.REPORTS[report].build_workbook, payload)
+
+
+def _sdr_form_fill(payload) -> bytes:
+    form = main.FORM_FILLER.get(main.TEMPLATE_PATH_SDR, SDR_FORM_CELLS)
+    if form is None:
+        raise RuntimeError("SDR template could not be compiled for the fast path")
+    return main.FORM_FILLER.render(form, payload[0])
+
+
+def _bitacora_parts(payload) -> bytes:
+    return asyncio.run(main._render_bitacora(payload, main.EXCEL_MAX_ROWS - main.BITACORA_FIRST_ROW + 1))
+
+
+def _encoded(strings: str) -> Callable[[str, object], bytes]:
+    def render(report, payload) -> bytes:
+        return main._render_encoded_workbook(strings, main.REPORTS[report].build_workbook, payload)
+    return render
+
+
+# Motores alternativos por reporte: (nombre, función(reporte, payload) -> bytes)
+ENGINES: Dict[str, List[Tuple[str, Callable[[str, object], bytes]]]] = {
+    "jumpers": [("strings=shared", _encoded(STRINGS_SHARED)), ("strings=auto", _encoded(STRINGS_AUTO))],
+    "computo": [("strings=shared", _encoded(STRINGS_SHARED)), ("strings=auto", _encoded(STRINGS_AUTO))],
+    "sicor": [("strings=shared", _encoded(STRINGS_SHARED)), ("strings=auto", _encoded(STRINGS_AUTO))],
+    "bitacora": [("partes por año", lambda report, payload: _bitacora_parts(payload))],
+    "sdr": [("form_fill", lambda report, payload: _sdr_form_fill(payload))],
+}
+
+
+def check(reports: List[str], rows: int, verbose: bool) -> int:
+    failures = 0
+    for report in reports:
+        payload = _payload(report, rows)
+        expected = reference(report, payload)
+        for name, engine in ENGINES[report]:
+            comparison = compare_workbooks(expected, engine(report, payload))
+            status = "ok" if comparison.equivalent else f"DIFIERE ({comparison.total} diferencias)"
+            print(f"{report:<10} {name:<16} {status}")
+            if not comparison.equivalent:
+                failures += 1
+                print("    " + comparison.report().replace("\n", "\n    ") if verbose
+                      else "    " + "\n    ".join(str(d) for d in comparison.differences[:10]))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reports", type=lambda v: [r.strip() for r in v.split(",") if r.strip()],
+                        default=list(REPORTS))
+    parser.add_argument("--rows", type=int, default=300)
+    parser.add_argument("--verbose", action="store_true", help="muestra todas las diferencias (hasta 200)")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    sys.exit(check(args.reports, args.rows, args.verbose))
@@ -0,0 +1,104 @@
+"""Servidor RESP en memoria para probar el backend Redis sin instalar Redis.
+
+Implementa sólo los comandos que usa ``cache_backend.RedisBackend``: PING, GET,
+SET [NX] [PX|EX], DEL, AUTH, SELECT, FLUSHDB y EVAL de los dos scripts de
+candados (no hay intérprete de Lua). Lo usan ``benchmarks/shared_cache.py`` y
+``tests/test_cache_backend.py``.
+"""
+import socketserver
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from cache_backend import REFRESH_SCRIPT, RELEASE_SCRIPT, _RespReader
+
+
+class _FakeRedisHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server: "FakeRedisServer" = self.server.owner  # type: ignore[attr-defined]
+        reader = _RespReader(self.connection)
+        while True:
+            try:
+                command = reader.read()
+            except (ConnectionError, OSError):
+                return
+            if not isinstance(command, list) or not command:
+                return
+            self.wfile.write(server.execute([part if isinstance(part, bytes) else str(part).encode()
+                                             for part in command]))
+
+
+class FakeRedisServer:
+    """Servidor RESP en memoria en un hilo del proceso; ``url`` es la dirección para ``RedisBackend``."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self._data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self._lock = threading.Lock()
+        self.commands = 0
+        self._server = socketserver.ThreadingTCPServer((host, port), _FakeRedisHandler, bind_and_activate=True)
+        self._server.daemon_threads = True
+        self._server.owner = self  # type: ignore[attr-defined]
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    def start(self) -> "FakeRedisServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _live(self, key: bytes) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and time.monotonic() >= entry[1]:
+            del self._data[key]
+            return None
+        return entry[0] if entry is not None else None
+
+    def execute(self, command: List[bytes]) -> bytes:
+        name = command[0].upper()
+        with self._lock:
+            self.commands += 1
+            if name == b"PING":
+                return b"+PONG\r\n"
+            if name in (b"AUTH", b"SELECT"):
+                return b"+OK\r\n"
+            if name == b"FLUSHDB":
+                self._data.clear()
+                return b"+OK\r\n"
+            if name == b"GET" and len(command) == 2:
+                value = self._live(command[1])
+                return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+            if name == b"SET" and len(command) >= 3:
+                key, value, options = command[1], command[2], [o.upper() for o in command[3:]]
+                expires = None
+                for flag, scale in ((b"PX", 1000), (b"EX", 1)):
+                    if flag in options:
+                        expires = time.monotonic() + int(options[options.index(flag) + 1]) / scale
+                if b"NX" in options and self._live(key) is not None:
+                    return b"$-1\r\n"
+                self._data[key] = (value, expires)
+                return b"+OK\r\n"
+            if name == b"DEL":
+                removed = sum(1 for key in command[1:] if self._data.pop(key, None) is not None)
+                return b":%d\r\n" % removed
+            if name == b"EVAL" and len(command) >= 5 and command[2] == b"1":
+                # Sólo los dos scripts del backend; no hay intérprete de Lua
+                script, key, value = command[1].decode("utf-8"), command[3], command[4]
+                owned = self._live(key) == value
+                if script == RELEASE_SCRIPT:
+                    if owned:
+                        del self._data[key]
+                    return b":%d\r\n" % owned
+                if script == REFRESH_SCRIPT and len(command) == 6:
+                    if owned:
+                        self._data[key] = (value, time.monotonic() + int(command[5]) / 1000)
+                    return b":%d\r\n" % owned
+                return b"-NOSCRIPT unsupported script\r\n"
+        return b"-ERR unknown command '%s'\r\n" % name
@@ -0,0 +1,308 @@
+"""Prueba de carga HTTP: latencias p50/p95/p99 por endpoint contra un uvicorn local.
+
+Levanta el servicio (``uvicorn main:app``) en un puerto libre, o usa ``--url``
+si ya está corriendo, y reproduce una mezcla de solicitudes con ``--users``
+usuarios concurrentes durante ``--duration`` segundos: sobre todo formularios
+SDR y listas SICOR pequeñas, con exportaciones grandes de cómputo y bitácora de
+vez en cuando. Aparte, una sonda consulta ``/health`` a intervalo fijo para ver
+si sigue respondiendo mientras corren las exportaciones pesadas, y se muestrea
+el RSS del servidor (proceso principal y sus hijos).
+
+El resultado (``--output``, JSON) tiene por endpoint el número de solicitudes,
+errores, rechazos 429, solicitudes/s y latencias p50/p95/p99/máx en ms, la
+serie de RSS y la configuración usada, para comparar entre versiones.
+
+Uso (desde excel_generator_service/):
+    python benchmarks/load_test.py --users 8 --duration 60 --output carga.json
+    python benchmarks/load_test.py --url http://localhost:8001 --server-pid 1234
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SERVICE_DIR = os.path.dirname(HERE)
+
+from datasets import bitacora_years, computo_items, sdr_item, sicor_items  # noqa: E402
+
+# (nombre, endpoint, peso en la mezcla)
+WORKLOAD = [
+    ("sdr", "/api/generate-sdr-excel", 50),
+    ("sicor", "/api/generate-sicor-excel", 40),
+    ("computo", "/api/generate-computo-excel", 5),
+    ("bitacora", "/api/generate-bitacora-excel", 5),
+]
+HEALTH_INTERVAL = 0.5
+RSS_INTERVAL = 1.0
+STARTUP_TIMEOUT = 60
+REQUEST_TIMEOUT = 600
+
+
+@dataclass
+class EndpointStats:
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+    rejected: int = 0
+    bytes: int = 0
+    error_samples: List[str] = field(default_factory=list)
+
+    def record(self, status: int, seconds: float, size: int, error: Optional[str] = None):
+        if status == 429:
+            self.rejected += 1
+        elif error is not None or not 200 <= status < 300:
+            self.errors += 1
+            if len(self.error_samples) < 5:
+                self.error_samples.append(error or f"HTTP {status}")
+        else:
+            self.latencies.append(seconds)
+            self.bytes += size
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        total = len(self.latencies) + self.errors + self.rejected
+        ordered = sorted(self.latencies)
+        return {
+            "requests": total, "ok": len(ordered), "errors": self.errors, "rejected_429": self.rejected,
+            "error_rate": round(self.errors / total, 4) if total else 0.0,
+            "throughput_rps": round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+            "latency_ms": {name: round(percentile(ordered, q) * 1000, 2)
+                           for name, q in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100))} if ordered else {},
+            "bytes": self.bytes, "error_samples": self.error_samples,
+        }
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Percentil ``q`` (0-100) por rango más cercano de una lista ordenada"""
+    if not ordered:
+        return 0.0
+    rank = math.ceil(q / 100 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+async def http_request(host: str, port: int, method: str, path: str, body: bytes = b"",
+                       timeout: float = REQUEST_TIMEOUT) -> Tuple[int, int]:
+    """(estado, bytes del cuerpo) de una solicitud HTTP/1.1 en una conexión nueva"""
+    async def _send() -> Tuple[int, int]:
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            head = (f"{method} {path} HTTP/1.1\r\nHost: {host}:{port}\r\nConnection: close\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n")
+            writer.write(head.encode("ascii") + body)
+            await writer.drain()
+            status_line = await reader.readline()
+            status = int(status_line.split()[1])
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            size = 0
+            if headers.get("transfer-encoding", "").lower() == "chunked":
+                while True:
+                    chunk_size = int((await reader.readline()).split(b";")[0], 16)
+                    if chunk_size == 0:
+                        break
+                    size += len(await reader.readexactly(chunk_size))
+                    await reader.readline()
+            elif "content-length" in headers:
+                size = len(await reader.readexactly(int(headers["content-length"])))
+            else:
+                while True:
+                    data = await reader.read(65536)
+                    if not data:
+                        break
+                    size += len(data)
+            return status, size
+        finally:
+            writer.close()
+    return await asyncio.wait_for(_send(), timeout)
+
+
+def build_payloads(small_rows: int, big_rows: int, seed: int, variants: int) -> Dict[str, List[bytes]]:
+    """``variants`` payloads JSON distintos de cada tipo de solicitud (se generan antes de la prueba)"""
+    seeds = range(seed, seed + max(1, variants))
+    return {
+        "sdr": [json.dumps({"items": [sdr_item(s)]}).encode("utf-8") for s in seeds],
+        "sicor": [json.dumps({"items": sicor_items(small_rows, s)}).encode("utf-8") for s in seeds],
+        "computo": [json.dumps({"items": computo_items(big_rows, s)}).encode("utf-8") for s in seeds],
+        "bitacora": [json.dumps({"years_data": bitacora_years(big_rows, seed=s)}).encode("utf-8") for s in seeds],
+    }
+
+
+def process_rss_bytes(pid: int) -> Optional[int]:
+    """RSS del proceso y de sus hijos (workers del pool de procesos); ``None`` si no hay /proc"""
+    total = 0
+    pending = [pid]
+    seen = set()
+    while pending:
+        current = pending.pop()
+        if current in seen:
+            continue
+        seen.add(current)
+        try:
+            with open(f"/proc/{current}/statm") as f:
+                total += int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            if current == pid:
+                return None
+    return total
+
+
+class LoadTest:
+    def __init__(self, host: str, port: int, payloads: Dict[str, List[bytes]], server_pid: Optional[int],
+                 seed: int):
+        self.host = host
+        self.port = port
+        self.payloads = payloads
+        self.server_pid = server_pid
+        self.random = random.Random(seed)
+        self.stats: Dict[str, EndpointStats] = {name: EndpointStats() for name, _, _ in WORKLOAD}
+        self.health = EndpointStats()
+        self.rss: List[Dict[str, float]] = []
+        self.deadline = 0.0
+        self.started = 0.0
+
+    async def _timed(self, stats: EndpointStats, method: str, path: str, body: bytes = b""):
+        started = time.perf_counter()
+        try:
+            status, size = await http_request(self.host, self.port, method, path, body)
+            stats.record(status, time.perf_counter() - started, size)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, IndexError) as e:
+            stats.record(0, time.perf_counter() - started, 0, f"{type(e).__name__}: {e}")
+
+    async def _user(self):
+        names = [name for name, _, _ in WORKLOAD]
+        weights = [weight for _, _, weight in WORKLOAD]
+        paths = {name: path for name, path, _ in WORKLOAD}
+        while time.perf_counter() < self.deadline:
+            name = self.random.choices(names, weights)[0]
+            body = self.random.choice(self.payloads[name])
+            await self._timed(self.stats[name], "POST", paths[name], body)
+
+    async def _health_probe(self):
+        while time.perf_counter() < self.deadline:
+            await self._timed(self.health, "GET", "/health")
+            await asyncio.sleep(HEALTH_INTERVAL)
+
+    async def _rss_sampler(self):
+        while time.perf_counter() < self.deadline and self.server_pid:
+            rss = process_rss_bytes(self.server_pid)
+            if rss is not None:
+                self.rss.append({"t": round(time.perf_counter() - self.started, 2), "rss_mb": round(rss / 2 ** 20, 1)})
+            await asyncio.sleep(RSS_INTERVAL)
+
+    async def run(self, users: int, duration: float) -> float:
+        self.started = time.perf_counter()
+        self.deadline = self.started + duration
+        await asyncio.gather(self._rss_sampler(), self._health_probe(), *(self._user() for _ in range(users)))
+        # Las solicitudes en curso al vencer el plazo se esperan, así que el tiempo real puede ser mayor
+        return time.perf_counter() - self.started
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int, log_path: str) -> subprocess.Popen:
+    """uvicorn con el servicio en ``port``; espera a que ``/health`` responda"""
+    log = open(log_path, "wb")
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+                               "--port", str(port), "--log-level", "warning"],
+                              cwd=SERVICE_DIR, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.time() + STARTUP_TIMEOUT
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with code {server.returncode}, see {log_path}")
+        try:
+            status, _ = asyncio.run(http_request("127.0.0.1", port, "GET", "/health", timeout=2))
+            if status == 200:
+                return server
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, IndexError):
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f"uvicorn did not answer /health within {STARTUP_TIMEOUT}s, see {log_path}")
+
+
+def main_load_test(args) -> Dict[str, Any]:
+    payloads = build_payloads(args.small_rows, args.big_rows, args.seed, args.variants)
+    server = None
+    if args.url:
+        parts = urlsplit(args.url)
+        host, port, server_pid = parts.hostname or "127.0.0.1", parts.port or 80, args.server_pid
+    else:
+        host, port = "127.0.0.1", _free_port()
+        server = start_server(port, args.server_log)
+        server_pid = server.pid
+    try:
+        test = LoadTest(host, port, payloads, server_pid, args.seed)
+        elapsed = asyncio.run(test.run(args.users, args.duration))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    rss_values = [sample["rss_mb"] for sample in test.rss]
+    return {
+        "config": {"users": args.users, "duration_s": args.duration, "small_rows": args.small_rows,
+                   "big_rows": args.big_rows, "seed": args.seed, "variants": args.variants, "workload": {n: w for n, _, w in WORKLOAD},
+                   "url": args.url or f"http://{host}:{port} (local)"},
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "elapsed_s": round(elapsed, 2),
+        "endpoints": {name: stats.summary(elapsed) for name, stats in test.stats.items()},
+        "health": test.health.summary(elapsed),
+        "rss": {"max_mb": max(rss_values, default=None), "samples": test.rss},
+    }
+
+
+def print_summary(result: Dict[str, Any]):
+    print(f"{'endpoint':<10} {'solic.':>7} {'errores':>8} {'429':>5} {'sol/s':>7} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'máx ms':>9}")
+    rows = list(result["endpoints"].items()) + [("health", result["health"])]
+    for name, summary in rows:
+        latency = summary["latency_ms"]
+        print(f"{name:<10} {summary['requests']:>7} {summary['errors']:>8} {summary['rejected_429']:>5} "
+              f"{summary['throughput_rps']:>7.2f} " + " ".join(f"{latency.get(q, 0):>9.1f}"
+                                                        for q in ("p50", "p95", "p99", "max")))
+    if result["rss"]["max_mb"] is not None:
+        print(f"RSS máximo del servidor: {result['rss']['max_mb']:.1f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="servicio ya levantado (si se omite se inicia uno local)")
+    parser.add_argument("--server-pid", type=int, help="PID del servidor de --url para muestrear su RSS")
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=60, help="segundos")
+    parser.add_argument("--small-rows", type=int, default=200, help="filas de las listas SICOR")
+    parser.add_argument("--big-rows", type=int, default=2000, help="filas de cómputo y bitácora")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--variants", type=int, default=1,
+                        help="payloads distintos por tipo (con 1 las bitácoras repetidas salen de la caché de hojas)")
+    parser.add_argument("--output", help="escribe el resultado en JSON en este archivo")
+    parser.add_argument("--server-log", default=os.path.join(tempfile.gettempdir(), "excel_load_test_server.log"))
+    args = parser.parse_args()
+
+    result = main_load_test(args)
+    print_summary(result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
@@ -0,0 +1,47 @@
+"""Benchmark: normalización por item vs. por columnas (memoizada).
+
+Mide filas/segundo al convertir los items en filas listas para escribir, con
+``row_values`` (un item a la vez) y con ``table_rows`` (columna por columna,
+cada transformación evaluada una vez por valor distinto).
+
+Uso (desde excel_generator_service/):
+    python benchmarks/normalization.py --rows 100000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from columns import COLUMN_MAPS, row_values, table_rows  # noqa: E402
+
+from datasets import GENERATORS  # noqa: E402
+
+
+def best_of(repeat, fn):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main_benchmark(rows, repeat):
+    print(f"{'reporte':<10} {'por item filas/s':>17} {'por columna filas/s':>20} {'mejora':>7}")
+    for report, make in GENERATORS.items():
+        items = make(rows)
+        columns = COLUMN_MAPS[report]
+        assert [row_values(columns, item) for item in items] == table_rows(columns, items)
+        per_item = best_of(repeat, lambda: [row_values(columns, item) for item in items])
+        columnar = best_of(repeat, lambda: table_rows(columns, items))
+        print(f"{report:<10} {rows / per_item:>17,.0f} {rows / columnar:>20,.0f} {per_item / columnar:>6.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    main_benchmark(args.rows, args.repeat)
@@ -0,0 +1,100 @@
+"""Ráfaga de exportaciones idénticas repartida entre varias instancias con caché compartida.
+
+Levanta ``--instances`` servicios (``uvicorn main:app``) que comparten un Redis:
+el de ``--redis-url`` o, si no se indica, un ``FakeRedisServer`` dentro de este
+proceso. Luego envía ``--requests`` exportaciones de cómputo idénticas a la vez,
+repartidas entre las instancias, y muestra cuántas veces se generó el archivo
+(con la caché compartida debe ser una) y de dónde salió cada respuesta según
+``/api/metrics``. Con ``--backend local`` cada instancia usa su propia caché,
+para comparar.
+
+Uso (desde excel_generator_service/):
+    python benchmarks/shared_cache.py --instances 3 --requests 12 --rows 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import urllib.request
+from typing import Any, Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SERVICE_DIR = os.path.dirname(HERE)
+sys.path.insert(0, SERVICE_DIR)
+
+from cache_backend import BACKEND_LOCAL, BACKEND_REDIS  # noqa: E402
+from datasets import computo_items  # noqa: E402
+from fake_redis import FakeRedisServer  # noqa: E402
+from load_test import _free_port, http_request, start_server  # noqa: E402
+
+
+def _metrics(port: int) -> Dict[str, Any]:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/metrics", timeout=10) as response:
+        return json.loads(response.read())
+
+
+async def _burst(ports: List[int], body: bytes, requests: int) -> List[tuple]:
+    async def one(i: int):
+        started = time.perf_counter()
+        status, size = await http_request("127.0.0.1", ports[i % len(ports)], "POST",
+                                          "/api/generate-computo-excel", body)
+        return status, size, time.perf_counter() - started
+    return await asyncio.gather(*(one(i) for i in range(requests)))
+
+
+def main(args) -> int:
+    fake = None
+    os.environ["EXCEL_CACHE_BACKEND"] = args.backend
+    if args.backend == BACKEND_REDIS:
+        if not args.redis_url:
+            fake = FakeRedisServer().start()
+        os.environ["EXCEL_CACHE_REDIS_URL"] = args.redis_url or fake.url
+    servers, ports = [], []
+    log_dir = tempfile.mkdtemp(prefix="shared_cache_")
+    try:
+        for i in range(args.instances):
+            port = _free_port()
+            servers.append(start_server(port, os.path.join(log_dir, f"instancia_{i}.log")))
+            ports.append(port)
+        body = json.dumps({"items": computo_items(args.rows, seed=args.seed)}).encode("utf-8")
+
+        started = time.perf_counter()
+        results = asyncio.run(_burst(ports, body, args.requests))
+        elapsed = time.perf_counter() - started
+
+        sizes = {size for status, size, _ in results if status == 200}
+        failed = [status for status, _, _ in results if status != 200]
+        latencies = sorted(seconds for _, _, seconds in results)
+        print(f"Backend {args.backend} ({os.environ.get('EXCEL_CACHE_REDIS_URL', '-') if fake is None else fake.url}), "
+              f"{args.instances} instancias, {args.requests} solicitudes de {args.rows} filas")
+        print(f"  total {elapsed:.2f}s, latencia mín {latencies[0]:.2f}s / máx {latencies[-1]:.2f}s, "
+              f"errores {len(failed)}, tamaños distintos {len(sizes)}")
+        generated = 0
+        for i, port in enumerate(ports):
+            stats = _metrics(port)["file_cache"]
+            generated += stats["generated"]
+            print(f"  instancia {i}: generados {stats['generated']}, en caché {stats['hits']}, "
+                  f"esperados de otra solicitud {stats['shared_hits']} (esperas {stats['waits']}, "
+                  f"agotadas {stats['wait_timeouts']})")
+        print(f"  generaciones en total: {generated}")
+        return 1 if failed else 0
+    finally:
+        for server in servers:
+            server.terminate()
+            server.wait(timeout=30)
+        if fake is not None:
+            fake.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--instances", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=12)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--backend", choices=(BACKEND_LOCAL, BACKEND_REDIS), default=BACKEND_REDIS)
+    parser.add_argument("--redis-url", help="Redis existente (default: servidor falso en este proceso)")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,73 @@
+"""Benchmark: cadenas en línea vs. tabla compartida vs. auto.
+
+Compara tiempo de guardado, tamaño del archivo y tiempo de lectura para los
+reportes de cómputo y bitácora, en el xlsx con plantilla y en ``xlsx-raw``.
+
+Uso (desde excel_generator_service/):
+    python benchmarks/string_encoding.py --rows 20000 --styled-rows 1000
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openpyxl  # noqa: E402
+
+import main  # noqa: E402
+from columns import report_headers  # noqa: E402
+from fast_formats import iter_raw_xlsx  # noqa: E402
+from string_table import STRING_ENCODINGS  # noqa: E402
+from xlsx_parts import share_strings  # noqa: E402
+
+from datasets import bitacora_items, computo_items  # noqa: E402
+
+
+def read_seconds(data):
+    started = time.perf_counter()
+    wb = openpyxl.load_workbook(io.BytesIO(data), read_only=True)
+    for ws in wb.worksheets:
+        for _ in ws.iter_rows(values_only=True):
+            pass
+    wb.close()
+    return time.perf_counter() - started
+
+
+def report(label, encoding, save_s, data):
+    print(f"{label:<22} {encoding:<7} {save_s:>9.3f} {len(data) / 1024:>10.1f} {read_seconds(data):>9.3f}")
+
+
+def main_benchmark(rows, styled_rows):
+    print(f"{'caso':<22} {'strings':<7} {'guardar s':>9} {'KiB':>10} {'leer s':>9}")
+    cases = [("computo", computo_items), ("bitacora", bitacora_items)]
+
+    for name, make in cases:
+        items = make(rows)
+        for encoding in STRING_ENCODINGS:
+            started = time.perf_counter()
+            data = b"".join(iter_raw_xlsx([(name, report_headers(name), main._report_rows(name, items))], encoding))
+            report(f"{name} xlsx-raw {rows}", encoding, time.perf_counter() - started, data)
+
+    for name, make in cases:
+        items = make(styled_rows)
+        if name == "computo":
+            started = time.perf_counter()
+            base = main._render_workbook(main._build_computo_workbook, items)
+        else:
+            started = time.perf_counter()
+            base = main._render_workbook(main._build_bitacora_workbook, [{"year": 2025, "items": items}])
+        build_s = time.perf_counter() - started
+        for encoding in STRING_ENCODINGS:
+            started = time.perf_counter()
+            data = share_strings(base, encoding)
+            report(f"{name} xlsx {styled_rows}", encoding, build_s + time.perf_counter() - started, data)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000, help="filas para xlsx-raw")
+    parser.add_argument("--styled-rows", type=int, default=1000, help="filas para el xlsx con plantilla")
+    args = parser.parse_args()
+    main_benchmark(args.rows, args.styled_rows)
@@ -0,0 +1,278 @@
+"""Suite de benchmarks de todos los generadores contra una línea base guardada.
+
+Para cada reporte (jumpers, cómputo, SICOR, bitácora y SDR), camino de
+generación y tamaño mide filas/segundo, memoria pico y tamaño del archivo:
+
+- ``plantilla``: el xlsx con plantilla y estilos, como lo entrega el endpoint.
+- ``sin-plantilla``: el mismo builder cuando la plantilla no existe.
+- ``xlsx-raw``: el formato rápido sin estilos.
+
+En SDR cada "fila" es un formulario completo (``rows`` formularios de un registro).
+
+Cada caso corre en un proceso aparte, así que la memoria pico (RSS máximo menos
+el RSS con los datos ya generados) no arrastra lo de otros casos, y tiene un
+límite de tiempo. Cada caso se corre ``--runs`` veces (3 por omisión) y se
+guarda la corrida mediana, para que un proceso lento o rápido por ruido del
+equipo no quede como línea base. Con ``--check`` el proceso termina con código 1 si algún caso
+es más lento, usa más memoria o genera archivos más grandes que la línea base
+más allá de la tolerancia.
+
+Uso (desde excel_generator_service/):
+    python benchmarks/suite.py --sizes 100,10000 --check
+    python benchmarks/suite.py --update-baseline --runs 5
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from datasets import GENERATORS, bitacora_years, sdr_item  # noqa: E402
+
+REPORTS = ("jumpers", "computo", "sicor", "bitacora", "sdr")
+PATHS = ("plantilla", "sin-plantilla", "xlsx-raw")
+SIZES = (100, 10000, 100000)
+BASELINE_PATH = os.path.join(HERE, "baseline.json")
+
+# Los casos rápidos se repiten hasta sumar este tiempo y se toma la mejor corrida
+MIN_SECONDS = 0.5
+MAX_REPEAT = 100
+
+# Corridas por caso (se guarda la mediana) y límite de tiempo de cada una
+RUNS = 3
+TIMEOUT_SECONDS = 900
+
+# Tolerancias por defecto: filas/s (caída), memoria pico y tamaño (aumento)
+SPEED_TOLERANCE = 0.25
+MEMORY_TOLERANCE = 0.25
+MEMORY_SLACK_MB = 8.0
+SIZE_TOLERANCE = 0.02
+
+TEMPLATE_PATHS = {
+    "jumpers": "TEMPLATE_PATH_JUMPERS",
+    "computo": "TEMPLATE_PATH_COMPUTO",
+    "sicor": "TEMPLATE_PATH_SICOR",
+    "bitacora": "TEMPLATE_PATH_BITACORA",
+    "sdr": "TEMPLATE_PATH_SDR",
+}
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return _max_rss_bytes()
+
+
+def _max_rss_bytes() -> int:
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo reporta en KiB y macOS en bytes
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def _payload(report: str, rows: int):
+    if report == "bitacora":
+        return bitacora_years(rows)
+    if report == "sdr":
+        return [sdr_item(seed) for seed in range(rows)]
+    return GENERATORS[report](rows)
+
+
+def _generator(report: str, path: str):
+    """Función que genera los archivos del caso a partir del payload y regresa su tamaño total"""
+    import logging
+    logging.disable(logging.INFO)
+
+    import main
+    from columns import SDR_FORM_CELLS, report_headers
+    from fast_formats import iter_raw_xlsx
+
+    if path == "sin-plantilla":
+        setattr(main, TEMPLATE_PATHS[report], os.path.join(HERE, "__sin_plantilla__.xlsx"))
+
+    if path == "xlsx-raw":
+        def render(payload):
+            if report == "bitacora":
+                sheets = [(str(yd["year"]), report_headers("bitacora"), main._report_rows("bitacora", yd["items"]))
+                          for yd in payload]
+            else:
+                sheets = [(report, report_headers(report), main._report_rows(report, payload))]
+            return sum(len(chunk) for chunk in iter_raw_xlsx(sheets))
+    elif report == "bitacora":
+        def render(payload):
+            return len(main._render_workbook(main._build_bitacora_workbook, payload))
+    elif report == "sdr":
+        # Igual que el endpoint: llenado rápido si la plantilla compila, si no openpyxl
+        def render(payload):
+            size = 0
+            for item in payload:
+                form = main.FORM_FILLER.get(main.TEMPLATE_PATH_SDR, SDR_FORM_CELLS)
+                if form is not None:
+                    size += len(main.FORM_FILLER.render(form, item))
+                else:
+                    size += len(main._render_workbook(main._build_sdr_workbook, [item]))
+            return size
+    else:
+        def render(payload):
+            return len(main._render_workbook(main.REPORTS[report].build_workbook, payload))
+    return render
+
+
+def run_case(report: str, path: str, rows: int) -> Dict[str, Any]:
+    """Mide un caso en el proceso actual"""
+    render = _generator(report, path)
+    payload = _payload(report, rows)
+    gc.collect()
+    rss_before = _rss_bytes()
+
+    started = time.perf_counter()
+    size = render(payload)
+    best = time.perf_counter() - started
+    peak = max(_max_rss_bytes() - rss_before, 0)
+
+    total, repeat = best, 1
+    while total < MIN_SECONDS and repeat < MAX_REPEAT:
+        started = time.perf_counter()
+        render(payload)
+        elapsed = time.perf_counter() - started
+        best, total, repeat = min(best, elapsed), total + elapsed, repeat + 1
+
+    return {"status": "ok", "seconds": round(best, 6), "rows_per_s": round(rows / best, 1),
+            "peak_mb": round(peak / 2 ** 20, 2), "bytes": size, "repeat": repeat}
+
+
+def _case_key(report: str, path: str, rows: int) -> str:
+    return f"{report}/{path}/{rows}"
+
+
+def measure(report: str, path: str, rows: int, timeout: float) -> Dict[str, Any]:
+    """Corre el caso en un proceso nuevo (memoria pico aislada y límite de tiempo)"""
+    command = [sys.executable, os.path.abspath(__file__), "--run-case", report, path, str(rows)]
+    try:
+        done = subprocess.run(command, capture_output=True, text=True, timeout=timeout,
+                              cwd=os.path.dirname(HERE))
+    except subprocess.TimeoutExpired:
+        return {"status": "timeout", "seconds": timeout}
+    if done.returncode != 0:
+        return {"status": "error", "error": done.stderr.strip().splitlines()[-1:] or [f"exit {done.returncode}"]}
+    return json.loads(done.stdout.strip().splitlines()[-1])
+
+
+def measure_median(report: str, path: str, rows: int, timeout: float, runs: int) -> Dict[str, Any]:
+    """Corre el caso ``runs`` veces y regresa la corrida de tiempo mediano con la memoria pico mediana;
+    si una corrida no termina bien ya no se repite"""
+    results = []
+    for _ in range(max(runs, 1)):
+        result = measure(report, path, rows, timeout)
+        if result["status"] != "ok":
+            return result
+        results.append(result)
+    results.sort(key=lambda result: result["seconds"])
+    median = dict(results[(len(results) - 1) // 2])
+    median["peak_mb"] = round(statistics.median(result["peak_mb"] for result in results), 2)
+    median["runs"] = len(results)
+    return median
+
+
+def compare(result: Dict[str, Any], base: Optional[Dict[str, Any]], args) -> List[str]:
+    """Regresiones de ``result`` respecto de la línea base del mismo caso"""
+    if base is None:
+        return []
+    if result["status"] != "ok":
+        return [] if base["status"] == result["status"] else [f"status {result['status']} (base {base['status']})"]
+    if base["status"] != "ok":
+        return []
+    problems = []
+    if result["rows_per_s"] < base["rows_per_s"] * (1 - args.speed_tolerance):
+        problems.append(f"rows/s {result['rows_per_s']:,.0f} < base {base['rows_per_s']:,.0f}")
+    if result["peak_mb"] > base["peak_mb"] * (1 + args.memory_tolerance) + MEMORY_SLACK_MB:
+        problems.append(f"peak {result['peak_mb']:.1f} MB > base {base['peak_mb']:.1f} MB")
+    if result["bytes"] > base["bytes"] * (1 + args.size_tolerance):
+        problems.append(f"size {result['bytes']:,} > base {base['bytes']:,}")
+    return problems
+
+
+def _host() -> Dict[str, Any]:
+    return {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()}
+
+
+def main_benchmark(args) -> int:
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            stored = json.load(f)
+        baseline = stored.get("cases", {})
+        if stored.get("host") != _host():
+            print(f"⚠️ línea base tomada en otro equipo: {stored.get('host')}", file=sys.stderr)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    regressions: Dict[str, List[str]] = {}
+    print(f"{'caso':<32} {'filas/s':>12} {'pico MB':>9} {'KiB':>10} {'s':>9}  estado")
+    for report in args.reports:
+        for path in args.paths:
+            for rows in args.sizes:
+                key = _case_key(report, path, rows)
+                result = results[key] = measure_median(report, path, rows, args.timeout, args.runs)
+                problems = compare(result, baseline.get(key), args)
+                if problems:
+                    regressions[key] = problems
+                if result["status"] == "ok":
+                    print(f"{key:<32} {result['rows_per_s']:>12,.0f} {result['peak_mb']:>9.1f} "
+                          f"{result['bytes'] / 1024:>10.1f} {result['seconds']:>9.3f}  "
+                          f"{'REGRESIÓN: ' + '; '.join(problems) if problems else 'ok'}")
+                else:
+                    print(f"{key:<32} {'':>12} {'':>9} {'':>10} {result.get('seconds', 0):>9.3f}  "
+                          f"{result['status']} {'; '.join(problems)}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"host": _host(), "cases": results, "regressions": regressions}, f, indent=2)
+    if args.update_baseline:
+        cases = {**baseline, **results}
+        with open(args.baseline, "w") as f:
+            json.dump({"host": _host(), "cases": dict(sorted(cases.items()))}, f, indent=2)
+            f.write("\n")
+        print(f"📝 línea base actualizada: {args.baseline}")
+    if args.check and regressions:
+        print(f"❌ {len(regressions)} caso(s) con regresión respecto de {args.baseline}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def _csv_list(value: str) -> List[str]:
+    return [part.strip() for part in value.split(",") if part.strip()]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 5 and sys.argv[1] == "--run-case":
+        print(json.dumps(run_case(sys.argv[2], sys.argv[3], int(sys.argv[4]))))
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reports", type=_csv_list, default=list(REPORTS))
+    parser.add_argument("--paths", type=_csv_list, default=list(PATHS))
+    parser.add_argument("--sizes", type=lambda v: [int(n) for n in _csv_list(v)], default=list(SIZES))
+    parser.add_argument("--timeout", type=float, default=TIMEOUT_SECONDS, help="segundos por corrida")
+    parser.add_argument("--runs", type=int, default=RUNS, help="corridas por caso (se guarda la mediana)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--check", action="store_true", help="código 1 si hay regresiones")
+    parser.add_argument("--update-baseline", action="store_true", help="guarda los resultados como línea base")
+    parser.add_argument("--json", help="escribe los resultados en este archivo")
+    parser.add_argument("--speed-tolerance", type=float, default=SPEED_TOLERANCE)
+    parser.add_argument("--memory-tolerance", type=float, default=MEMORY_TOLERANCE)
+    parser.add_argument("--size-tolerance", type=float, default=SIZE_TOLERANCE)
+    args = parser.parse_args()
+    unknown = sorted(set(args.reports) - set(REPORTS)) + sorted(set(args.paths) - set(PATHS))
+    if unknown:
+        parser.error(f"unknown report or path: {', '.join(unknown)}")
+    sys.exit(main_benchmark(args))
@@ -0,0 +1,327 @@
+"""Backends de caché: en memoria del proceso o Redis, compartido entre instancias.
+
+El servicio corre en varias instancias (Render y los servidores de la red
+local) y cada una tenía su propia caché fría. La caché de hojas de bitácora y
+la de archivos generados guardan bytes detrás de esta interfaz:
+
+- ``LocalBackend``: LRU en memoria del proceso, acotado por bytes (default);
+- ``RedisBackend``: cualquier servidor que hable el protocolo de Redis (RESP),
+  con un cliente mínimo sobre sockets (sin dependencias nuevas).
+
+Para probar varias instancias sin instalar Redis, ``benchmarks/fake_redis.py``
+tiene un servidor RESP en memoria con los comandos que usa el backend.
+
+``EXCEL_CACHE_BACKEND=redis`` y ``EXCEL_CACHE_REDIS_URL`` (``redis://[:clave@]host:puerto/db``)
+activan el backend compartido. Si Redis no responde, las lecturas cuentan
+como fallo de caché y las escrituras se descartan: el servicio sigue
+generando como si no hubiera caché.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+logger = logging.getLogger(__name__)
+
+BACKEND_LOCAL = "local"
+BACKEND_REDIS = "redis"
+BACKENDS = (BACKEND_LOCAL, BACKEND_REDIS)
+
+# Prefijo de todas las llaves en Redis
+KEY_PREFIX = "excel:"
+# Segundos sin intentar Redis después de un error (cada intento fallido puede costar el timeout)
+RETRY_SECONDS = 5
+
+# Liberar y renovar un candado sólo si sigue siendo de quien lo tomó (mismo valor)
+RELEASE_SCRIPT = ('if redis.call("GET", KEYS[1]) == ARGV[1] then '
+                  'return redis.call("DEL", KEYS[1]) else return 0 end')
+REFRESH_SCRIPT = ('if redis.call("GET", KEYS[1]) == ARGV[1] then '
+                  'return redis.call("PEXPIRE", KEYS[1], ARGV[2]) else return 0 end')
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class CacheBackend:
+    """Almacén de bytes por llave con expiración opcional (``ttl`` en segundos)."""
+
+    name = ""
+    # Las operaciones bloquean (red): los llamadores async las mandan a un hilo
+    blocking = False
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    def add(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        """Guarda ``value`` sólo si la llave no existe (candado); regresa si se guardó"""
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def delete_if(self, key: str, value: bytes):
+        """Borra la llave sólo si todavía guarda ``value`` (liberar un candado propio)"""
+        raise NotImplementedError
+
+    def expire_if(self, key: str, value: bytes, ttl: float) -> bool:
+        """Renueva la expiración sólo si la llave todavía guarda ``value``; regresa si se renovó"""
+        raise NotImplementedError
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+
+class LocalBackend(CacheBackend):
+    """LRU en memoria acotado por ``max_bytes``."""
+
+    name = BACKEND_LOCAL
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max(0, max_bytes)
+        self._entries: "OrderedDict[str, Tuple[bytes, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.evictions = 0
+
+    def _live(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires is not None and time.monotonic() >= expires:
+            self._pop(key)
+            return None
+        return value
+
+    def _pop(self, key: str):
+        value, _ = self._entries.pop(key)
+        self.bytes -= len(value)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._live(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def _store(self, key: str, value: bytes, ttl: Optional[float]):
+        if key in self._entries:
+            self._pop(key)
+        self._entries[key] = (value, time.monotonic() + ttl if ttl else None)
+        self.bytes += len(value)
+        while self.bytes > self.max_bytes and self._entries:
+            evicted = next(iter(self._entries))
+            self._pop(evicted)
+            self.evictions += 1
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def add(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        with self._lock:
+            if self._live(key) is not None:
+                return False
+            self._store(key, value, ttl)
+            return True
+
+    def delete(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+
+    def delete_if(self, key: str, value: bytes):
+        with self._lock:
+            if self._live(key) == value:
+                self._pop(key)
+
+    def expire_if(self, key: str, value: bytes, ttl: float) -> bool:
+        with self._lock:
+            if self._live(key) != value:
+                return False
+            self._entries[key] = (value, time.monotonic() + ttl)
+            return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"backend": self.name, "entries": len(self._entries), "bytes": self.bytes,
+                "max_bytes": self.max_bytes, "evictions": self.evictions}
+
+
+class RedisError(Exception):
+    """Respuesta de error del servidor Redis"""
+
+
+def _encode_command(*args) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode("utf-8")
+        elif isinstance(arg, int):
+            arg = str(arg).encode("ascii")
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+class _RespReader:
+    """Lee respuestas RESP de un socket"""
+
+    def __init__(self, sock: socket.socket):
+        self.file = sock.makefile("rb")
+
+    def read(self):
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("connection closed by the server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode("utf-8")
+        if kind == b"-":
+            raise RedisError(rest.decode("utf-8", "replace"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            size = int(rest)
+            if size < 0:
+                return None
+            data = self.file.read(size + 2)
+            return data[:-2]
+        if kind == b"*":
+            count = int(rest)
+            return None if count < 0 else [self.read() for _ in range(count)]
+        raise RedisError(f"unexpected reply: {line[:40]!r}")
+
+
+class RedisBackend(CacheBackend):
+    """Cliente mínimo de Redis (GET, SET con PX/NX, DEL, EVAL de los candados): una conexión por hilo."""
+
+    name = BACKEND_REDIS
+    blocking = True
+
+    def __init__(self, url: str, timeout: float = 2.0, prefix: str = KEY_PREFIX):
+        parsed = urlparse(url)
+        if parsed.scheme != "redis":
+            raise ValueError(f"unsupported cache url (expected redis://): {url}")
+        self.url = url
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self.prefix = prefix
+        self._local = threading.local()
+        self.errors = 0
+        self.lock_fallbacks = 0
+        self._retry_at = 0.0
+        self._last_warning = 0.0
+        self._last_lock_warning = 0.0
+
+    def _connection(self) -> Tuple[socket.socket, _RespReader]:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn = (sock, _RespReader(sock))
+            self._local.conn = conn
+            if self.password:
+                self._execute(conn, "AUTH", self.password)
+            if self.db:
+                self._execute(conn, "SELECT", self.db)
+        return conn
+
+    @staticmethod
+    def _execute(conn, *args):
+        sock, reader = conn
+        sock.sendall(_encode_command(*args))
+        return reader.read()
+
+    def _close(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn[0].close()
+            except OSError:
+                pass
+
+    def command(self, *args):
+        """Ejecuta un comando; ``None`` si Redis no está disponible (se registra y se cuenta)"""
+        if time.monotonic() < self._retry_at:
+            return None
+        try:
+            return self._execute(self._connection(), *args)
+        except (OSError, RedisError, ValueError) as e:
+            self._close()
+            self.errors += 1
+            now = time.monotonic()
+            self._retry_at = now + RETRY_SECONDS
+            if now - self._last_warning > 30:
+                self._last_warning = now
+                logger.warning(f"⚠️ Caché Redis no disponible ({self.host}:{self.port}): {e}")
+            return None
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.command("GET", self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        if ttl:
+            self.command("SET", self.prefix + key, value, "PX", int(ttl * 1000))
+        else:
+            self.command("SET", self.prefix + key, value)
+
+    def add(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        args = ["SET", self.prefix + key, value, "NX"] + (["PX", int(ttl * 1000)] if ttl else [])
+        reply = self.command(*args)
+        if reply is None and getattr(self._local, "conn", None) is None:
+            # Sin Redis no hay a quién esperar: el llamador genera por su cuenta, sin coordinarse
+            self.lock_fallbacks += 1
+            now = time.monotonic()
+            if now - self._last_lock_warning > 30:
+                self._last_lock_warning = now
+                logger.warning(f"⚠️ Candado sin Redis ({self.host}:{self.port}): se genera sin coordinar instancias")
+            return True
+        return reply == "OK"
+
+    def delete(self, key: str):
+        self.command("DEL", self.prefix + key)
+
+    def delete_if(self, key: str, value: bytes):
+        self.command("EVAL", RELEASE_SCRIPT, 1, self.prefix + key, value)
+
+    def expire_if(self, key: str, value: bytes, ttl: float) -> bool:
+        reply = self.command("EVAL", REFRESH_SCRIPT, 1, self.prefix + key, value, int(ttl * 1000))
+        # Sin Redis no se sabe de quién es el candado: se sigue generando
+        return reply is None or reply == 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"backend": self.name, "url": f"redis://{self.host}:{self.port}/{self.db}", "errors": self.errors,
+                "lock_fallbacks": self.lock_fallbacks}
+
+
+_SHARED: Dict[str, CacheBackend] = {}
+
+
+def shared_backend_from_env() -> Optional[CacheBackend]:
+    """Backend compartido configurado con ``EXCEL_CACHE_BACKEND`` (None: cada caché usa su LRU local)"""
+    kind = os.environ.get("EXCEL_CACHE_BACKEND", BACKEND_LOCAL).strip().lower() or BACKEND_LOCAL
+    if kind not in BACKENDS:
+        logger.warning(f"⚠️ EXCEL_CACHE_BACKEND={kind} no es válido ({', '.join(BACKENDS)}), se usa {BACKEND_LOCAL}")
+        return None
+    if kind == BACKEND_LOCAL:
+        return None
+    url = os.environ.get("EXCEL_CACHE_REDIS_URL", "redis://localhost:6379/0")
+    if url not in _SHARED:
+        _SHARED[url] = RedisBackend(url, timeout=_env_int("EXCEL_CACHE_REDIS_TIMEOUT_MS", 2000) / 1000)
+    return _SHARED[url]
@@ -0,0 +1,167 @@
+"""Cancelación cooperativa de las generaciones (cliente desconectado o plazo vencido).
+
+Cuando la app agota su timeout reintenta la misma exportación (contra el
+servidor local), pero la solicitud original seguía generándose hasta el final:
+bajo carga el trabajo se duplicaba. Cada generación tiene un ``CancelToken``:
+
+- el plazo viene del encabezado ``X-Deadline-Ms`` (milisegundos desde que llega
+  la solicitud) o de ``EXCEL_DEFAULT_DEADLINE_MS``;
+- ``CancellationMonitor.run`` revisa cada ``EXCEL_CANCEL_POLL_MS`` si el cliente
+  se desconectó o venció el plazo y, si es así, cancela el trabajo;
+- los generadores llaman ``check_cancelled()`` entre lotes de filas y entre
+  años de la bitácora; el token viaja en un ``ContextVar`` (llega a los hilos de
+  ``run_in_threadpool``) y a los procesos del pool sólo llega el plazo.
+
+La generación cancelada se descarta (nada se guarda ni se entrega) y se cuenta
+en ``/api/metrics`` por motivo.
+"""
+import asyncio
+import os
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional
+
+DEADLINE_HEADER = "X-Deadline-Ms"
+REASON_DISCONNECT = "disconnect"
+REASON_DEADLINE = "deadline"
+
+# Filas entre revisiones de cancelación en los generadores
+CANCEL_CHECK_ROWS = 100
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class GenerationCancelled(BaseException):
+    """La generación se canceló (``reason``: disconnect o deadline).
+
+    Hereda de ``BaseException``, como ``asyncio.CancelledError``, para que los
+    ``except Exception`` de los generadores no la conviertan en un error 500.
+    """
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class InvalidDeadline(ValueError):
+    """El encabezado ``X-Deadline-Ms`` no es un entero positivo"""
+
+
+class CancelToken:
+    """Estado de cancelación de una generación; ``deadline`` es una hora epoch (sirve entre procesos)"""
+
+    def __init__(self, deadline: Optional[float] = None):
+        self.deadline = deadline
+        self.reason: Optional[str] = None
+
+    def cancel(self, reason: str):
+        if self.reason is None:
+            self.reason = reason
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.time() >= self.deadline
+
+    def check(self):
+        if self.reason is None and self.expired():
+            self.reason = REASON_DEADLINE
+        if self.reason is not None:
+            raise GenerationCancelled(self.reason)
+
+
+_CURRENT: ContextVar[Optional[CancelToken]] = ContextVar("excel_cancel_token", default=None)
+
+
+def current_token() -> Optional[CancelToken]:
+    return _CURRENT.get()
+
+
+def check_cancelled():
+    """Lanza ``GenerationCancelled`` si la generación en curso se canceló (sin token no hace nada)"""
+    token = _CURRENT.get()
+    if token is not None:
+        token.check()
+
+
+def call_with_deadline(deadline: Optional[float], fn: Callable, *args):
+    """Ejecuta ``fn(*args)`` en un proceso del pool con el plazo de la solicitud que lo pidió"""
+    reset = _CURRENT.set(CancelToken(deadline) if deadline is not None else None)
+    try:
+        return fn(*args)
+    finally:
+        _CURRENT.reset(reset)
+
+
+class CancellationMonitor:
+    """Plazos por solicitud, vigilancia de desconexión y contadores de cancelaciones."""
+
+    def __init__(self, default_deadline_ms: int, poll_ms: int):
+        self.default_deadline_ms = max(0, default_deadline_ms)
+        self.poll_seconds = max(10, poll_ms) / 1000
+        self.active = 0
+        self.completed = 0
+        self.cancelled = {REASON_DISCONNECT: 0, REASON_DEADLINE: 0}
+
+    @classmethod
+    def from_env(cls) -> "CancellationMonitor":
+        return cls(default_deadline_ms=_env_int("EXCEL_DEFAULT_DEADLINE_MS", 0),
+                   poll_ms=_env_int("EXCEL_CANCEL_POLL_MS", 200))
+
+    def token(self, headers: Mapping[str, str]) -> CancelToken:
+        """Token con el plazo del encabezado (o el default; 0 = sin plazo)"""
+        value = headers.get(DEADLINE_HEADER)
+        if value is None:
+            deadline_ms = self.default_deadline_ms
+        else:
+            try:
+                deadline_ms = int(value)
+            except ValueError:
+                deadline_ms = 0
+            if deadline_ms <= 0:
+                raise InvalidDeadline(f"{DEADLINE_HEADER} must be a positive integer (milliseconds)")
+        return CancelToken(time.time() + deadline_ms / 1000 if deadline_ms else None)
+
+    def count(self, reason: str):
+        self.cancelled[reason] = self.cancelled.get(reason, 0) + 1
+
+    async def run(self, token: CancelToken, work: Callable[[], Awaitable[Any]],
+                  is_disconnected: Callable[[], Awaitable[bool]]) -> Any:
+        """Ejecuta ``work()`` con ``token`` como generación en curso; la cancela si el cliente
+        se desconecta o vence el plazo (``GenerationCancelled``)"""
+        reset = _CURRENT.set(token)
+        try:
+            # La tarea copia el contexto al crearse: el token llega al trabajo y a sus hilos
+            task = asyncio.ensure_future(work())
+        finally:
+            _CURRENT.reset(reset)
+        self.active += 1
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=self.poll_seconds)
+                if done:
+                    result = task.result()
+                    self.completed += 1
+                    return result
+                if token.expired():
+                    token.cancel(REASON_DEADLINE)
+                elif await is_disconnected():
+                    token.cancel(REASON_DISCONNECT)
+                if token.reason is not None:
+                    raise GenerationCancelled(token.reason)
+        except GenerationCancelled as e:
+            self.count(e.reason)
+            raise
+        finally:
+            self.active -= 1
+            if not task.done():
+                # Lo que siga en un hilo se detiene en su siguiente check_cancelled()
+                token.cancel(REASON_DISCONNECT)
+                task.cancel()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"default_deadline_ms": self.default_deadline_ms, "active": self.active,
+                "completed": self.completed, "cancelled": dict(self.cancelled)}
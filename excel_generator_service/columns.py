@@ -0,0 +1,302 @@
+"""Mapeo declarativo de columnas de cada reporte.
+
+Es la única fuente de verdad de qué campo del item va en qué columna y con qué
+encabezado. La usan tanto las plantillas con estilo de ``main.py`` como los
+formatos rápidos (CSV / xlsx sin estilo), de modo que todos los formatos
+exportan exactamente los mismos datos.
+"""
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class Column:
+    """Una columna del reporte: encabezado, campo del item, alias y transformación."""
+    header: str
+    field: str
+    fallbacks: Tuple[str, ...] = ()
+    default: Any = ""
+    transform: Optional[Callable[[Any], Any]] = None
+
+    def value(self, item: Dict[str, Any]) -> Any:
+        # Igual que item.get(field, item.get(alias, default)): la primera llave presente gana
+        for key in (self.field,) + self.fallbacks:
+            if key in item:
+                value = item[key]
+                break
+        else:
+            value = self.default
+        return self.transform(value) if self.transform else value
+
+
+def format_fecha_bitacora(fecha_str: Any) -> Any:
+    """Convierte YYYY-MM-DD a DD/MM/YYYY; cualquier otro valor se deja igual"""
+    if not fecha_str:
+        return ""
+    try:
+        return datetime.strptime(fecha_str, "%Y-%m-%d").strftime("%d/%m/%Y")
+    except (TypeError, ValueError):
+        return fecha_str
+
+
+def parse_fecha_bitacora(value: Any) -> Any:
+    """Inverso de ``format_fecha_bitacora``: DD/MM/YYYY (o fecha de Excel) a YYYY-MM-DD"""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d")
+    try:
+        return datetime.strptime(str(value).strip(), "%d/%m/%Y").strftime("%Y-%m-%d")
+    except ValueError:
+        return value
+
+
+def normalize_en_stock(value: Any) -> str:
+    return str(value).upper().strip()
+
+
+@lru_cache(maxsize=4096)
+def _rack_number(rack: str) -> str:
+    # Extraer número del rack (ej: "1" de "Rack 1" o "1")
+    if "rack" in rack.lower():
+        match = re.search(r'\d+', rack)
+        if match:
+            return match.group()
+    return rack
+
+
+def _location_text(rack: str, contenedor: str) -> str:
+    if rack and contenedor:
+        return f"R{_rack_number(rack)}-{contenedor}"
+    # Si solo hay contenedor sin rack, solo mostrar el contenedor
+    return contenedor
+
+
+def jumper_locations(item: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+    """(texto, contenedor) de cada ubicación del item; el texto es R{rack}-{contenedor} o el contenedor"""
+    locations = []
+    for cont in item.get("contenedores") or []:
+        text = _location_text(str(cont.get("rack", "")).strip(), str(cont.get("contenedor", "")).strip())
+        if text:
+            locations.append((text, cont))
+
+    # Si no hay contenedores múltiples, usar rack/contenedor antiguo como fallback
+    if not locations:
+        rack = str(item.get("rack", "")).strip()
+        contenedor = str(item.get("contenedor", item.get("container", ""))).strip()
+        text = _location_text(rack, contenedor)
+        if text:
+            locations.append((text, {"rack": rack, "contenedor": contenedor}))
+    return locations
+
+
+def jumper_ubicacion(item: Dict[str, Any]) -> str:
+    """Texto de UBICACION: contenedores múltiples como R{rack}-{contenedor} separados por comas"""
+    return ", ".join(text for text, _ in jumper_locations(item))
+
+
+def parse_jumper_ubicacion(text: Any) -> List[Dict[str, str]]:
+    """Inverso de ``jumper_ubicacion``: "R1-C8, C9" a [{"rack": "1", "contenedor": "C8"}, {"contenedor": "C9"}]"""
+    contenedores = []
+    for part in str(text or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        match = re.match(r'^R([^-]+)-(.+)$', part)
+        if match:
+            contenedores.append({"rack": match.group(1), "contenedor": match.group(2)})
+        else:
+            contenedores.append({"contenedor": part})
+    return contenedores
+
+
+class _Computed(Column):
+    """Columna cuyo valor se calcula a partir del item completo"""
+
+    def value(self, item: Dict[str, Any]) -> Any:
+        return self.transform(item)
+
+
+# Jumpers: plantilla desde la columna B; UBICACION se localiza por encabezado
+JUMPERS_COLUMN_MAP: List[Column] = [
+    Column("TIPO", "tipo", ("categoryName",)),
+    Column("TAMAÑO (metros)", "tamano", ("size",)),
+    Column("CANTIDAD", "cantidad", ("quantity",), default=0),
+    _Computed("UBICACIÓN", "contenedores", transform=jumper_ubicacion),
+]
+
+# Cómputo: plantilla de 40 columnas desde la columna A (A=ID ... AN=OBSERVACIONES)
+COMPUTO_COLUMN_MAP: List[Column] = [
+    Column("ID", "id", default=None),
+    Column("INVENTARIO", "inventario"),
+    Column("EQUIPO PM", "equipo_pm"),
+    Column("FECHA REGISTRO", "fecha_registro"),
+    Column("TIPO DE EQUIPO", "tipo_equipo"),
+    Column("MARCA", "marca"),
+    Column("MODELO", "modelo"),
+    Column("PROCESADOR", "procesador"),
+    Column("NUMERO DE SERIE", "numero_serie"),
+    Column("DISCO DURO", "disco_duro"),
+    Column("MEMORIA", "memoria"),
+    Column("SISTEMA OPERATIVO INSTALADO", "sistema_operativo_instalado", ("sistema_operativo",)),
+    Column("ETIQUETA DE SISTEMA OPERATIVO", "etiqueta_sistema_operativo"),
+    Column("OFFICE INSTALADO", "office_instalado"),
+    Column("DIRECCIÓN FISICA DEL EQUIPO", "direccion_fisica", ("ubicacion_fisica",)),
+    Column("ESTADO", "estado"),
+    Column("CIUDAD", "ciudad"),
+    Column("TIPO DE EDIFICIO", "tipo_edificio"),
+    Column("NOMBRE DEL EDIFICIO", "nombre_edificio"),
+    Column("TIPO DE USO", "tipo_uso"),
+    Column("NOMBRE DEL EQUIPO EN DOMINIO", "nombre_equipo_dominio"),
+    Column("STATUS", "status"),
+    Column("DIRECCIÓN ADMINISTRATIVA", "direccion_administrativa"),
+    Column("SUBDIRECCIÓN", "subdireccion"),
+    Column("GERENCIA", "gerencia"),
+    # Usuario Responsable (la plantilla lo tiene antes que el Usuario Final)
+    Column("EXPEDIENTE", "expediente_responsable"),
+    Column("NOMBRE COMPLETO", "nombre_completo_responsable"),
+    Column("APELLIDO PATERNO", "apellido_paterno_responsable"),
+    Column("APELLIDO MATERNO", "apellido_materno_responsable"),
+    Column("NOMBRE", "nombre_responsable"),
+    Column("EMPRESA", "empresa_responsable"),
+    Column("PUESTO", "puesto_responsable"),
+    # Usuario Final
+    Column("EXPEDIENTE", "expediente_final"),
+    Column("NOMBRE COMPLETO", "nombre_completo_final"),
+    Column("APELLIDO PATERNO", "apellido_paterno_final"),
+    Column("APELLIDO MATERNO", "apellido_materno_final"),
+    Column("NOMBRE", "nombre_final"),
+    Column("EMPRESA", "empresa_final"),
+    Column("PUESTO", "puesto_final"),
+    Column("OBSERVACIONES", "observaciones"),
+]
+
+# SICOR: plantilla desde la columna B
+SICOR_COLUMN_MAP: List[Column] = [
+    Column("EN STOCK", "en_stock", default="SI", transform=normalize_en_stock),
+    Column("No.", "numero"),
+    Column("CODIGO", "codigo"),
+    Column("SERIE", "serie"),
+    Column("MARCA", "marca"),
+    Column("POSICION", "posicion"),
+    Column("COMENTARIOS", "comentarios"),
+]
+
+# Bitácora: plantilla desde la columna B (en la plantilla COBO se llama "INCIDENTE")
+BITACORA_COLUMN_MAP: List[Column] = [
+    Column("CONSECUTIVO", "consecutivo"),
+    Column("FECHA", "fecha", transform=format_fecha_bitacora),
+    Column("TEC", "tecnico"),
+    Column("TARJETA", "tarjeta"),
+    Column("CODIGO", "codigo"),
+    Column("SERIE", "serie"),
+    Column("FOLIO", "folio"),
+    Column("ENVIA", "envia"),
+    Column("RECIBE", "recibe"),
+    Column("GUIA", "guia"),
+    Column("ANEXOS / FOLIO STOCK", "anexos"),
+    Column("INCIDENTE", "cobo"),
+    Column("OBSERVACIONES", "observaciones"),
+]
+
+# SDR: formulario de un solo registro; (fila de la plantilla, columna) en la columna B
+SDR_CELL_MAP: List[Tuple[int, Column]] = [
+    # Datos de Falla de aviso
+    (9, Column("Fecha", "fecha", ("date",))),
+    (10, Column("Descripción del Aviso", "descripcion_aviso", ("descripcion_del_aviso",))),
+    (11, Column("Grupo planificador", "grupo_planificador")),
+    (12, Column("Puesto de trabajo responsable", "puesto_trabajo_responsable")),
+    (13, Column("Autor de aviso", "autor_aviso")),
+    (14, Column("Motivo de intervención", "motivo_intervencion")),
+    (15, Column("Modelo del Daño", "modelo_dano", ("modelo_del_dano",))),
+    (16, Column("Causa de la avería", "causa_averia")),
+    (17, Column("Repercusión en el funcionamiento", "repercusion_funcionamiento")),
+    (18, Column("Estado de la Instalación", "estado_instalacion")),
+    (19, Column("Motivo de Intervención (AFECTACION)", "motivo_intervencion_afectacion")),
+    (21, Column("Atención del Daño", "atencion_dano")),
+    (22, Column("Prioridad", "prioridad")),
+    # Lugar del Daño
+    (25, Column("Centro Emplazamiento", "centro_emplazamiento")),
+    (26, Column("Área de empresa", "area_empresa")),
+    (27, Column("Puesto trabajo de emplazamiento", "puesto_trabajo_emplazamiento")),
+    (28, Column("División", "division")),
+    (29, Column("Estado de Instalación", "estado_instalacion_lugar")),
+    (30, Column("Datos disponibles", "datos_disponibles")),
+    (32, Column("Emplazamiento", "emplazamiento_1", ("emplazamiento",))),
+    (33, Column("Emplazamiento", "emplazamiento_2", ("emplazamiento",))),
+    (34, Column("Local", "local")),
+    (35, Column("Campo de clasificación", "campo_clasificacion")),
+    # Datos de la unidad Dañada
+    (38, Column("Tipo (unidad dañada)", "tipo_unidad_danada")),
+    (39, Column("No de serie (unidad dañada)", "no_serie_unidad_danada")),
+    # Datos de la unidad que se montó
+    (42, Column("Tipo (unidad montada)", "tipo_unidad_montada")),
+    (43, Column("No de serie (unidad montada)", "no_serie_unidad_montada")),
+]
+SDR_COLUMN_MAP: List[Column] = [column for _, column in SDR_CELL_MAP]
+# Celdas del formulario SDR por referencia (B y C están combinadas: se escribe en B)
+SDR_FORM_CELLS: List[Tuple[str, Column]] = [(f"B{row}", column) for row, column in SDR_CELL_MAP]
+
+COLUMN_MAPS: Dict[str, List[Column]] = {
+    "jumpers": JUMPERS_COLUMN_MAP,
+    "computo": COMPUTO_COLUMN_MAP,
+    "sicor": SICOR_COLUMN_MAP,
+    "bitacora": BITACORA_COLUMN_MAP,
+    "sdr": SDR_COLUMN_MAP,
+}
+
+
+def report_headers(report: str) -> List[str]:
+    return [column.header for column in COLUMN_MAPS[report]]
+
+
+def row_values(columns: List[Column], item: Dict[str, Any]) -> List[Any]:
+    return [column.value(item) for column in columns]
+
+
+def memoized(transform: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    """``transform`` evaluado una sola vez por valor distinto (los no hasheables se calculan siempre)"""
+    cache: Dict[Any, Any] = {}
+
+    def apply(value: Any) -> Any:
+        # El tipo es parte de la llave: True y 1 (o "1") no deben compartir resultado
+        key = (value.__class__, value)
+        try:
+            return cache[key]
+        except KeyError:
+            result = cache[key] = transform(value)
+            return result
+        except TypeError:
+            return transform(value)
+    return apply
+
+
+def column_values(column: Column, items: List[Dict[str, Any]]) -> List[Any]:
+    """Valores de una columna para todos los items, con la transformación memoizada"""
+    if isinstance(column, _Computed):
+        return [column.transform(item) for item in items]
+    if column.fallbacks:
+        keys = (column.field,) + column.fallbacks
+        raw = []
+        for item in items:
+            for key in keys:
+                if key in item:
+                    raw.append(item[key])
+                    break
+            else:
+                raw.append(column.default)
+    else:
+        field, default = column.field, column.default
+        raw = [item.get(field, default) for item in items]
+    if column.transform is None:
+        return raw
+    transform = memoized(column.transform)
+    return [transform(value) for value in raw]
+
+
+def table_rows(columns: List[Column], items: List[Dict[str, Any]]) -> List[List[Any]]:
+    """Igual que ``row_values`` para cada item, pero normalizando columna por columna"""
+    if not items:
+        return []
+    return [list(row) for row in zip(*(column_values(column, items) for column in columns))]
@@ -0,0 +1,61 @@
+"""Reglas de formato condicional para los colores de estado de los reportes.
+
+En lugar de asignar un relleno y una fuente a cada celda (lo que crea un estilo
+por combinación y hace crecer la tabla de estilos), cada celda de datos conserva
+el estilo base de la fila de referencia y los colores se expresan como unas
+pocas reglas sobre el rango de datos de la hoja.
+"""
+from typing import Dict
+
+from openpyxl.formatting.rule import FormulaRule
+from openpyxl.styles import Font, PatternFill
+from openpyxl.utils import get_column_letter
+
+
+def solid_fill(color: str) -> PatternFill:
+    return PatternFill(start_color=color, end_color=color, fill_type="solid")
+
+
+def _range(first_col: int, last_col: int, first_row: int, last_row: int) -> str:
+    return f"{get_column_letter(first_col)}{first_row}:{get_column_letter(last_col)}{last_row}"
+
+
+def add_sicor_stock_rules(ws, first_row: int, last_row: int, first_col: int = 2):
+    """SICOR: filas con EN STOCK = "NO" en rojo (texto blanco en EN STOCK y No.);
+    CODIGO en azul cuando sí está en stock"""
+    if last_row < first_row:
+        return
+    stock = f"${get_column_letter(first_col)}{first_row}"
+    no_stock = f'{stock}="NO"'
+    red = solid_fill("FF0000")
+    ws.conditional_formatting.add(
+        _range(first_col, first_col + 1, first_row, last_row),
+        FormulaRule(formula=[no_stock], fill=red, font=Font(color="FFFFFF"), stopIfTrue=True))
+    ws.conditional_formatting.add(
+        _range(first_col + 2, first_col + 6, first_row, last_row),
+        FormulaRule(formula=[no_stock], fill=red, stopIfTrue=True))
+    ws.conditional_formatting.add(
+        _range(first_col + 2, first_col + 2, first_row, last_row),
+        FormulaRule(formula=[f'{stock}<>"NO"'], fill=solid_fill("558ED5")))
+
+
+def add_category_color_rules(ws, col: int, first_row: int, last_row: int, colors: Dict[str, str]):
+    """Colorea la columna según la categoría: coincide si el texto contiene la categoría o
+    está contenido en ella (sin distinguir mayúsculas); gana la primera categoría del mapa"""
+    if last_row < first_row:
+        return
+    cell = f"${get_column_letter(col)}{first_row}"
+    target = _range(col, col, first_row, last_row)
+    for category, color in colors.items():
+        formula = (f'AND({cell}<>"",OR(ISNUMBER(SEARCH("{category}",{cell})),'
+                   f'ISNUMBER(SEARCH(TRIM({cell}),"{category}"))))')
+        ws.conditional_formatting.add(target, FormulaRule(formula=[formula], fill=solid_fill(color), stopIfTrue=True))
+
+
+def add_row_banding(ws, first_col: int, last_col: int, first_row: int, last_row: int, color: str = "F2F2F2"):
+    """Bandas de color en filas pares (numeración de la hoja) sobre el rango de datos"""
+    if last_row < first_row:
+        return
+    ws.conditional_formatting.add(
+        _range(first_col, last_col, first_row, last_row),
+        FormulaRule(formula=["MOD(ROW(),2)=0"], fill=solid_fill(color)))
@@ -0,0 +1,319 @@
+"""Origen de datos opcional: leer los items directamente de Postgres.
+
+En lugar de que la app descargue todas las filas de Supabase y las vuelva a
+subir como JSON, los endpoints ``generate-*`` aceptan una llave ``source`` con
+la especificación de la consulta::
+
+    {"source": {"inventory_id": "...", "years": [2024, 2025], "filters": {"marca": "HUAWEI"}}}
+
+El servicio consulta las tablas con un pool de conexiones asíncrono (asyncpg)
+y un cursor del lado del servidor, y entrega los items con las mismas llaves
+que envía la app, en lotes de ``CURSOR_PREFETCH`` filas: los formatos rápidos
+(CSV y xlsx sin estilo) los escriben conforme llegan, sin juntar toda la
+consulta en memoria. Es una dependencia opcional: sin ``asyncpg`` instalado o sin
+``EXCEL_DATABASE_URL`` los endpoints responden 503 al recibir ``source``.
+"""
+import json
+import os
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+try:
+    import asyncpg
+except ImportError:  # pragma: no cover - dependencia opcional
+    asyncpg = None
+
+CURSOR_PREFETCH = 2000
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class SourceNotConfigured(Exception):
+    """No hay driver o URL de base de datos para atender ``source``."""
+
+
+class InvalidSourceSpec(ValueError):
+    """La especificación de ``source`` no es válida para el reporte."""
+
+
+@dataclass(frozen=True)
+class ReportQuery:
+    """Consulta base de un reporte; ``filters`` son las columnas SQL permitidas por llave."""
+    sql: str
+    order_by: str
+    filters: Dict[str, str] = field(default_factory=dict)
+    inventory_column: Optional[str] = None
+    year_column: Optional[str] = None
+
+
+QUERIES: Dict[str, ReportQuery] = {
+    "sicor": ReportQuery(
+        sql="""
+            SELECT t.en_stock, t.numero, t.codigo, t.serie, t.marca, t.posicion, t.comentarios
+            FROM t_tarjetas_red t
+        """,
+        order_by="t.id_tarjeta_red",
+        filters={"en_stock": "t.en_stock", "marca": "t.marca", "posicion": "t.posicion"},
+    ),
+    "bitacora": ReportQuery(
+        sql="""
+            SELECT left(b.fecha, 4) AS year, b.consecutivo, b.fecha, b.tecnico, b.tarjeta, b.codigo, b.serie,
+                   b.folio, b.envia, b.recibe, b.guia, b.anexos, b.observaciones, b.cobo
+            FROM t_bitacora_envios b
+        """,
+        order_by="b.fecha, b.id_bitacora",
+        filters={"tecnico": "b.tecnico", "tarjeta": "b.tarjeta", "estado": "b.estado"},
+        year_column="left(b.fecha, 4)",
+    ),
+    # Jumpers: productos de la categoría de la sesión de inventario, con la cantidad capturada en la
+    # sesión (o la del inventario si no se capturó) y sus contenedores
+    "jumpers": ReportQuery(
+        sql="""
+            SELECT s.category_name AS tipo, p.tamano,
+                   COALESCE((s.quantities ->> p.id_producto::text)::int, i.cantidad, 0) AS cantidad,
+                   COALESCE(p.rack::text, '') AS rack, COALESCE(p.contenedor, '') AS contenedor,
+                   COALESCE((SELECT json_agg(json_build_object('rack', COALESCE(jc.rack, ''),
+                                                               'contenedor', jc.contenedor)
+                                             ORDER BY jc.fecha_registro DESC)
+                             FROM t_jumper_contenedores jc
+                             WHERE jc.id_producto = p.id_producto), '[]'::json) AS contenedores
+            FROM inventory_sessions s
+            JOIN t_productos_categorias pc ON pc.id_categoria = s.category_id
+            JOIN t_productos p ON p.id_producto = pc.id_producto
+            LEFT JOIN LATERAL (SELECT sum(cantidad) AS cantidad FROM t_inventarios
+                               WHERE id_producto = p.id_producto) i ON true
+        """,
+        order_by="p.tamano, p.id_producto",
+        inventory_column="s.id",
+    ),
+    # Cómputo: equipo principal y, con el mismo ID y EQUIPO PM, cada accesorio como fila aparte
+    "computo": ReportQuery(
+        sql="""
+            WITH equipos AS (
+                SELECT d.id_equipo_computo, d.inventario, ep.equipo_pm, d.fecha_registro, d.tipo_equipo,
+                       d.marca, d.modelo, d.procesador, d.numero_serie, d.disco_duro, d.memoria_ram,
+                       sw.sistema_operativo_instalado, sw.etiqueta_sistema_operativo, sw.office_instalado,
+                       u.direccion_fisica, u.estado, u.ciudad, u.tipo_edificio, u.nombre_edificio,
+                       idn.tipo_uso, idn.nombre_equipo_dominio, idn.status, idn.direccion_administrativa,
+                       idn.subdireccion, idn.gerencia,
+                       r.expediente AS expediente_responsable, r.apellido_paterno AS apellido_paterno_responsable,
+                       r.apellido_materno AS apellido_materno_responsable, r.nombre AS nombre_responsable,
+                       r.empresa AS empresa_responsable, r.puesto AS puesto_responsable,
+                       f.expediente AS expediente_final, f.apellido_paterno AS apellido_paterno_final,
+                       f.apellido_materno AS apellido_materno_final, f.nombre AS nombre_final,
+                       f.empresa AS empresa_final, f.puesto AS puesto_final,
+                       o.observaciones
+                FROM t_computo_detalles_generales d
+                LEFT JOIN t_computo_equipos_principales ep ON ep.id_equipo_principal = d.equipo_pm
+                LEFT JOIN t_computo_ubicacion u ON u.id_ubicacion = d.id_ubicacion
+                LEFT JOIN t_computo_usuario_responsable r ON r.id_usuario_responsable = d.id_usuario_responsable
+                LEFT JOIN LATERAL (SELECT * FROM t_computo_software
+                                   WHERE id_equipo_computo = d.id_equipo_computo
+                                   ORDER BY actualizado_en DESC LIMIT 1) sw ON true
+                LEFT JOIN LATERAL (SELECT * FROM t_computo_identificacion
+                                   WHERE id_equipo_computo = d.id_equipo_computo
+                                   ORDER BY actualizado_en DESC LIMIT 1) idn ON true
+                LEFT JOIN LATERAL (SELECT * FROM t_computo_usuario_final
+                                   WHERE id_equipo_computo = d.id_equipo_computo
+                                   ORDER BY actualizado_en DESC LIMIT 1) f ON true
+                LEFT JOIN LATERAL (SELECT observaciones FROM t_computo_observaciones
+                                   WHERE id_equipo_computo = d.id_equipo_computo::text
+                                   ORDER BY actualizado_en DESC LIMIT 1) o ON true
+            )
+            SELECT * FROM (
+                SELECT e.id_equipo_computo AS id, 0 AS orden, e.inventario, e.equipo_pm,
+                       e.fecha_registro::text AS fecha_registro, e.tipo_equipo, e.marca, e.modelo, e.procesador,
+                       e.numero_serie, e.disco_duro, e.memoria_ram AS memoria, e.sistema_operativo_instalado,
+                       e.etiqueta_sistema_operativo, e.office_instalado, e.direccion_fisica, e.estado, e.ciudad,
+                       e.tipo_edificio, e.nombre_edificio, e.tipo_uso, e.nombre_equipo_dominio, e.status,
+                       e.direccion_administrativa, e.subdireccion, e.gerencia, e.expediente_responsable,
+                       concat_ws(' ', e.nombre_responsable, e.apellido_paterno_responsable,
+                                 e.apellido_materno_responsable) AS nombre_completo_responsable,
+                       e.apellido_paterno_responsable, e.apellido_materno_responsable, e.nombre_responsable,
+                       e.empresa_responsable, e.puesto_responsable, e.expediente_final,
+                       concat_ws(' ', e.nombre_final, e.apellido_paterno_final,
+                                 e.apellido_materno_final) AS nombre_completo_final,
+                       e.apellido_paterno_final, e.apellido_materno_final, e.nombre_final, e.empresa_final,
+                       e.puesto_final, e.observaciones
+                FROM equipos e
+                UNION ALL
+                SELECT e.id_equipo_computo, a.id_accesorio, COALESCE(a.inventario, 'S/N'), e.equipo_pm,
+                       COALESCE(a.fecha_registro, e.fecha_registro)::text, upper(a.tipo_equipo), a.marca, a.modelo,
+                       '', a.numero_serie, '', '', '', '', '', e.direccion_fisica, e.estado, e.ciudad,
+                       e.tipo_edificio, e.nombre_edificio, e.tipo_uso, e.nombre_equipo_dominio, e.status,
+                       e.direccion_administrativa, e.subdireccion, e.gerencia, e.expediente_responsable,
+                       concat_ws(' ', e.nombre_responsable, e.apellido_paterno_responsable,
+                                 e.apellido_materno_responsable),
+                       e.apellido_paterno_responsable, e.apellido_materno_responsable, e.nombre_responsable,
+                       e.empresa_responsable, e.puesto_responsable, e.expediente_final,
+                       concat_ws(' ', e.nombre_final, e.apellido_paterno_final, e.apellido_materno_final),
+                       e.apellido_paterno_final, e.apellido_materno_final, e.nombre_final, e.empresa_final,
+                       e.puesto_final, ''
+                FROM equipos e
+                JOIN t_accesorios_equipos a ON a.id_equipo_computo = e.id_equipo_computo
+            ) filas
+        """,
+        order_by="filas.id, filas.orden",
+        filters={"estado": "filas.estado", "ciudad": "filas.ciudad", "status": "filas.status",
+                 "tipo_equipo": "filas.tipo_equipo", "gerencia": "filas.gerencia"},
+    ),
+}
+
+
+@dataclass(frozen=True)
+class QuerySpec:
+    inventory_id: Optional[str] = None
+    years: Tuple[int, ...] = ()
+    filters: Dict[str, Any] = field(default_factory=dict)
+    limit: Optional[int] = None
+
+    @classmethod
+    def from_payload(cls, source: Any) -> "QuerySpec":
+        if not isinstance(source, dict):
+            raise InvalidSourceSpec("source must be an object")
+        years = source.get("years") or ([source["year"]] if source.get("year") is not None else [])
+        filters = source.get("filters") or {}
+        if not isinstance(filters, dict):
+            raise InvalidSourceSpec("source.filters must be an object")
+        try:
+            years = tuple(int(year) for year in years)
+            limit = int(source["limit"]) if source.get("limit") is not None else None
+        except (TypeError, ValueError):
+            raise InvalidSourceSpec("source.years and source.limit must be integers")
+        inventory_id = source.get("inventory_id")
+        return cls(inventory_id=str(inventory_id) if inventory_id is not None else None,
+                   years=years, filters=filters, limit=limit)
+
+
+def build_query(report: str, spec: QuerySpec, max_rows: int) -> Tuple[str, List[Any]]:
+    """SQL parametrizado del reporte; sólo se aceptan filtros de la lista blanca"""
+    query = QUERIES.get(report)
+    if query is None:
+        raise InvalidSourceSpec(f"source is not supported for report '{report}'")
+
+    conditions: List[str] = []
+    args: List[Any] = []
+
+    def param(value: Any) -> str:
+        args.append(value)
+        return f"${len(args)}"
+
+    if query.inventory_column:
+        if not spec.inventory_id:
+            raise InvalidSourceSpec(f"source.inventory_id is required for report '{report}'")
+        conditions.append(f"{query.inventory_column} = {param(spec.inventory_id)}")
+    if spec.years:
+        if not query.year_column:
+            raise InvalidSourceSpec(f"source.years is not supported for report '{report}'")
+        conditions.append(f"{query.year_column} = ANY({param([str(year) for year in spec.years])}::text[])")
+    for key, value in spec.filters.items():
+        column = query.filters.get(key)
+        if column is None:
+            allowed = ", ".join(sorted(query.filters)) or "none"
+            raise InvalidSourceSpec(f"filter '{key}' is not allowed for report '{report}' (allowed: {allowed})")
+        if isinstance(value, list):
+            conditions.append(f"{column} = ANY({param([str(v) for v in value])}::text[])")
+        else:
+            conditions.append(f"{column} = {param(str(value))}")
+
+    sql = query.sql.strip()
+    if conditions:
+        sql += "\nWHERE " + " AND ".join(conditions)
+    limit = min(spec.limit, max_rows) if spec.limit else max_rows
+    sql += f"\nORDER BY {query.order_by}\nLIMIT {param(limit)}"
+    return sql, args
+
+
+class PostgresSource:
+    """Pool de conexiones creado en la primera solicitud con ``source``."""
+
+    def __init__(self, dsn: Optional[str], min_size: int, max_size: int, max_rows: int):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_rows = max_rows
+        self._pool = None
+
+    @classmethod
+    def from_env(cls) -> "PostgresSource":
+        return cls(
+            dsn=os.environ.get("EXCEL_DATABASE_URL") or None,
+            min_size=_env_int("EXCEL_DB_POOL_MIN", 1),
+            max_size=_env_int("EXCEL_DB_POOL_MAX", 5),
+            max_rows=_env_int("EXCEL_DB_MAX_ROWS", 2_000_000),
+        )
+
+    @property
+    def configured(self) -> bool:
+        return asyncpg is not None and bool(self.dsn)
+
+    async def _get_pool(self):
+        if asyncpg is None:
+            raise SourceNotConfigured("asyncpg is not installed")
+        if not self.dsn:
+            raise SourceNotConfigured("EXCEL_DATABASE_URL is not set")
+        if self._pool is None:
+            self._pool = await asyncpg.create_pool(self.dsn, min_size=self.min_size, max_size=self.max_size,
+                                                   init=_init_connection)
+        return self._pool
+
+    async def iter_batches(self, report: str, spec: QuerySpec) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Items del reporte en lotes de ``CURSOR_PREFETCH``, leídos con un cursor del servidor.
+
+        La conexión queda tomada hasta que se agota el iterador o se cierra con ``aclose()``.
+        """
+        sql, args = build_query(report, spec, self.max_rows)
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction(readonly=True):
+                cursor = await conn.cursor(sql, *args)
+                while True:
+                    records = await cursor.fetch(CURSOR_PREFETCH)
+                    if not records:
+                        return
+                    yield [{key: ("" if value is None else value) for key, value in record.items()}
+                           for record in records]
+
+    async def fetch_items(self, report: str, spec: QuerySpec) -> List[Dict[str, Any]]:
+        """Todos los items del reporte (el xlsx con plantilla los necesita juntos para ordenar y dividir)"""
+        items: List[Dict[str, Any]] = []
+        async for batch in self.iter_batches(report, spec):
+            items.extend(batch)
+        return items
+
+    async def fetch_years_data(self, spec: QuerySpec) -> List[Dict[str, Any]]:
+        """Bitácora agrupada por año, en el formato ``years_data`` del endpoint"""
+        years: "OrderedDict[int, List[Dict[str, Any]]]" = OrderedDict()
+        for item in await self.fetch_items("bitacora", spec):
+            year = item.pop("year")
+            try:
+                year = int(year)
+            except (TypeError, ValueError):
+                pass
+            years.setdefault(year, []).append(item)
+        return [{"year": year, "items": items} for year, items in years.items()]
+
+    def snapshot(self) -> Dict[str, Any]:
+        pool = self._pool
+        return {
+            "configured": self.configured,
+            "pool_size": pool.get_size() if pool is not None else 0,
+            "pool_idle": pool.get_idle_size() if pool is not None else 0,
+            "max_rows": self.max_rows,
+        }
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+
+async def _init_connection(conn):
+    # json_agg de los contenedores de jumpers llega como lista de dicts
+    await conn.set_type_codec("json", encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
@@ -0,0 +1,247 @@
+"""Formatos rápidos para consumidores masivos: CSV y xlsx sin estilo.
+
+Ambos escriben las mismas columnas y encabezados que el reporte con plantilla
+(ver ``columns.py``), pero sin cargar la plantilla ni aplicar estilos. Se
+generan como iteradores de bytes, por lotes de filas, así que la memoria usada
+no depende del número de filas.
+"""
+import csv
+import io
+import itertools
+import math
+import re
+import zipfile
+from datetime import date, datetime
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+from xml.sax.saxutils import escape
+
+from openpyxl.utils import get_column_letter
+
+from split_policy import ZipStream
+from string_table import (SAMPLE_SIZE, SST_CONTENT_TYPE, SST_RELATIONSHIP, STRINGS_INLINE, SharedStringTable,
+                          shared_columns)
+from xlsx_parts import zip_entry
+
+FORMAT_XLSX = "xlsx"
+FORMAT_CSV = "csv"
+FORMAT_XLSX_RAW = "xlsx-raw"
+FORMATS = (FORMAT_XLSX, FORMAT_CSV, FORMAT_XLSX_RAW)
+
+CSV_MEDIA_TYPE = "text/csv; charset=utf-8"
+HTML_MEDIA_TYPE = "text/html; charset=utf-8"
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+ROWS_PER_CHUNK = 1000
+# El xlsx sin estilo prioriza velocidad sobre tamaño
+RAW_COMPRESS_LEVEL = 1
+
+# Caracteres de control que XML 1.0 no permite
+_ILLEGAL_XML_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+# Una hoja: (nombre, encabezados, filas)
+Sheet = Tuple[str, Sequence[str], Iterable[Sequence[Any]]]
+
+
+def iter_csv(header: Sequence[str], rows: Iterable[Sequence[Any]]) -> Iterator[bytes]:
+    """CSV en UTF-8, emitido en bloques de ``ROWS_PER_CHUNK`` filas"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(header)
+    pending = 0
+    for row in rows:
+        writer.writerow(["" if value is None else value for value in row])
+        pending += 1
+        if pending >= ROWS_PER_CHUNK:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue().encode("utf-8")
+
+
+def render_html(sheets: Iterable[Tuple[str, Sequence[str], Iterable[Sequence[Any]]]]) -> str:
+    """Tablas HTML mínimas (una por hoja) para la vista previa; sin estilos de la plantilla"""
+    parts = ['<!DOCTYPE html><html><head><meta charset="utf-8"><style>'
+             'table{border-collapse:collapse;font:12px sans-serif;margin-bottom:16px}'
+             'th,td{border:1px solid #999;padding:2px 6px;white-space:nowrap}th{background:#ddd}'
+             '</style></head><body>']
+    for title, header, rows in sheets:
+        parts.append(f"<h3>{escape(str(title))}</h3><table><tr>")
+        parts.extend(f"<th>{escape(str(value))}</th>" for value in header)
+        parts.append("</tr>")
+        for row in rows:
+            parts.append("<tr>")
+            parts.extend(f"<td>{'' if value is None else escape(str(value))}</td>" for value in row)
+            parts.append("</tr>")
+        parts.append("</table>")
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+def _cell_xml(ref: str, value: Any, table: Optional[SharedStringTable] = None) -> str:
+    if value is None or value == "":
+        return ""
+    if isinstance(value, bool):
+        return f'<c r="{ref}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, int) or (isinstance(value, float) and math.isfinite(value)):
+        return f'<c r="{ref}"><v>{value!r}</v></c>'
+    if isinstance(value, (datetime, date)):
+        value = value.isoformat()
+    text = escape(_ILLEGAL_XML_CHARS.sub("", str(value)))
+    if table is not None:
+        index = table.add(text)
+        if index is not None:
+            return f'<c r="{ref}" t="s"><v>{index}</v></c>'
+    space = ' xml:space="preserve"' if text[:1].isspace() or text[-1:].isspace() else ""
+    return f'<c r="{ref}" t="inlineStr"><is><t{space}>{text}</t></is></c>'
+
+
+def _row_xml(row_num: int, letters: List[str], values: Sequence[Any],
+             table: Optional[SharedStringTable] = None, shared: Set[int] = frozenset()) -> str:
+    while len(letters) < len(values):
+        letters.append(get_column_letter(len(letters) + 1))
+    cells = "".join(_cell_xml(f"{letters[i]}{row_num}", value, table if i in shared else None)
+                    for i, value in enumerate(values))
+    return f'<row r="{row_num}">{cells}</row>'
+
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '{sheets}{shared_strings}</Types>'
+)
+_SHEET_CONTENT_TYPE = (
+    '<Override PartName="/xl/worksheets/sheet{n}.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/></Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets>{sheets}</sheets></workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '{sheets}<Relationship Id="rIdStyles" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>{shared_strings}</Relationships>'
+)
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+_SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_TAIL = '</sheetData></worksheet>'
+
+
+def _sheet_title(title: str, used: set) -> str:
+    # Excel: máximo 31 caracteres, sin []:*?/\ y sin repetir
+    clean = re.sub(r'[\[\]:*?/\\]', '_', str(title))[:31] or "Hoja"
+    candidate, n = clean, 2
+    while candidate in used:
+        suffix = f" ({n})"
+        candidate = clean[:31 - len(suffix)] + suffix
+        n += 1
+    used.add(candidate)
+    return candidate
+
+
+def _shared_string_columns(encoding: str, sample: List[Sequence[Any]]) -> Set[int]:
+    """Índices de columna que van a la tabla compartida, según las primeras filas de la hoja"""
+    if encoding == STRINGS_INLINE:
+        return set()
+    columns = {}
+    for row in sample:
+        for i, value in enumerate(row):
+            if isinstance(value, str):
+                columns.setdefault(i, []).append(value)
+    return shared_columns(encoding, columns)
+
+
+def _raw_entry(name: str) -> zipfile.ZipInfo:
+    return zip_entry(name, zipfile.ZIP_DEFLATED, RAW_COMPRESS_LEVEL)
+
+
+def iter_raw_xlsx(sheets: Iterable[Sheet], strings: str = STRINGS_INLINE) -> Iterator[bytes]:
+    """xlsx sin estilos; cada hoja se escribe en streaming dentro del ZIP.
+
+    ``strings`` elige por columna entre cadenas en línea y la tabla compartida (ver ``string_table``);
+    la tabla se escribe al final, así que sólo crece con las columnas repetitivas.
+    """
+    sink = ZipStream()
+    zf = zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED, compresslevel=RAW_COMPRESS_LEVEL)
+    titles: List[str] = []
+    used: set = set()
+    table = SharedStringTable()
+
+    for index, (title, header, rows) in enumerate(sheets, start=1):
+        titles.append(_sheet_title(title, used))
+        letters: List[str] = []
+        rows = iter(rows)
+        sample = list(itertools.islice(rows, SAMPLE_SIZE))
+        shared = _shared_string_columns(strings, sample)
+        rows = itertools.chain(sample, rows)
+        with zf.open(_raw_entry(f"xl/worksheets/sheet{index}.xml"), mode="w", force_zip64=True) as member:
+            member.write(_SHEET_HEAD.encode("utf-8"))
+            member.write(_row_xml(1, letters, list(header)).encode("utf-8"))
+            chunk: List[str] = []
+            for row_num, row in enumerate(rows, start=2):
+                chunk.append(_row_xml(row_num, letters, row, table, shared))
+                if len(chunk) >= ROWS_PER_CHUNK:
+                    member.write("".join(chunk).encode("utf-8"))
+                    chunk = []
+                    yield sink.drain()
+            member.write("".join(chunk).encode("utf-8"))
+            member.write(_SHEET_TAIL.encode("utf-8"))
+        yield sink.drain()
+
+    sheet_entries = "".join(
+        f'<sheet name="{escape(title, {chr(34): "&quot;"})}" sheetId="{n}" r:id="rId{n}"/>'
+        for n, title in enumerate(titles, start=1)
+    )
+    sheet_rels = "".join(
+        f'<Relationship Id="rId{n}" '
+        f'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        f'Target="worksheets/sheet{n}.xml"/>'
+        for n in range(1, len(titles) + 1)
+    )
+    content_types = "".join(_SHEET_CONTENT_TYPE.format(n=n) for n in range(1, len(titles) + 1))
+    sst_content_type = sst_rel = ""
+    if len(table):
+        sst_content_type = f'<Override PartName="/xl/sharedStrings.xml" ContentType="{SST_CONTENT_TYPE}"/>'
+        sst_rel = f'<Relationship Id="rIdSharedStrings" Type="{SST_RELATIONSHIP}" Target="sharedStrings.xml"/>'
+        zf.writestr(_raw_entry("xl/sharedStrings.xml"), table.to_xml())
+    zf.writestr(_raw_entry("[Content_Types].xml"),
+                _CONTENT_TYPES.format(sheets=content_types, shared_strings=sst_content_type))
+    zf.writestr(_raw_entry("_rels/.rels"), _ROOT_RELS)
+    zf.writestr(_raw_entry("xl/workbook.xml"), _WORKBOOK.format(sheets=sheet_entries))
+    zf.writestr(_raw_entry("xl/_rels/workbook.xml.rels"),
+                _WORKBOOK_RELS.format(sheets=sheet_rels, shared_strings=sst_rel))
+    zf.writestr(_raw_entry("xl/styles.xml"), _STYLES)
+    zf.close()
+    yield sink.drain()
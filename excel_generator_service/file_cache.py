@@ -0,0 +1,137 @@
+"""Caché de archivos generados con una sola generación por llave entre instancias.
+
+A fin de mes varias personas exportan el mismo inventario casi al mismo tiempo
+y cada instancia (Render y los servidores de la red local) lo generaba de nuevo.
+El .xlsx terminado se guarda bajo un hash del reporte, la versión de la
+plantilla, la fecha, los parámetros y los items:
+
+- si la llave ya está en la caché se entrega sin generar;
+- si no, la solicitud toma un candado (``SET NX`` con expiración y un valor
+  propio) y genera, renovándolo mientras dura la generación; al terminar lo
+  borra sólo si el valor sigue siendo el suyo;
+- las solicitudes idénticas que llegan mientras tanto, en esta u otra instancia,
+  esperan a que el archivo aparezca en la caché (sin ocupar lugar en los
+  carriles de admisión) y, si el candado desaparece sin archivo o se agota
+  ``EXCEL_FILE_CACHE_WAIT_MS``, generan por su cuenta.
+
+Con el backend local la coordinación es sólo dentro del proceso; con
+``EXCEL_CACHE_BACKEND=redis`` cubre todas las instancias que comparten el Redis.
+"""
+import asyncio
+import os
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from cache_backend import CacheBackend, LocalBackend
+
+CACHE_HIT = "hit"
+CACHE_SHARED = "shared"
+CACHE_MISS = "miss"
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class GeneratedFileCache:
+    """Archivos generados por llave durante ``ttl`` segundos; ``max_bytes`` = 0 o ``ttl`` = 0 la desactiva."""
+
+    def __init__(self, max_bytes: int, ttl: int, wait_ms: int, backend: Optional[CacheBackend] = None,
+                 poll_ms: int = 100):
+        self.max_bytes = max(0, max_bytes)
+        self.ttl = max(0, ttl)
+        self.wait_seconds = max(0, wait_ms) / 1000
+        self.poll_seconds = max(10, poll_ms) / 1000
+        self.backend = backend if backend is not None else LocalBackend(self.max_bytes)
+        self.hits = 0
+        self.shared_hits = 0
+        self.waits = 0
+        self.wait_timeouts = 0
+        self.generated = 0
+        self.stored = 0
+        self.locks_lost = 0
+
+    @classmethod
+    def from_env(cls, backend: Optional[CacheBackend] = None) -> "GeneratedFileCache":
+        return cls(max_bytes=_env_int("EXCEL_FILE_CACHE_MAX_BYTES", 128 * 1024 * 1024),
+                   ttl=_env_int("EXCEL_FILE_CACHE_TTL", 600),
+                   wait_ms=_env_int("EXCEL_FILE_CACHE_WAIT_MS", 60000),
+                   backend=backend,
+                   poll_ms=_env_int("EXCEL_FILE_CACHE_POLL_MS", 100))
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 and self.ttl > 0
+
+    async def _call(self, fn: Callable, *args):
+        # Redis bloquea en el socket: se usa un hilo para no detener el event loop
+        if self.backend.blocking:
+            return await run_in_threadpool(fn, *args)
+        return fn(*args)
+
+    async def _generate(self, key: str, generate: Callable[[], Awaitable[bytes]]) -> bytes:
+        file_bytes = await generate()
+        self.generated += 1
+        if len(file_bytes) <= self.max_bytes:
+            await self._call(self.backend.set, "file:" + key, file_bytes, self.ttl)
+            self.stored += 1
+        return file_bytes
+
+    async def _keep_lock(self, lock_key: str, token: bytes, ttl: float):
+        # Una generación más larga que la expiración no debe soltar el candado a otra instancia
+        while True:
+            await asyncio.sleep(ttl / 3)
+            if not await self._call(self.backend.expire_if, lock_key, token, ttl):
+                # Ya expiró y otra solicitud lo tomó: se termina igual, sin renovar el ajeno
+                self.locks_lost += 1
+                return
+
+    async def get_or_generate(self, key: Optional[str],
+                              generate: Callable[[], Awaitable[bytes]]) -> Tuple[bytes, str]:
+        """(bytes, origen) del archivo de ``key``: de la caché, de otra solicitud que lo estaba
+        generando o de ``generate()`` (sin llave siempre se genera)"""
+        if key is None or not self.enabled:
+            return await generate(), CACHE_MISS
+
+        cached = await self._call(self.backend.get, "file:" + key)
+        if cached is not None:
+            self.hits += 1
+            return cached, CACHE_HIT
+
+        lock_key = "lock:file:" + key
+        token = uuid.uuid4().hex.encode("ascii")
+        lock_ttl = self.wait_seconds or 1
+        # El candado expira solo si la instancia que genera se cae a medio camino
+        if await self._call(self.backend.add, lock_key, token, lock_ttl):
+            keeper = asyncio.ensure_future(self._keep_lock(lock_key, token, lock_ttl))
+            try:
+                return await self._generate(key, generate), CACHE_MISS
+            finally:
+                keeper.cancel()
+                await self._call(self.backend.delete_if, lock_key, token)
+
+        self.waits += 1
+        loop = asyncio.get_running_loop()
+        give_up = loop.time() + self.wait_seconds
+        while loop.time() < give_up:
+            await asyncio.sleep(self.poll_seconds)
+            cached = await self._call(self.backend.get, "file:" + key)
+            if cached is not None:
+                self.shared_hits += 1
+                return cached, CACHE_SHARED
+            if await self._call(self.backend.get, lock_key) is None:
+                # La otra generación falló, se canceló o el archivo no cabía en la caché
+                break
+        else:
+            self.wait_timeouts += 1
+        return await self._generate(key, generate), CACHE_MISS
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "ttl": self.ttl, "hits": self.hits, "shared_hits": self.shared_hits,
+                "waits": self.waits, "wait_timeouts": self.wait_timeouts, "generated": self.generated,
+                "stored": self.stored, "locks_lost": self.locks_lost, **self.backend.snapshot()}
@@ -0,0 +1,240 @@
+"""Llenado rápido de plantillas de un solo registro (formulario SDR).
+
+Cargar la plantilla con openpyxl para escribir ~30 celdas fijas cuesta decenas
+de milisegundos. Aquí la plantilla se prepara una sola vez: el XML de la hoja se
+parte alrededor de las celdas del mapa declarativo (``columns.SDR_FORM_CELLS``)
+y tanto los tramos fijos como los demás miembros del paquete se guardan ya
+comprimidos. Cada solicitud sólo escribe los valores como cadenas en línea y
+arma el ZIP concatenando bloques DEFLATE:
+
+- cada tramo fijo se comprimió por separado y terminó con ``Z_SYNC_FLUSH``, así
+  que queda alineado a byte y sin referencias hacia otros tramos;
+- cada valor se escribe como bloque *stored* (sin comprimir, son pocos bytes);
+- al final va un bloque vacío con la marca de último bloque.
+"""
+import io
+import logging
+import os
+import threading
+import re
+import struct
+import zipfile
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from xml.sax.saxutils import escape
+
+from columns import Column
+from xlsx_parts import CORE_PROPERTIES, ZipMember, deflated_member, pin_doc_props, workbook_sheets, write_zip
+
+COMPRESS_LEVEL = 6
+
+logger = logging.getLogger(__name__)
+
+# Caracteres de control que XML 1.0 no permite
+_ILLEGAL_XML_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+# Bloque DEFLATE final vacío (BFINAL=1, códigos fijos, sólo fin de bloque)
+_FINAL_BLOCK = b"\x03\x00"
+_MAX_STORED = 0xFFFF
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class FormTemplateError(ValueError):
+    """La plantilla no tiene la forma esperada (falta una celda del mapa, por ejemplo)."""
+
+
+def _deflate_segment(data: bytes) -> bytes:
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+def _stored_blocks(data: bytes) -> bytes:
+    """``data`` como bloques DEFLATE sin comprimir (no finales)"""
+    out = []
+    for start in range(0, len(data), _MAX_STORED):
+        chunk = data[start:start + _MAX_STORED]
+        out.append(b"\x00" + struct.pack("<HH", len(chunk), len(chunk) ^ 0xFFFF) + chunk)
+    return b"".join(out)
+
+
+def _cell_xml(ref: str, style: Optional[str], value: Any) -> bytes:
+    style_attr = f' s="{style}"' if style is not None else ""
+    if value is None or value == "":
+        return f'<c r="{ref}"{style_attr}/>'.encode("utf-8")
+    if isinstance(value, bool):
+        return f'<c r="{ref}"{style_attr} t="b"><v>{int(value)}</v></c>'.encode("utf-8")
+    if isinstance(value, (int, float)):
+        return f'<c r="{ref}"{style_attr}><v>{value}</v></c>'.encode("utf-8")
+    text = escape(_ILLEGAL_XML_CHARS.sub("", str(value)))
+    return f'<c r="{ref}"{style_attr} t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'.encode("utf-8")
+
+
+@dataclass(frozen=True)
+class _FormCell:
+    """Celda del mapa; ``wrap`` abre y cierra su fila cuando la plantilla no la tiene"""
+    ref: str
+    style: Optional[str]
+    column: Column
+    wrap: Tuple[str, str] = ("", "")
+
+    def xml(self, item: Dict[str, Any]) -> bytes:
+        cell = _cell_xml(self.ref, self.style, self.column.value(item))
+        return self.wrap[0].encode("utf-8") + cell + self.wrap[1].encode("utf-8") if self.wrap[0] else cell
+
+
+def _column_index(letters: str) -> int:
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - 64
+    return index
+
+
+def _locate(sheet_xml: str, ref: str, column: Column) -> Tuple[int, int, _FormCell]:
+    """(inicio, fin, celda) del tramo del XML que ocupa ``ref``; tramo vacío si hay que insertarla"""
+    match = re.fullmatch(r'([A-Z]+)(\d+)', ref)
+    if match is None:
+        raise FormTemplateError(f"invalid cell reference {ref}")
+    col, row = _column_index(match.group(1)), int(match.group(2))
+
+    found = re.search(rf'<c r="{ref}"(?: [^>]*?)?(?:/>|>.*?</c>)', sheet_xml, re.S)
+    if found is not None:
+        style = re.search(r' s="(\d+)"', found.group(0)[:found.group(0).index(">") + 1])
+        return found.start(), found.end(), _FormCell(ref, style.group(1) if style else None, column)
+
+    # La celda no existe (openpyxl la crearía): insertarla en su fila, antes de la primera columna mayor
+    row_match = re.search(rf'<row r="{row}"(?: [^>]*?)?(/?)>', sheet_xml)
+    if row_match is not None:
+        if row_match.group(1):
+            raise FormTemplateError(f"row {row} of cell {ref} is empty (self-closing)")
+        row_end = sheet_xml.index("</row>", row_match.end())
+        position = row_end
+        for cell in re.finditer(r'<c r="([A-Z]+)\d+"', sheet_xml[row_match.end():row_end]):
+            if _column_index(cell.group(1)) > col:
+                position = row_match.end() + cell.start()
+                break
+        return position, position, _FormCell(ref, None, column)
+
+    # Tampoco existe la fila: insertarla antes de la primera fila mayor (o al final de sheetData)
+    position = sheet_xml.find("</sheetData>")
+    if position < 0:
+        raise FormTemplateError("sheet has no sheetData")
+    for other in re.finditer(r'<row r="(\d+)"', sheet_xml):
+        if int(other.group(1)) > row:
+            position = other.start()
+            break
+    return position, position, _FormCell(ref, None, column, (f'<row r="{row}">', "</row>"))
+
+
+class FormTemplate:
+    """Plantilla de un registro preparada para llenar ``cells`` (referencia, columna) sin openpyxl."""
+
+    def __init__(self, path: str, cells: Sequence[Tuple[str, Column]]):
+        self.path = path
+        with open(path, "rb") as f, zipfile.ZipFile(io.BytesIO(f.read())) as package:
+            sheet_path = workbook_sheets(package)[0][1]
+            sheet_xml = package.read(sheet_path).decode("utf-8")
+
+            # Tramos fijos del XML de la hoja entre celdas del mapa, en orden de aparición
+            located = sorted(_locate(sheet_xml, ref, column) for ref, column in cells)
+            if any(a[1] > b[0] for a, b in zip(located, located[1:])):
+                raise FormTemplateError(f"overlapping cells in {os.path.basename(path)}")
+
+            self.segments: List[bytes] = []
+            self.compressed_segments: List[bytes] = []
+            self.cells: List[_FormCell] = []
+            position = 0
+            for start, end, cell in located:
+                segment = sheet_xml[position:start].encode("utf-8")
+                self.segments.append(segment)
+                self.compressed_segments.append(_deflate_segment(segment))
+                self.cells.append(cell)
+                position = end
+            tail = sheet_xml[position:].encode("utf-8")
+            self.segments.append(tail)
+            self.compressed_segments.append(_deflate_segment(tail))
+
+            # Los demás miembros se copian tal cual, ya comprimidos; la hoja va en su posición original
+            # docProps/core.xml con fechas fijas, como en los demás libros generados
+            self.members: List[Optional[ZipMember]] = []
+            for info in package.infolist():
+                if info.filename == sheet_path:
+                    self.sheet_name = info.filename.encode("utf-8")
+                    self.members.append(None)
+                    continue
+                data = package.read(info.filename)
+                if info.filename == CORE_PROPERTIES:
+                    data = pin_doc_props(data)
+                self.members.append(deflated_member(info.filename.encode("utf-8"), data, COMPRESS_LEVEL))
+
+    def render(self, item: Dict[str, Any]) -> bytes:
+        """Libro .xlsx con los valores de ``item`` en las celdas del mapa"""
+        crc = 0
+        size = 0
+        compressed = []
+        for segment, deflated, form_cell in zip(self.segments, self.compressed_segments, self.cells):
+            cell = form_cell.xml(item)
+            crc = zlib.crc32(cell, zlib.crc32(segment, crc))
+            size += len(segment) + len(cell)
+            compressed.append(deflated)
+            compressed.append(_stored_blocks(cell))
+        tail = self.segments[-1]
+        crc = zlib.crc32(tail, crc)
+        size += len(tail)
+        compressed.append(self.compressed_segments[-1])
+        compressed.append(_FINAL_BLOCK)
+
+        sheet = ZipMember(self.sheet_name, crc, size, b"".join(compressed))
+        return write_zip([sheet if member is None else member for member in self.members])
+
+
+class FormFiller:
+    """Formularios compilados por plantilla; se vuelven a compilar si cambia el archivo.
+
+    ``get`` regresa ``None`` si el camino rápido está desactivado (``EXCEL_SDR_FAST_PATH=0``) o si la
+    plantilla no tiene la forma esperada; en ese caso se usa openpyxl.
+    """
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        # ruta -> ((mtime, tamaño), plantilla compilada o None si no se pudo compilar)
+        self._compiled: Dict[str, Tuple[Tuple[float, int], Optional[FormTemplate]]] = {}
+        self.renders = 0
+        self.fallbacks = 0
+
+    @classmethod
+    def from_env(cls) -> "FormFiller":
+        return cls(_env_int("EXCEL_SDR_FAST_PATH", 1) > 0)
+
+    def get(self, path: str, cells: Sequence[Tuple[str, Column]]) -> Optional[FormTemplate]:
+        if not self.enabled or not os.path.exists(path):
+            return None
+        stat = os.stat(path)
+        version = (stat.st_mtime, stat.st_size)
+        with self._lock:
+            cached = self._compiled.get(path)
+            if cached is None or cached[0] != version:
+                try:
+                    template = FormTemplate(path, cells)
+                    logger.info(f"⚡ Plantilla compilada para llenado rápido: {path}")
+                except (FormTemplateError, KeyError, IndexError, zipfile.BadZipFile) as e:
+                    logger.warning(f"⚠️ No se pudo compilar {path}, se usará openpyxl: {e}")
+                    template = None
+                cached = self._compiled[path] = (version, template)
+        if cached[1] is None:
+            self.fallbacks += 1
+        return cached[1]
+
+    def render(self, template: FormTemplate, item: Dict[str, Any]) -> bytes:
+        self.renders += 1
+        return template.render(item)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "compiled": sum(1 for _, t in self._compiled.values() if t is not None),
+                "renders": self.renders, "fallbacks": self.fallbacks}
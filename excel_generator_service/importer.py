@@ -0,0 +1,150 @@
+"""Importación de libros con el formato de nuestras plantillas.
+
+Los equipos de campo editan fuera de línea las hojas exportadas (jumpers,
+cómputo, SICOR, bitácora) y las regresan. El libro se lee con openpyxl en modo
+de sólo lectura, fila por fila (``values_only``), así que la memoria no depende
+del número de filas. Cada hoja cuyo renglón de encabezados coincide con el
+mapa de columnas del reporte (``columns.py``) se convierte de vuelta en items
+con las mismas llaves que envía la app.
+"""
+import json
+import re
+import unicodedata
+from datetime import date, datetime
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import openpyxl
+
+from columns import COLUMN_MAPS, parse_fecha_bitacora, parse_jumper_ubicacion
+
+IMPORT_REPORTS = ("jumpers", "computo", "sicor", "bitacora")
+
+# Renglones donde se busca el encabezado (las plantillas lo tienen entre la fila 2 y la 4)
+HEADER_SCAN_ROWS = 10
+
+# Inversos de las transformaciones de exportación, por (reporte, campo)
+PARSERS = {
+    ("bitacora", "fecha"): parse_fecha_bitacora,
+    ("jumpers", "contenedores"): parse_jumper_ubicacion,
+}
+
+# Campos que son listas: una celda vacía se importa como [] para que el tipo no cambie entre filas
+LIST_FIELDS = {
+    ("jumpers", "contenedores"),
+}
+
+# Columnas combinadas por grupo: sólo la primera fila del grupo trae el valor
+FILL_DOWN = {
+    "computo": ("id", "equipo_pm"),
+}
+
+ITEMS_PER_CHUNK = 500
+
+
+class ImportFormatError(ValueError):
+    """El archivo no es un libro de Excel o no tiene hojas con el formato del reporte."""
+
+
+def _normalize_header(value: Any) -> str:
+    text = unicodedata.normalize("NFKD", str(value or ""))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(text.upper().split())
+
+
+def match_header(report: str, row: Tuple[Any, ...]) -> Optional[List[int]]:
+    """Índice de columna de cada campo del reporte si ``row`` tiene todos sus encabezados en orden"""
+    cells = [_normalize_header(value) for value in row]
+    positions = []
+    start = 0
+    for column in COLUMN_MAPS[report]:
+        wanted = _normalize_header(column.header)
+        # La exportación puede agregar la fecha al encabezado: "FECHA - 19/10/2026"
+        position = next((pos for pos in range(start, len(cells))
+                         if cells[pos] == wanted or cells[pos].startswith(wanted + " - ")), None)
+        if position is None:
+            return None
+        positions.append(position)
+        start = position + 1
+    return positions
+
+
+def _cell_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, datetime) and value.time() == datetime.min.time():
+        return value.date().isoformat()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _sheet_year(title: str) -> Optional[int]:
+    # Hojas de bitácora: "2024" o sus continuaciones "2024 (2)"
+    match = re.match(r'^\s*(\d{4})\b', title)
+    return int(match.group(1)) if match else None
+
+
+class ImportedWorkbook:
+    """Libro abierto en modo de sólo lectura y las hojas que tienen el encabezado del reporte."""
+
+    def __init__(self, source: BinaryIO, report: str):
+        try:
+            self.workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+        except Exception as e:
+            raise ImportFormatError(f"not a valid xlsx workbook: {e}")
+        self.report = report
+        # (hoja, fila del encabezado, columna de cada campo)
+        self.sheets: List[Tuple[Any, int, List[int]]] = []
+        for ws in self.workbook.worksheets:
+            for row_num, row in enumerate(ws.iter_rows(max_row=HEADER_SCAN_ROWS, values_only=True), start=1):
+                positions = match_header(report, row)
+                if positions is not None:
+                    self.sheets.append((ws, row_num, positions))
+                    break
+        if not self.sheets:
+            self.workbook.close()
+            raise ImportFormatError(f"no sheet with the {report} template header was found")
+
+    @property
+    def estimated_rows(self) -> int:
+        # Según la dimensión declarada de cada hoja (puede faltar en libros de otras herramientas)
+        return sum(max((ws.max_row or 0) - header_row, 0) for ws, header_row, _ in self.sheets)
+
+    def iter_items(self) -> Iterator[Dict[str, Any]]:
+        """Items de todas las hojas con el formato del reporte, en orden"""
+        columns = COLUMN_MAPS[self.report]
+        fill_down = FILL_DOWN.get(self.report, ())
+        try:
+            for ws, header_row, positions in self.sheets:
+                year = _sheet_year(ws.title) if self.report == "bitacora" else None
+                previous: Dict[str, Any] = {}
+                for row in ws.iter_rows(min_row=header_row + 1, values_only=True):
+                    values = [_cell_value(row[pos]) if pos < len(row) else "" for pos in positions]
+                    if all(value == "" for value in values):
+                        continue
+                    item: Dict[str, Any] = {"year": year} if year is not None else {}
+                    for column, value in zip(columns, values):
+                        field = (self.report, column.field)
+                        parser = PARSERS.get(field)
+                        if parser and (value != "" or field in LIST_FIELDS):
+                            value = parser(value)
+                        item[column.field] = value
+                    for key in fill_down:
+                        if item.get(key) == "" and key in previous:
+                            item[key] = previous[key]
+                    previous = item
+                    yield item
+        finally:
+            self.workbook.close()
+
+
+def iter_ndjson(items: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+    """Un objeto JSON por línea, emitido en bloques de ``ITEMS_PER_CHUNK`` items"""
+    chunk: List[str] = []
+    for item in items:
+        chunk.append(json.dumps(item, ensure_ascii=False, default=str))
+        if len(chunk) >= ITEMS_PER_CHUNK:
+            yield ("\n".join(chunk) + "\n").encode("utf-8")
+            chunk = []
+    if chunk:
+        yield ("\n".join(chunk) + "\n").encode("utf-8")
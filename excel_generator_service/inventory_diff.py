@@ -0,0 +1,214 @@
+"""Comparación de dos inventarios del mismo reporte (por ejemplo, este mes contra el anterior).
+
+Cada lado se indexa por una llave configurable (``codigo`` + ``serie`` en
+SICOR, ``inventario`` en cómputo...) con un hash del contenido de la fila ya
+mapeada (``columns.py``), así que la comparación es lineal en el número de
+filas: sólo se comparan celda por celda las filas cuyo hash cambió. Las llaves
+repetidas se emparejan por orden de aparición.
+"""
+import hashlib
+import io
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill
+
+from columns import COLUMN_MAPS, report_headers, table_rows
+from xlsx_parts import reproducible_package
+
+DEFAULT_KEYS: Dict[str, Tuple[str, ...]] = {
+    "jumpers": ("tipo", "tamano"),
+    "computo": ("inventario",),
+    "sicor": ("codigo", "serie"),
+    "bitacora": ("consecutivo",),
+}
+
+_HEADER_FILL = PatternFill(start_color="1F4E78", end_color="1F4E78", fill_type="solid")
+_HEADER_FONT = Font(bold=True, color="FFFFFF")
+_ADDED_FILL = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
+_REMOVED_FILL = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
+_CHANGED_FILL = PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid")
+
+# Separadores de la llave de una fila: entre campos y antes del número de aparición
+KEY_SEPARATOR = "\x1f"
+OCCURRENCE_SEPARATOR = "\x1e"
+
+
+def _row_text(row: Sequence[Any]) -> List[str]:
+    # Se compara el texto de cada celda: 10 (de un libro) y "10" (de JSON) son el mismo valor
+    return ["" if value is None else str(value) for value in row]
+
+
+def _row_hash(text: List[str]) -> bytes:
+    # Separador de unidad (U+001F): no aparece en los textos de celda, así que la unión no es ambigua
+    return hashlib.blake2b(KEY_SEPARATOR.join(text).encode("utf-8"), digest_size=16).digest()
+
+
+def key_fields(report: str, key: Sequence[str]) -> List[int]:
+    """Columnas de la llave; cada campo debe ser una columna del reporte"""
+    fields = [column.field for column in COLUMN_MAPS[report]]
+    missing = [name for name in key if name not in fields]
+    if missing or not key:
+        raise ValueError(f"key fields must be columns of {report}: {', '.join(fields)}")
+    return [fields.index(name) for name in key]
+
+
+@dataclass
+class InventoryDiff:
+    report: str
+    key: Tuple[str, ...]
+    header: List[str]
+    added: List[List[Any]] = field(default_factory=list)
+    removed: List[List[Any]] = field(default_factory=list)
+    # (antes, después, índices de las columnas que cambiaron)
+    changed: List[Tuple[List[Any], List[Any], List[int]]] = field(default_factory=list)
+    unchanged: int = 0
+
+    def summary(self) -> Dict[str, int]:
+        return {"added": len(self.added), "removed": len(self.removed), "changed": len(self.changed),
+                "unchanged": self.unchanged}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "report": self.report,
+            "key": list(self.key),
+            "header": self.header,
+            "summary": self.summary(),
+            "added": self.added,
+            "removed": self.removed,
+            "changed": [{"before": before, "after": after, "columns": [self.header[i] for i in columns]}
+                        for before, after, columns in self.changed],
+        }
+
+
+def fingerprint_rows(rows: Iterable[Sequence[Any]], key_positions: List[int]) -> Iterator[Tuple[str, bytes]]:
+    """(llave, hash del contenido) de cada fila; la llave incluye el número de aparición"""
+    seen: Dict[str, int] = {}
+    for row in rows:
+        text = _row_text(row)
+        key = KEY_SEPARATOR.join(text[pos].strip() for pos in key_positions)
+        # Llaves repetidas: la n-ésima aparición de un lado se compara con la n-ésima del otro
+        occurrence = seen.get(key, 0)
+        seen[key] = occurrence + 1
+        yield f"{key}{OCCURRENCE_SEPARATOR}{occurrence}", _row_hash(text)
+
+
+def key_values(row_key: str) -> List[str]:
+    """Valores de los campos de la llave a partir de una llave de ``fingerprint_rows``"""
+    return row_key.rsplit(OCCURRENCE_SEPARATOR, 1)[0].split(KEY_SEPARATOR)
+
+
+class _Index:
+    """Filas de un lado indexadas por llave -> posición, con el hash de cada fila.
+
+    Las llaves son cadenas y los hashes ``bytes`` (no los rastrea el recolector de basura), así que
+    construir el índice de 100k filas no dispara colecciones completas sobre contenedores nuevos.
+    """
+
+    def __init__(self, rows: List[List[Any]], key_positions: List[int]):
+        self.rows = rows
+        self.positions: Dict[str, int] = {}
+        self.digests: List[bytes] = []
+        for position, (key, digest) in enumerate(fingerprint_rows(rows, key_positions)):
+            self.positions[key] = position
+            self.digests.append(digest)
+
+
+def diff_items(report: str, before: List[Dict[str, Any]], after: List[Dict[str, Any]],
+               key: Sequence[str] = ()) -> InventoryDiff:
+    """Filas agregadas, eliminadas y modificadas de ``after`` respecto de ``before``"""
+    key = tuple(key) or DEFAULT_KEYS[report]
+    key_positions = key_fields(report, key)
+    columns = COLUMN_MAPS[report]
+    old = _Index(table_rows(columns, before), key_positions)
+    new = _Index(table_rows(columns, after), key_positions)
+
+    result = InventoryDiff(report, key, report_headers(report))
+    for row_key, position in new.positions.items():
+        row = new.rows[position]
+        previous = old.positions.get(row_key)
+        if previous is None:
+            result.added.append(row)
+        elif old.digests[previous] == new.digests[position]:
+            result.unchanged += 1
+        else:
+            before_row = old.rows[previous]
+            changed = [i for i, (a, b) in enumerate(zip(_row_text(before_row), _row_text(row))) if a != b]
+            result.changed.append((before_row, row, changed))
+    result.removed = [old.rows[position] for row_key, position in old.positions.items()
+                      if row_key not in new.positions]
+    return result
+
+
+def _header_cells(ws, values: Sequence[Any]) -> List[WriteOnlyCell]:
+    cells = []
+    for value in values:
+        cell = WriteOnlyCell(ws, value=value)
+        cell.fill = _HEADER_FILL
+        cell.font = _HEADER_FONT
+        cells.append(cell)
+    return cells
+
+
+def _filled_cells(ws, values: Sequence[Any], fill: PatternFill, positions=None) -> List[WriteOnlyCell]:
+    cells = []
+    for i, value in enumerate(values):
+        cell = WriteOnlyCell(ws, value=value)
+        if positions is None or i in positions:
+            cell.fill = fill
+        cells.append(cell)
+    return cells
+
+
+def render_diff_workbook(diff: InventoryDiff) -> bytes:
+    """Libro con hojas RESUMEN, AGREGADOS, ELIMINADOS y MODIFICADOS (antes/después con las celdas cambiadas)"""
+    wb = Workbook(write_only=True)
+
+    ws = wb.create_sheet("RESUMEN")
+    ws.append(_header_cells(ws, ["REPORTE", "LLAVE", "AGREGADOS", "ELIMINADOS", "MODIFICADOS", "SIN CAMBIOS"]))
+    summary = diff.summary()
+    ws.append([diff.report, " + ".join(diff.key), summary["added"], summary["removed"], summary["changed"],
+               summary["unchanged"]])
+
+    for title, rows, fill in (("AGREGADOS", diff.added, _ADDED_FILL), ("ELIMINADOS", diff.removed, _REMOVED_FILL)):
+        ws = wb.create_sheet(title)
+        ws.freeze_panes = "A2"
+        ws.append(_header_cells(ws, diff.header))
+        for row in rows:
+            ws.append(_filled_cells(ws, row, fill))
+
+    ws = wb.create_sheet("MODIFICADOS")
+    ws.freeze_panes = "B2"
+    ws.append(_header_cells(ws, ["CAMBIO"] + diff.header))
+    for before, after, changed in diff.changed:
+        positions = {i + 1 for i in changed}
+        ws.append(_filled_cells(ws, ["ANTES"] + before, _REMOVED_FILL, positions))
+        ws.append(_filled_cells(ws, ["DESPUÉS"] + after, _CHANGED_FILL, positions))
+
+    output = io.BytesIO()
+    wb.save(output)
+    return reproducible_package(output.getvalue())
+
+
+def render_delta_workbook(header: List[str], key_headers: Sequence[str], added: List[List[Any]],
+                          modified: List[List[Any]], removed_keys: List[str]) -> bytes:
+    """Libro de cambios respecto de un snapshot: filas NUEVO / MODIFICADO y llaves eliminadas"""
+    wb = Workbook(write_only=True)
+
+    ws = wb.create_sheet("CAMBIOS")
+    ws.freeze_panes = "B2"
+    ws.append(_header_cells(ws, ["CAMBIO"] + header))
+    for marker, rows, fill in (("NUEVO", added, _ADDED_FILL), ("MODIFICADO", modified, _CHANGED_FILL)):
+        for row in rows:
+            ws.append(_filled_cells(ws, [marker] + list(row), fill, {0}))
+
+    ws = wb.create_sheet("ELIMINADOS")
+    ws.append(_header_cells(ws, list(key_headers)))
+    for row_key in removed_keys:
+        ws.append(_filled_cells(ws, key_values(row_key), _REMOVED_FILL))
+
+    output = io.BytesIO()
+    wb.save(output)
+    return reproducible_package(output.getvalue())
@@ -0,0 +1,78 @@
+"""Consolidación de jumpers por (tipo, tamaño).
+
+El inventario de jumpers suele traer el mismo tipo y tamaño repetido en varios
+racks y contenedores, y cada item se volvía una fila con su propio color de
+categoría y su texto ``R{rack}-{contenedor}``. Con ``"consolidate": true`` en el
+payload los items se agrupan en una sola pasada por un diccionario:
+
+- una fila por (tipo, tamaño), sin distinguir mayúsculas ni ``5`` de ``"5"``;
+- ``cantidad`` es la suma de las cantidades del grupo;
+- UBICACION lleva las ubicaciones de todos los items del grupo, en el orden en
+  que aparecen y sin repetir;
+- las filas se ordenan por categoría (en el orden del mapa de colores, las
+  demás al final por nombre) y luego por tamaño.
+
+Los items consolidados tienen las mismas llaves que los de la app, así que
+pasan sin cambios por la plantilla, los formatos rápidos y los snapshots.
+"""
+from typing import Any, Dict, List, Sequence, Tuple
+
+from columns import JUMPERS_COLUMN_MAP, jumper_locations
+
+_TIPO, _TAMANO, _CANTIDAD = JUMPERS_COLUMN_MAP[:3]
+
+
+def _text_key(value: Any) -> str:
+    return str(value).strip().upper()
+
+
+def _size_key(value: Any) -> Tuple[int, Any]:
+    # Tamaños numéricos primero y en orden numérico; los demás después, por texto
+    try:
+        return 0, float(str(value).strip())
+    except ValueError:
+        return 1, _text_key(value)
+
+
+def _quantity(value: Any) -> Any:
+    """Cantidad como número (0 si no es numérica); los enteros se conservan enteros"""
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        number = float(str(value).strip())
+    except ValueError:
+        return 0
+    return int(number) if number.is_integer() else number
+
+
+def _category_rank(tipo: str, categories: Sequence[str]) -> int:
+    # Misma regla que el color de la columna TIPO: gana la primera categoría que contiene o está contenida
+    for rank, category in enumerate(categories):
+        category = category.upper()
+        if tipo and (category in tipo or tipo in category):
+            return rank
+    return len(categories)
+
+
+def consolidate_jumpers(items: List[Dict[str, Any]], categories: Sequence[str]) -> List[Dict[str, Any]]:
+    """Un item por (tipo, tamaño) con cantidades sumadas y ubicaciones sin repetir, ordenados por categoría"""
+    groups: Dict[Tuple[str, Tuple[int, Any]], Dict[str, Any]] = {}
+    seen: Dict[Tuple[str, Tuple[int, Any]], set] = {}
+    for item in items:
+        tipo = _TIPO.value(item)
+        tamano = _TAMANO.value(item)
+        key = (_text_key(tipo), _size_key(tamano))
+        group = groups.get(key)
+        if group is None:
+            # El primer item del grupo decide cómo se escriben el tipo y el tamaño
+            group = groups[key] = {"tipo": tipo, "tamano": tamano, "cantidad": 0, "contenedores": []}
+            seen[key] = set()
+        group["cantidad"] += _quantity(_CANTIDAD.value(item))
+        locations = seen[key]
+        for text, contenedor in jumper_locations(item):
+            if text not in locations:
+                locations.add(text)
+                group["contenedores"].append(contenedor)
+
+    ranks = {key: _category_rank(key[0], categories) for key in groups}
+    return [groups[key] for key in sorted(groups, key=lambda key: (ranks[key], key[0], key[1]))]
@@ -1,19 +1,76 @@
+import asyncio
+import functools
+import hashlib
+import heapq
 import io
 import os
 import logging
 import re
+import tempfile
+import zipfile
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from contextlib import AsyncExitStack, asynccontextmanager
+from dataclasses import dataclass, replace
+from typing import List, Dict, Any, Optional, Callable, Iterator
+
+import anyio
 
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import Response, JSONResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import HTMLResponse, Response, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.background import BackgroundTask
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
 from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
+from openpyxl.cell.cell import MergedCell
+from openpyxl.worksheet.merge import MergedCellRange
+from openpyxl.styles.cell_style import StyleArray
 from openpyxl.utils import get_column_letter
+from openpyxl.utils.cell import coordinate_to_tuple
 import openpyxl
 
-app = FastAPI(title="Excel Generator Service")
+from columns import (BITACORA_COLUMN_MAP, COLUMN_MAPS, COMPUTO_COLUMN_MAP, JUMPERS_COLUMN_MAP, SDR_FORM_CELLS,
+                     SICOR_COLUMN_MAP, report_headers, table_rows)
+from fast_formats import (CSV_MEDIA_TYPE, FORMAT_CSV, FORMAT_XLSX, FORMATS, HTML_MEDIA_TYPE, XLSX_MEDIA_TYPE, Sheet,
+                          iter_csv, iter_raw_xlsx, render_html)
+from admission import AdmissionController, LaneFullError, estimate_cost
+from split_policy import (EXCEL_MAX_ROWS, MODE_SHEETS, MODE_WORKBOOKS, SplitPlan, SplitPolicy, ZipStream,
+                          chunk_items, open_zip_stream)
+from workers import run_in_process, shutdown_process_pool, worker_count
+from sheet_cache import FECHA_PLACEHOLDER, SheetCache, SheetPart, items_key, template_version
+from string_table import STRING_ENCODINGS, STRINGS_INLINE
+from conditional_styles import add_category_color_rules, add_row_banding, add_sicor_stock_rules
+from xlsx_parts import (assemble_workbook, extract_sheets, reproducible_package, share_strings, styles_signature,
+                        zip_entry)
+from importer import IMPORT_REPORTS, ImportedWorkbook, ImportFormatError, iter_ndjson
+from inventory_diff import (DEFAULT_KEYS, diff_items, fingerprint_rows, key_fields, render_delta_workbook,
+                            render_diff_workbook)
+from snapshots import SnapshotNotFound, SnapshotRequest, SnapshotStore, compute_delta
+from db_source import InvalidSourceSpec, PostgresSource, QuerySpec, SourceNotConfigured
+from form_fill import FormFiller
+from template_artifacts import TemplateArtifacts
+from cache_backend import shared_backend_from_env
+from file_cache import CACHE_MISS, GeneratedFileCache
+from payload_precheck import (PAYLOAD_CACHE_HEADER, PAYLOAD_HASH_HEADER, UPLOAD_REQUIRED_STATUS, InvalidPayloadHash,
+                              PayloadStore, StoredResult, cacheable_result, parse_digest, verify_body)
+from cancellation import (CANCEL_CHECK_ROWS, REASON_DEADLINE, REASON_DISCONNECT, CancellationMonitor, CancelToken,
+                          GenerationCancelled, InvalidDeadline, call_with_deadline, check_cancelled, current_token)
+from jumper_consolidation import consolidate_jumpers
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Arranque: plantillas precompiladas mapeadas. Cierre: pool de procesos y conexiones a Postgres"""
+    warm_templates()
+    try:
+        yield
+    finally:
+        shutdown_process_pool()
+        await DB_SOURCE.close()
+
+
+app = FastAPI(title="Excel Generator Service", lifespan=lifespan)
 
 # Configurar CORS para permitir requests desde web y móvil
 app.add_middleware(
@@ -83,6 +140,45 @@ TEMPLATE_PATH_BITACORA = (
     )
 )
 
+# Columnas escritas por fila en cada reporte (para estimar el costo de una exportación)
+JUMPERS_COLUMNS = 5
+COMPUTO_COLUMNS = 40
+SICOR_COLUMNS = 7
+BITACORA_COLUMNS = 13
+SDR_CELLS = 30
+
+# Primera fila de datos de cada plantilla (para el límite de filas por hoja)
+JUMPERS_FIRST_ROW = 5
+COMPUTO_FIRST_ROW = 5
+SICOR_FIRST_ROW = 5
+BITACORA_FIRST_ROW = 4
+
+# Filas de la vista previa: por defecto y máximo por solicitud
+PREVIEW_ROWS = 50
+PREVIEW_MAX_ROWS = 1000
+PREVIEW_FORMATS = ("json", "html")
+
+# Archivos subidos: se mantienen en memoria hasta este tamaño y después pasan a disco
+UPLOAD_SPOOL_BYTES = 8 * 1024 * 1024
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+DIFF_FORMATS = ("xlsx", "json")
+
+# Items por lote al normalizar columnas en los formatos rápidos (acota la memoria por solicitud)
+NORMALIZE_BATCH = 10000
+
+# Carriles interactivo/bulk para que un formulario SDR no espere detrás de un cómputo de 20k filas
+ADMISSION = AdmissionController.from_env()
+# Redis compartido entre instancias (EXCEL_CACHE_BACKEND=redis) o None: cada caché usa su LRU local
+CACHE_BACKEND = shared_backend_from_env()
+SHEET_CACHE = SheetCache.from_env(CACHE_BACKEND)
+FILE_CACHE = GeneratedFileCache.from_env(CACHE_BACKEND)
+PAYLOADS = PayloadStore.from_env(CACHE_BACKEND)
+DB_SOURCE = PostgresSource.from_env()
+SNAPSHOTS = SnapshotStore.from_env()
+FORM_FILLER = FormFiller.from_env()
+TEMPLATES = TemplateArtifacts.from_env()
+CANCELLATION = CancellationMonitor.from_env()
+
 LAST_GENERATED_FILE_CONTENT: bytes | None = None
 LAST_GENERATED_FILENAME: str | None = None
 
@@ -99,71 +195,90 @@ def _ensure_template(path: str):
     return True
 
 
+def _is_absent(value: Any) -> bool:
+    """None y "" no se escriben: una celda vacía sólo agrega peso al XML"""
+    return value is None or value == ""
+
+
+def _without_blanks(values: List[Any]) -> List[Any]:
+    """Fila para ``ws.append``: los valores vacíos quedan como None (celda sin valor)"""
+    return [None if _is_absent(value) else value for value in values]
+
+
+def _cell_value(ws, row: int, col: int) -> Any:
+    """Valor de una celda sin crearla (``ws.cell()`` agrega a la hoja cada celda que consulta)"""
+    cell = ws._cells.get((row, col))
+    return cell.value if cell is not None else None
+
+
 def _safe_set_cell_value(ws, row: int, col: int, value: Any):
-    """Escribe un valor en una celda de forma segura, evitando celdas combinadas"""
+    """Escribe un valor en una celda de forma segura, evitando celdas combinadas; los valores
+    vacíos no crean la celda (y borran el que tuviera)"""
+    cell = ws._cells.get((row, col))
+    # Las celdas de un rango combinado, salvo la principal (top-left), son MergedCell: no se escriben
+    if isinstance(cell, MergedCell):
+        return
+    if _is_absent(value):
+        if cell is not None:
+            cell.value = None
+        return
     try:
-        cell = ws.cell(row=row, column=col)
-        
-        # Verificar si la celda está en un rango combinado
-        # Si la celda es parte de un merge, solo escribir en la celda principal (top-left)
-        import re
-        for merged_range in list(ws.merged_cells.ranges):
-            range_str = str(merged_range)
-            # El rango tiene formato como "A1:B2"
-            if ':' in range_str:
-                range_parts = range_str.split(':')
-                if len(range_parts) >= 2:
-                    top_left = range_parts[0]  # Ej: "A1"
-                    bottom_right = range_parts[1]  # Ej: "B2"
-                    
-                    # Extraer fila y columna de la celda principal (top-left)
-                    match_top = re.match(r'([A-Z]+)(\d+)', top_left)
-                    match_bottom = re.match(r'([A-Z]+)(\d+)', bottom_right)
-                    
-                    if match_top and match_bottom:
-                        top_col_letter = match_top.group(1)
-                        top_row_num = int(match_top.group(2))
-                        bottom_col_letter = match_bottom.group(1)
-                        bottom_row_num = int(match_bottom.group(2))
-                        
-                        # Convertir letra de columna a número (A=1, B=2, etc.)
-                        top_col_num = 0
-                        for char in top_col_letter:
-                            top_col_num = top_col_num * 26 + (ord(char) - ord('A') + 1)
-                        
-                        bottom_col_num = 0
-                        for char in bottom_col_letter:
-                            bottom_col_num = bottom_col_num * 26 + (ord(char) - ord('A') + 1)
-                        
-                        # Verificar si estamos dentro del rango fusionado
-                        if (top_row_num <= row <= bottom_row_num and 
-                            top_col_num <= col <= bottom_col_num):
-                            # Solo escribir si es la celda principal (top-left)
-                            if row == top_row_num and col == top_col_num:
-                                cell.value = value
-                            # Si no es la principal, no escribir (es parte del merge)
-                            return
-        
-        # Si no está en un merge, escribir normalmente
-        cell.value = value
+        ws.cell(row=row, column=col).value = value
     except Exception as e:
-        logger.warning(f"Error al escribir en celda ({row}, {col}): {e}, intentando método directo")
-        # Intentar escribir directamente en la celda si falla
-        try:
-            ws.cell(row=row, column=col).value = value
-        except Exception as e2:
-            # Si es un error de celda fusionada, ignorarlo silenciosamente
-            if "read-only" not in str(e2).lower() and "merged" not in str(e2).lower():
-                logger.error(f"Error crítico al escribir en celda ({row}, {col}): {e2}")
-
-
+        logger.error(f"Error crítico al escribir en celda ({row}, {col}): {e}")
+
+
+def _merge_column(ws, start_row: int, end_row: int, col: int):
+    """Combina una columna entre dos filas; ``ws.merge_cells`` revisa el rango contra todos los
+    ya combinados (cuadrático con miles de grupos), aquí los grupos nunca se traslapan"""
+    letter = get_column_letter(col)
+    merged = MergedCellRange(ws, f"{letter}{start_row}:{letter}{end_row}")
+    ws.merged_cells.ranges.add(merged)
+    ws._clean_merge_range(merged)
+
+
+# Campos del estilo que se copian de la fila de referencia (la protección se queda como está)
+_REFERENCE_STYLE_FIELDS = ("fontId", "fillId", "borderId", "alignmentId", "numFmtId")
+
+
+def _reference_styles(ws, row: int, columns) -> Dict[int, tuple]:
+    """Estilo de la fila de referencia por columna y si se ve aunque la celda esté vacía
+    (borde o relleno); las celdas que no existen quedan con el estilo por defecto"""
+    wb = ws.parent
+    styles = {}
+    for col in columns:
+        ref_cell = ws._cells.get((row, col))
+        style = StyleArray(ref_cell._style) if ref_cell is not None and ref_cell._style else StyleArray()
+        border = wb._borders[style.borderId]
+        fill = wb._fills[style.fillId]
+        visible = (any(side is not None and side.style for side in (border.left, border.right, border.top,
+                                                                     border.bottom, border.diagonal))
+                   or not (isinstance(fill, PatternFill) and fill.patternType is None))
+        styles[col] = (style, visible)
+    return styles
+
+
+def _apply_reference_style(ws, row: int, col: int, reference: tuple):
+    """Copia el estilo de referencia; una celda vacía sólo se crea si el estilo se ve"""
+    style, visible = reference
+    cell = ws._cells.get((row, col))
+    if cell is None:
+        if not visible:
+            return
+        cell = ws.cell(row=row, column=col)
+    if cell._style is None:
+        # openpyxl crea el arreglo de estilo hasta que se asigna el primero
+        cell._style = StyleArray()
+    target = cell._style
+    for field in _REFERENCE_STYLE_FIELDS:
+        setattr(target, field, getattr(style, field))
 
 
 def _save_workbook_to_bytes(wb: Workbook) -> bytes:
     output = io.BytesIO()
     wb.save(output)
-    output.seek(0)
-    return output.read()
+    # Sin la hora de guardado: los mismos datos dan los mismos bytes
+    return reproducible_package(output.getvalue())
 
 
 def _get_month_year() -> str:
@@ -176,31 +291,17 @@ def _get_month_year() -> str:
     return f'{months[now.month - 1]} {now.year}'
 
 
-def _get_jumper_category_color(tipo: str) -> Optional[str]:
-    """Obtiene el color hexadecimal para una categoría de jumper según el tipo"""
-    if not tipo:
-        return None
-    
-    tipo_upper = tipo.upper().strip()
-    
-    # Mapeo de categorías a colores (mismos colores que en el frontend)
-    color_map = {
-        'FC-FC': 'FF2196F3',      # Colors.blue
-        'FC-LC': 'FF3F51B5',      # Colors.indigo
-        'FC-SC': 'FF673AB7',      # Colors.deepPurple
-        'LC-FC': 'FF4CAF50',      # Colors.green
-        'LC-LC': 'FFFF9800',      # Colors.orange
-        'SC-FC': 'FF9C27B0',      # Colors.purple
-        'SC-LC': 'FFF44336',      # Colors.red
-        'SC-SC': 'FF009688',      # Colors.teal
-    }
-    
-    # Buscar coincidencia exacta o parcial
-    for category, color in color_map.items():
-        if category in tipo_upper or tipo_upper in category:
-            return color
-    
-    return None
+# Colores por categoría de jumper (mismos colores que en el frontend); se aplican con formato condicional
+JUMPER_CATEGORY_COLORS = {
+    'FC-FC': 'FF2196F3',      # Colors.blue
+    'FC-LC': 'FF3F51B5',      # Colors.indigo
+    'FC-SC': 'FF673AB7',      # Colors.deepPurple
+    'LC-FC': 'FF4CAF50',      # Colors.green
+    'LC-LC': 'FFFF9800',      # Colors.orange
+    'SC-FC': 'FF9C27B0',      # Colors.purple
+    'SC-LC': 'FFF44336',      # Colors.red
+    'SC-SC': 'FF009688',      # Colors.teal
+}
 
 
 def _apply_cell_style(cell, bold: bool = False, center: bool = True):
@@ -247,7 +348,9 @@ def _create_jumpers_excel(items: List[Dict[str, Any]]) -> Workbook:
         _apply_cell_style(cell, bold=True, center=True)
     
     # Datos (fila 3 en adelante)
-    for item in items:
+    for idx, item in enumerate(items):
+        if idx % CANCEL_CHECK_ROWS == 0:
+            check_cancelled()
         row_data = [
             item.get("tipo", item.get("categoryName", "")),
             item.get("tamano", item.get("size", "")),
@@ -255,10 +358,11 @@ def _create_jumpers_excel(items: List[Dict[str, Any]]) -> Workbook:
             item.get("rack", ""),
             item.get("contenedor", item.get("container", ""))
         ]
-        ws.append(row_data)
+        ws.append(_without_blanks(row_data))
         
         # Aplicar estilo a datos
-        row_num = ws.max_row
+        # La fila que acaba de agregar append (ws.max_row recorre todas las celdas en cada fila)
+        row_num = ws._current_row
         for col in range(1, len(row_data) + 1):
             cell = ws.cell(row=row_num, column=col)
             _apply_cell_style(cell, bold=False, center=True)
@@ -309,7 +413,9 @@ def _create_computo_excel(items: List[Dict[str, Any]]) -> Workbook:
         cell.font = Font(bold=True, color="FFFFFF", size=10)
     
     # Datos
-    for item in items:
+    for idx, item in enumerate(items):
+        if idx % CANCEL_CHECK_ROWS == 0:
+            check_cancelled()
         row_data = [
             item.get("inventario", item.get("inventario", "")),
             item.get("equipo_pm", item.get("equipo_pm", "")),
@@ -333,15 +439,15 @@ def _create_computo_excel(items: List[Dict[str, Any]]) -> Workbook:
             item.get("empleado_responsable", item.get("empleado_responsable", "")),
             item.get("observaciones", item.get("observaciones", ""))
         ]
-        ws.append(row_data)
+        ws.append(_without_blanks(row_data))
         
-        row_num = ws.max_row
+        # La fila que acaba de agregar append (ws.max_row recorre todas las celdas en cada fila)
+        row_num = ws._current_row
         for col in range(1, len(row_data) + 1):
-            cell = ws.cell(row=row_num, column=col)
-            _apply_cell_style(cell, bold=False, center=False)
-            # Alternar colores de fila para mejor legibilidad
-            if row_num % 2 == 0:
-                cell.fill = PatternFill(start_color="F2F2F2", end_color="F2F2F2", fill_type="solid")
+            _apply_cell_style(ws.cell(row=row_num, column=col), bold=False, center=False)
+
+    # Alternar colores de fila para mejor legibilidad
+    add_row_banding(ws, 1, len(headers), 4, ws.max_row)
     
     # Ajustar ancho de columnas
     column_widths = [15.0, 12.0, 12.0, 15.0, 12.0, 15.0, 15.0, 18.0, 12.0, 10.0, 
@@ -390,9 +496,10 @@ def _create_sdr_excel(items: List[Dict[str, Any]]) -> Workbook:
             item.get("fecha", item.get("date", "")),
             item.get("observaciones", item.get("notes", ""))
         ]
-        ws.append(row_data)
+        ws.append(_without_blanks(row_data))
         
-        row_num = ws.max_row
+        # La fila que acaba de agregar append (ws.max_row recorre todas las celdas en cada fila)
+        row_num = ws._current_row
         for col in range(1, len(row_data) + 1):
             cell = ws.cell(row=row_num, column=col)
             _apply_cell_style(cell, bold=False, center=True)
@@ -405,6 +512,873 @@ def _create_sdr_excel(items: List[Dict[str, Any]]) -> Workbook:
     return wb
 
 
+def _fill_jumpers_sheet(ws, items: List[Dict[str, Any]]):
+    """Llena la hoja de la plantilla de jumpers a partir de la fila 5"""
+    # Los datos empiezan en la fila 5 según la plantilla
+    # Columnas: B=TIPO, C=TAMAÑO, D=CANTIDAD, E=RACK, F=CONTENEDOR (o #)
+    start_row = 5
+
+    # Buscar la columna UBICACION en los encabezados PRIMERO
+    # Buscar en varias filas por si cambia la estructura de la plantilla
+    ubicacion_col = None
+    for row_header in [4, 3, 2, 1]:  # Buscar en varias filas
+        for col in range(1, ws.max_column + 1):
+            cell_value = _cell_value(ws, row_header, col)
+            if cell_value:
+                cell_str = str(cell_value).upper().strip()
+                # Buscar variaciones: UBICACION, UBICACIÓN, UBIC, LOCATION
+                if "UBICACION" in cell_str or "UBICACIÓN" in cell_str or "UBIC" in cell_str:
+                    ubicacion_col = col
+                    logger.info(f"📍 Columna UBICACION encontrada en fila {row_header}, columna {col}")
+                    break
+        if ubicacion_col:
+            break
+
+    # Si no se encuentra UBICACION, usar la columna E (5) como fallback
+    # (normalmente es UBICACION después de TIPO, TAMAÑO, CANTIDAD)
+    if ubicacion_col is None:
+        ubicacion_col = 5
+        logger.warning(f"⚠️ Columna UBICACION no encontrada, usando columna {ubicacion_col} como fallback")
+
+    # Formato de referencia de la fila 5: columnas B-F y la columna UBICACION
+    style_cols = sorted(set(range(2, 7)) | {ubicacion_col})
+    reference_cells = _reference_styles(ws, start_row, style_cols)
+
+    # Insertar datos empezando desde la fila 5
+    for idx, (tipo, tamano, cantidad, ubicacion_text) in enumerate(table_rows(JUMPERS_COLUMN_MAP, items)):
+        if idx % CANCEL_CHECK_ROWS == 0:
+            check_cancelled()
+        row = start_row + idx
+
+        # Col B: TIPO
+        _safe_set_cell_value(ws, row, 2, tipo)
+        # Col C: TAMAÑO (metros)
+        _safe_set_cell_value(ws, row, 3, tamano)
+        # Col D: CANTIDAD
+        _safe_set_cell_value(ws, row, 4, cantidad)
+
+        # Columna UBICACION: contenedores múltiples como R{rack}-{contenedor}, separados por comas
+        # Solo se escribe en UBICACION, NO en columnas RACK/CONTENEDOR por separado
+        _safe_set_cell_value(ws, row, ubicacion_col, ubicacion_text)
+
+        # Aplicar formato de la fila 5 a cada celda (incluida UBICACION)
+        for col in style_cols:
+            _apply_reference_style(ws, row, col, reference_cells[col])
+
+    # Color de la columna TIPO (B) según categoría
+    add_category_color_rules(ws, 2, start_row, start_row + len(items) - 1, JUMPER_CATEGORY_COLORS)
+
+
+def _computo_id_value(item: Dict[str, Any]) -> int:
+    """Clave de orden de cómputo: el ID numérico del equipo (0 si no es numérico)"""
+    id_val = item.get("id")
+    if id_val is None:
+        return 0
+    try:
+        if isinstance(id_val, int):
+            return id_val
+        if isinstance(id_val, str):
+            return int(id_val) if id_val.isdigit() else 0
+        return int(id_val)
+    except (ValueError, TypeError):
+        return 0
+
+
+def _computo_rows(sorted_items: List[Dict[str, Any]], offset: int = 0) -> List[List[Any]]:
+    """Filas de cómputo; ``offset`` es la posición del primer item en la lista completa ya ordenada"""
+    rows = table_rows(COMPUTO_COLUMN_MAP, sorted_items)
+    # Col A (1): ID, o el número consecutivo si el item no trae ID
+    for idx, (item, values) in enumerate(zip(sorted_items, rows), start=offset):
+        if "id" not in item:
+            values[0] = idx + 1
+    return rows
+
+
+def _fill_computo_sheet(ws, items: List[Dict[str, Any]]):
+    """Llena la hoja de la plantilla de cómputo (40 columnas) y combina grupos ID/EQUIPO PM"""
+    # La inserción empieza en la fila 5 (celda A5)
+    start_row = 5
+
+    # Buscar la primera fila vacía desde la fila 5
+    while _cell_value(ws, start_row, 1) is not None:
+        start_row += 1
+
+    logger.info(f"📝 Escribiendo {len(items)} equipos desde la fila {start_row} (celda A{start_row})")
+
+    # Obtener el formato de la fila 5 (fila de referencia)
+    # La plantilla tiene 40 columnas según los encabezados
+    reference_row = 5
+    reference_cells = _reference_styles(ws, reference_row, range(1, 41))  # Columnas A-AN (40 columnas)
+
+    # Ordenar items por ID de menor a mayor
+    sorted_items = sorted(items, key=_computo_id_value)
+
+    # Escribir cada equipo/accesorio en una fila usando función segura y copiando formato
+    for idx, values in enumerate(_computo_rows(sorted_items)):
+        if idx % CANCEL_CHECK_ROWS == 0:
+            check_cancelled()
+        row = start_row + idx
+
+        # Mapear campos según la plantilla (40 columnas, ver COMPUTO_COLUMN_MAP)
+        for col, value in enumerate(values, start=1):
+            _safe_set_cell_value(ws, row, col, value)
+
+        # Aplicar formato de la fila 5 a cada celda
+        for col in range(1, 41):
+            _apply_reference_style(ws, row, col, reference_cells[col])
+
+    # Detectar grupos de filas con el mismo ID y EQUIPO PM para combinar celdas
+    # Columna A (ID) y Columna C (EQUIPO PM)
+    # Agrupar por (ID, EQUIPO_PM) como tupla
+    groups = {}
+    for idx, item in enumerate(sorted_items, start=0):
+        row = start_row + idx
+        item_id = item.get("id")
+        item_equipo_pm = item.get("equipo_pm", "")
+        group_key = (item_id, item_equipo_pm)
+
+        if group_key not in groups:
+            groups[group_key] = {'start_row': row, 'end_row': row}
+        else:
+            groups[group_key]['end_row'] = row
+
+    # Combinar celdas para cada grupo
+    for group_key, group_info in groups.items():
+        start_row_group = group_info['start_row']
+        end_row_group = group_info['end_row']
+
+        # Solo combinar si hay más de una fila en el grupo
+        if end_row_group > start_row_group:
+            # Combinar celdas de ID (columna A) para este grupo
+            try:
+                _merge_column(ws, start_row_group, end_row_group, 1)
+                # Centrar el texto en la celda combinada
+                merged_cell = ws.cell(row=start_row_group, column=1)
+                merged_cell.alignment = Alignment(horizontal='center', vertical='center')
+                logger.info(f"✅ Celdas de ID combinadas: filas {start_row_group}-{end_row_group} (ID: {group_key[0]})")
+            except Exception as e:
+                logger.warning(f"⚠️ Error al combinar celdas de ID (filas {start_row_group}-{end_row_group}): {e}")
+
+            # Combinar celdas de EQUIPO PM (columna C) para este grupo
+            try:
+                _merge_column(ws, start_row_group, end_row_group, 3)
+                # Centrar el texto en la celda combinada
+                merged_cell = ws.cell(row=start_row_group, column=3)
+                merged_cell.alignment = Alignment(horizontal='center', vertical='center')
+                logger.info(f"✅ Celdas de EQUIPO PM combinadas: filas {start_row_group}-{end_row_group} (EQUIPO PM: {group_key[1]})")
+            except Exception as e:
+                logger.warning(f"⚠️ Error al combinar celdas de EQUIPO PM (filas {start_row_group}-{end_row_group}): {e}")
+
+
+def _fill_sdr_sheet(ws, items: List[Dict[str, Any]]):
+    """Llena las celdas fijas del formulario SDR (B9..B43) con el primer item"""
+    # Tomar el primer item (ya que es un formulario único, no una lista de items)
+    item = items[0] if items else {}
+
+    # Mapear campos a las celdas de la plantilla (ver SDR_FORM_CELLS, el mismo mapa del llenado rápido)
+    # Las columnas B y C están combinadas, así que escribimos en B
+    for ref, column in SDR_FORM_CELLS:
+        _safe_set_cell_value(ws, *coordinate_to_tuple(ref), column.value(item))
+
+
+def _fill_sicor_sheet(ws, items: List[Dict[str, Any]]):
+    """Llena la hoja de la plantilla SICOR y actualiza la fecha del encabezado"""
+    # Actualizar la fecha en el encabezado (fila 2, celda C2 que está en merged cell C2:H2)
+    try:
+        header_cell = ws.cell(row=2, column=3)  # Columna C, fila 2
+        header_text = str(header_cell.value) if header_cell.value else ""
+
+        # Obtener fecha actual en formato DD/MM/YYYY
+        now = datetime.now()
+        fecha_actual = now.strftime("%d/%m/%Y")
+
+        # Reemplazar la fecha al final del texto (formato DD/MM/YYYY)
+        # Buscar patrón de fecha al final: " - DD/MM/YYYY" o " - DD/MM/YYYY" al final
+        # Mantener todo el texto antes de la fecha
+        pattern = r'\s*-\s*\d{2}/\d{2}/\d{4}\s*$'
+        if re.search(pattern, header_text):
+            # Reemplazar la fecha al final
+            nuevo_texto = re.sub(pattern, f' - {fecha_actual}', header_text)
+        else:
+            # Si no hay fecha al final, agregarla
+            nuevo_texto = f"{header_text.rstrip()} - {fecha_actual}"
+
+        # Actualizar la celda con el nuevo texto
+        header_cell.value = nuevo_texto
+        logger.info(f"📅 Fecha actualizada en encabezado: {fecha_actual}")
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudo actualizar la fecha en el encabezado: {e}")
+
+    # Los datos empiezan en la fila 5, columna B (columna 2)
+    start_row = 5
+    start_col = 2  # Columna B
+
+    # Buscar la primera fila vacía desde la fila 5
+    while _cell_value(ws, start_row, start_col) is not None:
+        start_row += 1
+
+    logger.info(f"📝 Escribiendo {len(items)} tarjetas desde la fila {start_row}, columna {start_col}")
+
+    # Obtener el formato de la fila 5 (fila de referencia) si existe
+    reference_row = 5
+    reference_cells = _reference_styles(ws, reference_row, range(start_col, start_col + 7))  # 7 columnas: B-H
+
+    # Escribir cada tarjeta en una fila usando función segura y copiando formato
+    for idx, values in enumerate(table_rows(SICOR_COLUMN_MAP, items)):
+        if idx % CANCEL_CHECK_ROWS == 0:
+            check_cancelled()
+        row = start_row + idx
+
+        # Mapear campos según la plantilla (empezando en columna B, ver SICOR_COLUMN_MAP)
+        # B=EN STOCK, C=No., D=CODIGO, E=SERIE, F=MARCA, G=POSICION, H=COMENTARIOS
+        for col, value in enumerate(values, start=start_col):
+            _safe_set_cell_value(ws, row, col, value)
+
+        # Aplicar formato de la fila 5 a cada celda (los colores de stock van como formato condicional)
+        for col in range(start_col, start_col + 7):
+            _apply_reference_style(ws, row, col, reference_cells[col])
+
+    # NO en stock: fila en rojo (texto blanco en B y C); en stock: CODIGO (D) en azul #558ED5
+    add_sicor_stock_rules(ws, start_row, start_row + len(items) - 1, start_col)
+
+
+def _create_sicor_excel(items: List[Dict[str, Any]]) -> Workbook:
+    """Crea un archivo Excel SICOR básico cuando no hay plantilla"""
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Inventario SICOR"
+
+    # Título
+    title_cell = ws.cell(row=1, column=2, value=f'INVENTARIO SICOR {_get_month_year()}')
+    title_cell.font = Font(bold=True, size=14)
+    title_cell.alignment = Alignment(horizontal='center', vertical='center')
+
+    # Encabezados (fila 4)
+    headers = ['EN STOCK', 'No.', 'CODIGO', 'SERIE', 'MARCA', 'POSICION', 'COMENTARIOS']
+    for idx, header in enumerate(headers, start=2):
+        cell = ws.cell(row=4, column=idx, value=header)
+        _apply_cell_style(cell, bold=True, center=True)
+
+    # Datos (fila 5 en adelante)
+    for idx, item in enumerate(items, start=0):
+        if idx % CANCEL_CHECK_ROWS == 0:
+            check_cancelled()
+        row = 5 + idx
+        en_stock = str(item.get("en_stock", "SI")).upper().strip()
+
+        row_data = [en_stock, item.get("numero", ""), item.get("codigo", ""), item.get("serie", ""),
+                    item.get("marca", ""), item.get("posicion", ""), item.get("comentarios", "")]
+        for col, value in enumerate(_without_blanks(row_data), start=2):
+            ws.cell(row=row, column=col, value=value)
+
+        # Aplicar estilo
+        for col in range(2, 9):
+            _apply_cell_style(ws.cell(row=row, column=col), bold=False, center=True)
+
+    # Colores de stock como formato condicional (ver _fill_sicor_sheet)
+    add_sicor_stock_rules(ws, 5, 5 + len(items) - 1)
+
+    return wb
+
+
+def _fill_bitacora_sheet(ws, items: List[Dict[str, Any]], year, template_exists: bool,
+                         fecha_actual: Optional[str] = None):
+    """Llena la hoja de un año de la bitácora a partir de B4 (``fecha_actual`` por defecto: hoy)"""
+    if fecha_actual is None:
+        fecha_actual = datetime.now().strftime("%d/%m/%Y")
+    # Actualizar la fecha en el encabezado si existe (similar a SICOR)
+    try:
+        # Buscar celda con fecha en las primeras filas
+        for row in range(1, 5):
+            for col in range(1, 10):
+                cell = ws._cells.get((row, col))
+                if cell is not None and cell.value and isinstance(cell.value, str):
+                    cell_text = str(cell.value)
+                    # Si contiene "fecha" o un patrón de fecha, actualizar
+                    if "fecha" in cell_text.lower() or re.search(r'\d{2}/\d{2}/\d{4}', cell_text):
+                        pattern = r'\s*-\s*\d{2}/\d{2}/\d{4}\s*$'
+                        if re.search(pattern, cell_text):
+                            nuevo_texto = re.sub(pattern, f' - {fecha_actual}', cell_text)
+                        else:
+                            nuevo_texto = f"{cell_text.rstrip()} - {fecha_actual}"
+                        cell.value = nuevo_texto
+                        logger.info(f"📅 Fecha actualizada en encabezado (año {year}): {fecha_actual}")
+                        break
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudo actualizar la fecha en el encabezado (año {year}): {e}")
+
+    # Los datos empiezan en B4 (fila 4, columna B = columna 2)
+    start_row = 4
+    start_col = 2  # Columna B
+
+    # Buscar la primera fila vacía desde la fila 4 (B4)
+    # Si B4 ya tiene datos, buscar la siguiente fila vacía
+    while _cell_value(ws, start_row, start_col) is not None:
+        start_row += 1
+
+    logger.info(f"📝 Escribiendo {len(items)} registros de bitácora (año {year}) desde la fila {start_row}, columna B")
+
+    # Obtener el formato de la fila 4 (B4) como referencia si existe
+    reference_row = 4
+    # 13 columnas empezando desde B: Consecutivo, Fecha, Técnico, Tarjeta, Código, Serie, Folio, Envía, Recibe, Guía, Anexos, COBO (INCIDENTE), Observaciones
+    reference_cells = _reference_styles(ws, reference_row, range(start_col, start_col + 13))
+
+    # Escribir cada registro de bitácora en una fila empezando desde B4
+    for idx, values in enumerate(table_rows(BITACORA_COLUMN_MAP, items)):
+        if idx % CANCEL_CHECK_ROWS == 0:
+            check_cancelled()
+        row = start_row + idx
+
+        # Mapear campos según la plantilla empezando desde columna B (2), ver BITACORA_COLUMN_MAP
+        # Consecutivo, Fecha (DD/MM/YYYY), Técnico, Tarjeta, Código, Serie, Folio, Envía, Recibe,
+        # Guía, Anexos, COBO (en la plantilla se llama "INCIDENTE"), Observaciones
+        for col, value in enumerate(values, start=start_col):
+            _safe_set_cell_value(ws, row, col, value)
+
+        # Aplicar formato de la fila de referencia (B4) a cada celda
+        for col in range(start_col, start_col + 13):
+            _apply_reference_style(ws, row, col, reference_cells[col])
+
+    # Si no hay plantilla, crear estructura básica para esta hoja (solo encabezados)
+    if not template_exists:
+        # Título
+        title_cell = ws.cell(row=1, column=1, value=f'BITÁCORA DE ENVÍOS - AÑO {year}')
+        title_cell.font = Font(bold=True, size=14)
+        title_cell.alignment = Alignment(horizontal='center', vertical='center')
+
+        # Encabezados (fila 3, empezando desde columna B)
+        headers = ['Consecutivo', 'Fecha', 'Técnico', 'Tarjeta', 'Código', 'Serie', 'Folio', 
+                  'Envía', 'Recibe', 'Guía', 'Anexos', 'INCIDENTE', 'Observaciones']
+        for col, header in enumerate(headers, start=2):  # Empezar desde columna B (2)
+            cell = ws.cell(row=3, column=col, value=header)
+            _apply_cell_style(cell, bold=True, center=True)
+
+
+def _build_jumpers_workbook(items: List[Dict[str, Any]]) -> Workbook:
+    # Intentar usar plantilla si existe
+    if _ensure_template(TEMPLATE_PATH_JUMPERS):
+        wb = TEMPLATES.load(TEMPLATE_PATH_JUMPERS)
+        _fill_jumpers_sheet(wb.active, items)
+        return wb
+    # Crear desde cero con formato correcto si no hay plantilla
+    return _create_jumpers_excel(items)
+
+
+def _build_computo_workbook(items: List[Dict[str, Any]]) -> Workbook:
+    # Usar plantilla si existe
+    if _ensure_template(TEMPLATE_PATH_COMPUTO):
+        logger.info(f"📄 Usando plantilla: {TEMPLATE_PATH_COMPUTO}")
+        wb = TEMPLATES.load(TEMPLATE_PATH_COMPUTO)
+        _fill_computo_sheet(wb.active, items)
+        return wb
+    # Crear desde cero con formato correcto
+    return _create_computo_excel(items)
+
+
+def _build_sdr_workbook(items: List[Dict[str, Any]]) -> Workbook:
+    # Intentar usar plantilla si existe, sino crear desde cero
+    if _ensure_template(TEMPLATE_PATH_SDR):
+        wb = TEMPLATES.load(TEMPLATE_PATH_SDR)
+        _fill_sdr_sheet(wb.active, items)
+        return wb
+    return _create_sdr_excel(items)
+
+
+def _build_sicor_workbook(items: List[Dict[str, Any]]) -> Workbook:
+    # Usar plantilla si existe
+    if _ensure_template(TEMPLATE_PATH_SICOR):
+        logger.info(f"📄 Usando plantilla: {TEMPLATE_PATH_SICOR}")
+        wb = TEMPLATES.load(TEMPLATE_PATH_SICOR)
+        _fill_sicor_sheet(wb.active, items)
+        return wb
+    # Si no hay plantilla, crear estructura básica
+    logger.warning("No se encontró plantilla SICOR, creando estructura básica")
+    return _create_sicor_excel(items)
+
+
+def _bitacora_sheet_order(title: str):
+    """Orden de hojas de bitácora: por año y luego por parte ("2024", "2024 (2)", ...)"""
+    match = re.match(r'^(\d+)(?: \((\d+)\))?$', title)
+    if not match:
+        return (9999, 0)
+    return (int(match.group(1)), int(match.group(2) or 1))
+
+
+def _build_bitacora_workbook(years_data: List[Dict[str, Any]],
+                             max_rows_per_sheet: int = EXCEL_MAX_ROWS - BITACORA_FIRST_ROW + 1,
+                             fecha_actual: Optional[str] = None) -> Workbook:
+    """Crea el libro de bitácora con una hoja por año (years_data ya ordenado)"""
+    # Crear un nuevo workbook
+    wb = Workbook()
+    # Eliminar la hoja por defecto
+    wb.remove(wb.active)
+
+    # Usar plantilla si existe - CARGAR SOLO UNA VEZ para optimizar
+    template_exists = _ensure_template(TEMPLATE_PATH_BITACORA)
+    template_wb = None
+    template_ws = None
+    template_merged_ranges = None
+    template_column_widths = None
+    template_row_heights = None
+
+    if template_exists:
+        logger.info(f"📄 Cargando plantilla una vez: {TEMPLATE_PATH_BITACORA}")
+        template_wb = TEMPLATES.load(TEMPLATE_PATH_BITACORA)
+        template_ws = template_wb.active
+        template_merged_ranges = list(template_ws.merged_cells.ranges)
+        template_column_widths = {col: template_ws.column_dimensions[col].width for col in template_ws.column_dimensions}
+        template_row_heights = {row: template_ws.row_dimensions[row].height for row in template_ws.row_dimensions}
+
+    # Procesar cada año
+    total_years = len(years_data)
+    for idx, year_data in enumerate(years_data, start=1):
+        year = year_data.get("year")
+        items: List[Dict[str, Any]] = year_data.get("items") or []
+
+        if not items:
+            logger.warning(f"⚠️ No hay items para el año {year}, saltando...")
+            continue
+
+        logger.info(f"📝 [{idx}/{total_years}] Procesando año {year} con {len(items)} registros")
+
+        # Dividir el año en varias hojas si excede el límite de filas por hoja
+        for part, chunk in enumerate(chunk_items(items, max_rows_per_sheet), start=1):
+            # Entre años (y partes de un año) se revisa si la solicitud se canceló
+            check_cancelled()
+            title = str(year) if part == 1 else f"{year} ({part})"
+
+            # Crear o copiar hoja para esta parte del año
+            if template_exists and template_ws:
+                # Crear nueva hoja con el nombre del año
+                ws = wb.create_sheet(title=title)
+
+                # Copiar las celdas de la plantilla (reutilizando la plantilla cargada); iter_rows()
+                # crearía todas las celdas vacías del rango en ambas hojas
+                for cell in list(template_ws._cells.values()):
+                    if cell.value is None and not cell.has_style:
+                        continue
+                    new_cell = ws.cell(row=cell.row, column=cell.column)
+                    new_cell.value = cell.value
+                    if cell.has_style:
+                        new_cell.font = cell.font.copy() if cell.font else None
+                        new_cell.fill = cell.fill.copy() if cell.fill else None
+                        new_cell.border = cell.border.copy() if cell.border else None
+                        new_cell.alignment = cell.alignment.copy() if cell.alignment else None
+                        new_cell.number_format = cell.number_format
+
+                # Copiar merged cells (reutilizando los rangos guardados)
+                for merged_range in template_merged_ranges:
+                    ws.merge_cells(str(merged_range))
+
+                # Copiar anchos de columna (reutilizando los anchos guardados)
+                for col, width in template_column_widths.items():
+                    ws.column_dimensions[col].width = width
+
+                # Copiar altos de fila (reutilizando los altos guardados)
+                for row, height in template_row_heights.items():
+                    ws.row_dimensions[row].height = height
+            else:
+                # Crear hoja nueva sin plantilla
+                ws = wb.create_sheet(title=title)
+
+            _fill_bitacora_sheet(ws, chunk, year, template_exists, fecha_actual)
+
+    # Las hojas ya están ordenadas porque years_data está ordenado
+    # Pero por si acaso, reordenarlas explícitamente
+    # Crear un diccionario con las hojas
+    sheets_dict = {ws.title: ws for ws in wb.worksheets}
+    sorted_sheet_names = sorted(sheets_dict.keys(), key=_bitacora_sheet_order)
+
+    # Reordenar las hojas moviendo cada una a su posición correcta
+    for i, sheet_name in enumerate(sorted_sheet_names):
+        if i == 0:
+            continue  # La primera hoja ya está en su lugar
+        sheet = sheets_dict[sheet_name]
+        current_index = wb.index(sheet)
+        target_index = i
+        if current_index != target_index:
+            # Mover la hoja a la posición correcta
+            wb.move_sheet(sheet, offset=target_index - current_index)
+
+    return wb
+
+
+@dataclass(frozen=True)
+class ReportSpec:
+    """Datos de un reporte de lista (una fila por item) usados por los endpoints"""
+    name: str
+    filename_prefix: str
+    columns: int
+    first_data_row: int
+    template_path: str
+    fill_sheet: Callable
+    build_workbook: Callable
+    sort_key: Optional[Callable] = None
+
+
+REPORTS: Dict[str, ReportSpec] = {
+    "jumpers": ReportSpec("jumpers", "inventario_jumpers", JUMPERS_COLUMNS, JUMPERS_FIRST_ROW,
+                          TEMPLATE_PATH_JUMPERS, _fill_jumpers_sheet, _build_jumpers_workbook),
+    "computo": ReportSpec("computo", "inventario_computo", COMPUTO_COLUMNS, COMPUTO_FIRST_ROW,
+                          TEMPLATE_PATH_COMPUTO, _fill_computo_sheet, _build_computo_workbook,
+                          sort_key=_computo_id_value),
+    "sicor": ReportSpec("sicor", "inventario_sicor", SICOR_COLUMNS, SICOR_FIRST_ROW,
+                        TEMPLATE_PATH_SICOR, _fill_sicor_sheet, _build_sicor_workbook),
+}
+
+
+def _copy_conditional_formatting(source_ws, target_ws):
+    for cf_range in source_ws.conditional_formatting:
+        for rule in cf_range.rules:
+            target_ws.conditional_formatting.add(str(cf_range.sqref), rule)
+
+
+def _build_split_workbook(report: str, chunks: List[List[Dict[str, Any]]]) -> Workbook:
+    """Un solo libro con una hoja por parte; cada hoja adicional repite el encabezado de la plantilla"""
+    spec = REPORTS[report]
+    wb = TEMPLATES.load(spec.template_path)
+    base_ws = wb.active
+
+    # Clonar la hoja de la plantilla ANTES de llenarla para que cada parte parta del encabezado limpio
+    sheets = [base_ws]
+    for part in range(2, len(chunks) + 1):
+        ws = wb.copy_worksheet(base_ws)
+        ws.title = f"{base_ws.title[:24]} ({part})"
+        _copy_conditional_formatting(base_ws, ws)
+        # Dejar las partes juntas, inmediatamente después de la hoja anterior
+        wb.move_sheet(ws, offset=wb.index(sheets[-1]) + 1 - wb.index(ws))
+        sheets.append(ws)
+
+    for part, (ws, chunk) in enumerate(zip(sheets, chunks), start=1):
+        logger.info(f"📄 Parte {part}/{len(chunks)}: {len(chunk)} filas en hoja '{ws.title}'")
+        spec.fill_sheet(ws, chunk)
+    return wb
+
+
+def _render_workbook(builder, *args) -> bytes:
+    """Construye el libro con ``builder`` y lo serializa (se ejecuta fuera del event loop)"""
+    wb = builder(*args)
+    file_bytes = _save_workbook_to_bytes(wb)
+    if not file_bytes:
+        raise RuntimeError("Generated file is empty")
+    return file_bytes
+
+
+def _render_encoded_workbook(strings: str, builder, *args) -> bytes:
+    """Como ``_render_workbook``, pasando a la tabla compartida las columnas que indique ``strings``"""
+    return share_strings(_render_workbook(builder, *args), strings)
+
+
+def _build_bitacora_year_part(year, items: List[Dict[str, Any]], max_rows_per_sheet: int):
+    """Genera las hojas de un año con la fecha del encabezado como marcador (se ejecuta en un worker)"""
+    package = _render_workbook(_build_bitacora_workbook, [{"year": year, "items": items}],
+                               max_rows_per_sheet, FECHA_PLACEHOLDER)
+    return SheetPart(styles=styles_signature(package), sheets=extract_sheets(package)), package
+
+
+def _bitacora_part_keys(years: List[tuple], max_rows_per_sheet: int) -> List[str]:
+    version = template_version(TEMPLATE_PATH_BITACORA)
+    return [items_key("bitacora", version, year, max_rows_per_sheet, items=items) for year, items in years]
+
+
+async def _render_bitacora(years_data: List[Dict[str, Any]], max_rows_per_sheet: int) -> bytes:
+    """Libro de bitácora: cada año se construye en paralelo en el pool de procesos (o se toma de
+    la caché si sus items no cambiaron) y las hojas se ensamblan en orden de año"""
+    if not _ensure_template(TEMPLATE_PATH_BITACORA):
+        return await run_in_threadpool(_render_workbook, _build_bitacora_workbook, years_data, max_rows_per_sheet)
+
+    version = template_version(TEMPLATE_PATH_BITACORA)
+    years = [(yd.get("year"), yd.get("items")) for yd in years_data if yd.get("items")]
+    parts: List[Optional[SheetPart]] = [None] * len(years)
+    keys: List[Optional[str]] = [None] * len(years)
+    if SHEET_CACHE.enabled:
+        keys = await run_in_threadpool(_bitacora_part_keys, years, max_rows_per_sheet)
+        parts = await run_in_threadpool(lambda: [SHEET_CACHE.get(key) for key in keys])
+        for (year, items), part in zip(years, parts):
+            if part is not None:
+                logger.info(f"♻️ Año {year}: {len(items)} registros tomados de caché")
+
+    missing = [i for i, part in enumerate(parts) if part is None]
+    if missing:
+        logger.info(f"🧵 Generando {len(missing)} año(s) en paralelo con {min(len(missing), worker_count())} procesos")
+    # Los procesos sólo reciben el plazo de la solicitud; la desconexión se revisa aquí entre años
+    token = current_token()
+    deadline = token.deadline if token is not None else None
+    futures = {asyncio.ensure_future(run_in_process(call_with_deadline, deadline, _build_bitacora_year_part,
+                                                    years[i][0], years[i][1], max_rows_per_sheet)): i
+               for i in missing}
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                i = futures[future]
+                part, package = future.result()
+                # Un año terminado es una parte completa: queda en caché para el reintento del cliente
+                parts[i] = part
+                if SHEET_CACHE.enabled:
+                    await run_in_threadpool(SHEET_CACHE.put, keys[i], part)
+                # Sólo el memo del proceso: consultar el backend aquí bloquearía el event loop
+                if not SHEET_CACHE.has_local_base(version):
+                    await run_in_threadpool(SHEET_CACHE.put_base, version, package)
+            check_cancelled()
+    finally:
+        for future in pending:
+            future.cancel()
+
+    base = await run_in_threadpool(SHEET_CACHE.get_base, version)
+    sheets = [sheet for part in parts for sheet in part.sheets]
+    titles = [title for title, _ in sheets]
+    # Sólo se ensamblan partes con los mismos estilos y sin nombres de hoja repetidos
+    if (not parts or base is None or len(set(titles)) != len(titles)
+            or any(part.styles != styles_signature(base) for part in parts)):
+        logger.info("Las partes por año no se pueden ensamblar, generando el libro completo")
+        return await run_in_threadpool(_render_workbook, _build_bitacora_workbook, years_data, max_rows_per_sheet)
+
+    fecha_actual = datetime.now().strftime("%d/%m/%Y").encode("utf-8")
+    sheets.sort(key=lambda sheet: _bitacora_sheet_order(sheet[0]))
+    return await run_in_threadpool(
+        assemble_workbook, base,
+        [(title, xml.replace(FECHA_PLACEHOLDER.encode("utf-8"), fecha_actual)) for title, xml in sheets])
+
+
+def _excel_response(file_bytes: bytes, filename: str) -> Response:
+    global LAST_GENERATED_FILE_CONTENT, LAST_GENERATED_FILENAME
+    LAST_GENERATED_FILE_CONTENT = file_bytes
+    LAST_GENERATED_FILENAME = filename
+
+    logger.info(f"📦 Tamaño del archivo generado: {len(file_bytes)} bytes")
+
+    return Response(content=file_bytes,
+                    media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    headers={"Content-Disposition": f"attachment; filename=\"{filename}\"",
+                             "ETag": _content_etag(file_bytes)})
+
+
+def _content_etag(content: bytes) -> str:
+    """sha256 del archivo: la salida es reproducible, así que identifica su contenido"""
+    return f'"{hashlib.sha256(content).hexdigest()}"'
+
+
+def _timestamp() -> str:
+    return datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+
+
+def _datestamp() -> str:
+    # Para nombres dentro del contenido (partes de un ZIP): sólo la fecha, como los encabezados
+    return datetime.now().strftime("%Y%m%d")
+
+
+def _get_items(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    items: List[Dict[str, Any]] = payload.get("items") or []
+    if not isinstance(items, list) or len(items) == 0:
+        raise HTTPException(status_code=400, detail="items must be a non-empty list")
+    return items
+
+
+def _get_query_spec(payload: Dict[str, Any]) -> Optional[QuerySpec]:
+    """Especificación de consulta de la llave "source" (None si el payload trae los items)"""
+    if payload.get("source") is None:
+        return None
+    try:
+        return QuerySpec.from_payload(payload["source"])
+    except InvalidSourceSpec as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def _fetch_source(fetch, *args):
+    """Ejecuta una consulta de DB_SOURCE traduciendo sus errores a respuestas HTTP"""
+    try:
+        return await fetch(*args)
+    except InvalidSourceSpec as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SourceNotConfigured as e:
+        raise HTTPException(status_code=503, detail=f"source is not available: {e}")
+
+
+def _get_split_policy(payload: Dict[str, Any], first_data_row: int) -> SplitPolicy:
+    """Llave "split": cómo dividir una exportación xlsx que no cabe en una hoja o en un archivo"""
+    try:
+        return SplitPolicy.from_payload(payload, first_data_row)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _get_consolidate(report: str, payload: Dict[str, Any]) -> bool:
+    """Llave "consolidate": una fila por (tipo, tamaño) en el reporte de jumpers"""
+    value = payload.get("consolidate")
+    if value is None or value is False:
+        return False
+    if not isinstance(value, bool):
+        raise HTTPException(status_code=400, detail="consolidate must be a boolean")
+    if report != "jumpers":
+        raise HTTPException(status_code=400, detail="consolidate is only supported for jumpers")
+    return True
+
+
+async def _resolve_items(report: str, payload: Dict[str, Any], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Items del payload o, con "source", leídos de Postgres (a lo más ``limit`` filas); consolidados si se pide"""
+    consolidate = _get_consolidate(report, payload)
+    spec = _get_query_spec(payload)
+    if spec is None:
+        items = _get_items(payload)
+    else:
+        if limit is not None:
+            spec = replace(spec, limit=limit)
+        items = await _fetch_source(DB_SOURCE.fetch_items, report, spec)
+        logger.info(f"🗄️ {len(items)} filas de {report} leídas de la base de datos")
+        if not items:
+            raise HTTPException(status_code=404, detail="source query returned no rows")
+    if consolidate:
+        consolidated = await run_in_threadpool(consolidate_jumpers, items, list(JUMPER_CATEGORY_COLORS))
+        logger.info(f"🧮 {len(items)} jumpers consolidados en {len(consolidated)} filas por tipo y tamaño")
+        return consolidated
+    return items
+
+
+async def _resolve_years_data(payload: Dict[str, Any], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """years_data de la bitácora ordenado por año (del payload o, con "source", de t_bitacora_envios)"""
+    # Nuevo formato: years_data es una lista de objetos con 'year' e 'items'
+    years_data: List[Dict[str, Any]] = payload.get("years_data") or []
+
+    # Con "source" los años se leen de t_bitacora_envios
+    spec = _get_query_spec(payload)
+    if spec is not None:
+        if limit is not None:
+            spec = replace(spec, limit=limit)
+        years_data = await _fetch_source(DB_SOURCE.fetch_years_data, spec)
+        logger.info(f"🗄️ Bitácora leída de la base de datos: {len(years_data)} años")
+
+    # Compatibilidad con formato antiguo (un solo año)
+    if not years_data:
+        items: List[Dict[str, Any]] = payload.get("items") or []
+        year = payload.get("year", datetime.now().year)
+        if items:
+            years_data = [{"year": year, "items": items}]
+
+    if not isinstance(years_data, list) or len(years_data) == 0:
+        raise HTTPException(status_code=400, detail="years_data must be a non-empty list")
+
+    # Ordenar años de forma ascendente
+    years_data.sort(key=lambda x: x.get("year", 0))
+    return years_data
+
+
+def _cancellable(endpoint):
+    """Ejecuta un endpoint de generación bajo un CancelToken: se cancela si el cliente se desconecta
+    o vence ``X-Deadline-Ms``; lo generado hasta ese momento se descarta"""
+    @functools.wraps(endpoint)
+    async def run(request: Request):
+        try:
+            token = CANCELLATION.token(request.headers)
+        except InvalidDeadline as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        # Leer el cuerpo antes de vigilar la conexión: después sólo puede llegar http.disconnect
+        await request.body()
+        try:
+            return await CANCELLATION.run(token, lambda: endpoint(request), request.is_disconnected)
+        except GenerationCancelled as e:
+            logger.warning(f"🛑 Generación cancelada ({e.reason}): {request.url.path}")
+            # 499: el cliente cerró la conexión (nadie leerá la respuesta); 504: venció el plazo
+            status_code = 504 if e.reason == REASON_DEADLINE else 499
+            return JSONResponse(status_code=status_code, content={"detail": f"generation cancelled: {e.reason}"})
+    return run
+
+
+def _request_with_body(request: Request, body: bytes) -> Request:
+    """La misma solicitud con ``body`` como cuerpo; después llegan los mensajes reales (http.disconnect)"""
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await request.receive()
+    return Request(request.scope, receive)
+
+
+def _upload_required() -> JSONResponse:
+    return JSONResponse(status_code=UPLOAD_REQUIRED_STATUS, content={"detail": "payload body required", "upload": True})
+
+
+def _payload_precheck(endpoint):
+    """Con ``X-Payload-Sha256`` y sin cuerpo responde con el resultado o el payload que el servicio ya
+    tiene (428 si hay que subirlo); con cuerpo verifica el hash y guarda el payload y el resultado"""
+    @functools.wraps(endpoint)
+    async def run(request: Request):
+        header = request.headers.get(PAYLOAD_HASH_HEADER)
+        if header is None:
+            return await endpoint(request)
+        if not PAYLOADS.enabled:
+            # Sin almacén no hay con qué responder una verificación sin cuerpo: el cliente debe subirlo
+            if not await request.body():
+                PAYLOADS.uploads_required += 1
+                return _upload_required()
+            return await endpoint(request)
+        try:
+            digest = parse_digest(header)
+        except InvalidPayloadHash as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        key = PAYLOADS.result_key(request.url.path, request.url.query, digest)
+        body = await request.body()
+        if body:
+            try:
+                await run_in_threadpool(verify_body, digest, body)
+            except InvalidPayloadHash as e:
+                PAYLOADS.mismatches += 1
+                raise HTTPException(status_code=400, detail=str(e))
+            PAYLOADS.uploads += 1
+            await run_in_threadpool(PAYLOADS.put_payload, digest, body)
+            origin = "upload"
+        else:
+            PAYLOADS.prechecks += 1
+            stored = await run_in_threadpool(PAYLOADS.get_result, key)
+            if stored is not None:
+                PAYLOADS.result_hits += 1
+                logger.info(f"♻️ {request.url.path}: payload {digest[:12]} ya generado hoy, se entrega sin subirlo")
+                return Response(content=stored.content, media_type=stored.media_type,
+                                headers={"Content-Disposition": stored.disposition, PAYLOAD_CACHE_HEADER: "result",
+                                         "ETag": _content_etag(stored.content)})
+            body = await run_in_threadpool(PAYLOADS.get_payload, digest)
+            if body is None:
+                PAYLOADS.uploads_required += 1
+                return _upload_required()
+            PAYLOADS.payload_hits += 1
+            logger.info(f"♻️ {request.url.path}: payload {digest[:12]} tomado de caché, sin subirlo")
+            request = _request_with_body(request, body)
+            origin = "payload"
+
+        response = await endpoint(request)
+        # Sólo libros completos: las respuestas en streaming (CSV, ZIP por partes) no se guardan
+        if (response.status_code == 200 and not isinstance(response, StreamingResponse)
+                and await run_in_threadpool(cacheable_result, body)):
+            await run_in_threadpool(PAYLOADS.put_result, key,
+                                    StoredResult(bytes(response.body), response.media_type,
+                                                 response.headers.get("content-disposition", "")))
+        response.headers[PAYLOAD_CACHE_HEADER] = origin
+        return response
+    return run
+
+
+@app.exception_handler(LaneFullError)
+async def lane_full_handler(request: Request, exc: LaneFullError):
+    logger.warning(f"🚦 Cola llena en carril {exc.lane}, reintentar en {exc.retry_after}s")
+    return JSONResponse(status_code=429,
+                        content={"detail": str(exc), "lane": exc.lane, "retry_after": exc.retry_after},
+                        headers={"Retry-After": str(exc.retry_after)})
+
+
+def warm_templates():
+    """Mapea las plantillas precompiladas y compila el formulario SDR antes de la primera solicitud"""
+    paths = [TEMPLATE_PATH_JUMPERS, TEMPLATE_PATH_COMPUTO, TEMPLATE_PATH_SDR, TEMPLATE_PATH_SICOR,
+             TEMPLATE_PATH_BITACORA]
+    mapped = TEMPLATES.warm(paths)
+    FORM_FILLER.get(TEMPLATE_PATH_SDR, SDR_FORM_CELLS)
+    logger.info(f"🔥 Plantillas precompiladas mapeadas: {mapped}/{sum(1 for p in paths if os.path.exists(p))}")
+
+
 @app.get("/", tags=["root"])
 def root():
     return {
@@ -413,7 +1387,10 @@ def root():
             "/api/generate-jumpers-excel",
             "/api/generate-computo-excel",
             "/api/generate-sdr-excel",
+            "/api/generate-sicor-excel",
+            "/api/generate-bitacora-excel",
             "/api/debug-last-file",
+            "/api/metrics",
             "/health"
         ]
     }
@@ -432,954 +1409,672 @@ def health():
         return JSONResponse(status_code=500, content={"ok": False, "error": str(e)})
 
 
-@app.post("/api/generate-jumpers-excel")
-async def generate_jumpers_excel(request: Request):
-    payload = await request.json()
-    items: List[Dict[str, Any]] = payload.get("items") or []
-    if not isinstance(items, list) or len(items) == 0:
-        raise HTTPException(status_code=400, detail="items must be a non-empty list")
+@app.get("/api/metrics", tags=["health"])
+def metrics():
+    """Profundidad de cola, concurrencia y tiempos de espera por carril"""
+    return {"ok": True, "admission": ADMISSION.snapshot(), "sheet_cache": SHEET_CACHE.snapshot(),
+            "file_cache": FILE_CACHE.snapshot(), "payloads": PAYLOADS.snapshot(), "form_fill": FORM_FILLER.snapshot(),
+            "templates": TEMPLATES.snapshot(), "cancellation": CANCELLATION.snapshot(),
+            "db_source": DB_SOURCE.snapshot(),
+            "snapshots": SNAPSHOTS.snapshot()}
+
+
+async def _stream_workbook_parts(parts, strings: str, token: Optional[CancelToken] = None):
+    """Construye las partes en paralelo y las envía dentro de un ZIP en orden de parte"""
+    deadline = token.deadline if token is not None else None
+    stream = ZipStream()
+    zf = open_zip_stream(stream)
+    pending: Dict[asyncio.Future, int] = {}
+    finished: Dict[int, bytes] = {}
+    queue = iter(enumerate(parts))
+    filenames: List[str] = []
+    next_part = 0
+
+    def submit_next() -> bool:
+        # Máximo una parte en vuelo o esperando turno por proceso: la memoria queda acotada sin importar el total
+        if len(pending) + len(finished) >= worker_count():
+            return False
+        for index, (filename, builder, arg) in queue:
+            filenames.append(filename)
+            pending[asyncio.ensure_future(run_in_process(call_with_deadline, deadline, _render_encoded_workbook,
+                                                         strings, builder, arg))] = index
+            return True
+        return False
 
     try:
-        # Intentar usar plantilla si existe
-        if _ensure_template(TEMPLATE_PATH_JUMPERS):
-            wb = openpyxl.load_workbook(TEMPLATE_PATH_JUMPERS)
-            ws = wb.active
-            
-            # Los datos empiezan en la fila 5 según la plantilla
-            # Columnas: B=TIPO, C=TAMAÑO, D=CANTIDAD, E=RACK, F=CONTENEDOR (o #)
-            start_row = 5
-            
-            # Buscar la columna UBICACION en los encabezados PRIMERO
-            # Buscar en varias filas por si cambia la estructura de la plantilla
-            ubicacion_col = None
-            for row_header in [4, 3, 2, 1]:  # Buscar en varias filas
-                for col in range(1, ws.max_column + 1):
-                    cell_value = ws.cell(row=row_header, column=col).value
-                    if cell_value:
-                        cell_str = str(cell_value).upper().strip()
-                        # Buscar variaciones: UBICACION, UBICACIÓN, UBIC, LOCATION
-                        if "UBICACION" in cell_str or "UBICACIÓN" in cell_str or "UBIC" in cell_str:
-                            ubicacion_col = col
-                            logger.info(f"📍 Columna UBICACION encontrada en fila {row_header}, columna {col}")
-                            break
-                if ubicacion_col:
-                    break
-            
-            # Si no se encuentra UBICACION, usar la columna E (5) como fallback
-            # (normalmente es UBICACION después de TIPO, TAMAÑO, CANTIDAD)
-            if ubicacion_col is None:
-                ubicacion_col = 5
-                logger.warning(f"⚠️ Columna UBICACION no encontrada, usando columna {ubicacion_col} como fallback")
-            
-            # Obtener formato de referencia de la fila 5
-            # Incluir la columna UBICACION en el rango si está dentro de B-F, o extender el rango
-            max_ref_col = max(7, ubicacion_col + 1)  # Asegurar que incluya UBICACION
-            reference_cells = {}
-            for col in range(2, max_ref_col):  # Columnas B hasta incluir UBICACION
-                ref_cell = ws.cell(row=start_row, column=col)
-                reference_cells[col] = {
-                    'font': ref_cell.font.copy() if ref_cell.font else None,
-                    'fill': ref_cell.fill.copy() if ref_cell.fill else None,
-                    'border': ref_cell.border.copy() if ref_cell.border else None,
-                    'alignment': ref_cell.alignment.copy() if ref_cell.alignment else None,
-                    'number_format': ref_cell.number_format,
-                }
-            
-            # Insertar datos empezando desde la fila 5
-            for idx, item in enumerate(items, start=0):
-                row = start_row + idx
-                
-                # Obtener el tipo para determinar el color
-                tipo = item.get("tipo", item.get("categoryName", ""))
-                tipo_color = _get_jumper_category_color(tipo)
-                
-                # Col B: TIPO
-                _safe_set_cell_value(ws, row, 2, tipo)
-                # Col C: TAMAÑO (metros)
-                _safe_set_cell_value(ws, row, 3, item.get("tamano", item.get("size", "")))
-                # Col D: CANTIDAD
-                _safe_set_cell_value(ws, row, 4, item.get("cantidad", item.get("quantity", 0)))
-                
-                # Columna UBICACION: Formatear contenedores múltiples como R{rack}-{contenedor}
-                # Solo se escribe en UBICACION, NO en columnas RACK/CONTENEDOR por separado
-                contenedores = item.get("contenedores", [])
-                ubicaciones = []
-                
-                if contenedores and len(contenedores) > 0:
-                    # Formatear cada contenedor como R{rack}-{contenedor}
-                    for cont in contenedores:
-                        rack = str(cont.get("rack", "")).strip()
-                        contenedor = str(cont.get("contenedor", "")).strip()
-                        
-                        if rack and contenedor:
-                            # Extraer número del rack (ej: "1" de "Rack 1" o "1")
-                            rack_num = rack
-                            if "rack" in rack.lower():
-                                # Si contiene "rack", extraer el número
-                                match = re.search(r'\d+', rack)
-                                if match:
-                                    rack_num = match.group()
-                            
-                            ubicacion = f"R{rack_num}-{contenedor}"
-                            ubicaciones.append(ubicacion)
-                        elif contenedor:
-                            # Si solo hay contenedor sin rack, solo mostrar el contenedor
-                            ubicaciones.append(contenedor)
-                
-                # Si no hay contenedores múltiples, usar rack/contenedor antiguo como fallback
-                if not ubicaciones:
-                    rack = str(item.get("rack", "")).strip()
-                    contenedor = str(item.get("contenedor", item.get("container", ""))).strip()
-                    if rack and contenedor:
-                        rack_num = rack
-                        if "rack" in rack.lower():
-                            match = re.search(r'\d+', rack)
-                            if match:
-                                rack_num = match.group()
-                        ubicaciones.append(f"R{rack_num}-{contenedor}")
-                    elif contenedor:
-                        ubicaciones.append(contenedor)
-                
-                # Combinar todas las ubicaciones en una sola celda (separadas por comas)
-                ubicacion_text = ", ".join(ubicaciones) if ubicaciones else ""
-                _safe_set_cell_value(ws, row, ubicacion_col, ubicacion_text)
-                
-                # Aplicar formato de la fila 5 a cada celda
-                for col in range(2, 7):
-                    cell = ws.cell(row=row, column=col)
-                    ref_format = reference_cells[col]
-                    
-                    if ref_format['font']:
-                        cell.font = ref_format['font']
-                    if ref_format['fill']:
-                        # Para la columna TIPO (columna B, índice 2), aplicar color según categoría
-                        if col == 2 and tipo_color:
-                            cell.fill = PatternFill(start_color=tipo_color, end_color=tipo_color, fill_type="solid")
-                        else:
-                            cell.fill = ref_format['fill']
-                    if ref_format['border']:
-                        cell.border = ref_format['border']
-                    if ref_format['alignment']:
-                        cell.alignment = ref_format['alignment']
-                    if ref_format['number_format']:
-                        cell.number_format = ref_format['number_format']
-                
-                # Aplicar formato a la columna UBICACION también
-                if ubicacion_col:
-                    ubicacion_cell = ws.cell(row=row, column=ubicacion_col)
-                    
-                    # Si la columna UBICACION está en el rango de referencia (B-F), usar ese formato
-                    if ubicacion_col in reference_cells:
-                        ref_format = reference_cells[ubicacion_col]
-                        if ref_format['font']:
-                            ubicacion_cell.font = ref_format['font']
-                        if ref_format['fill']:
-                            ubicacion_cell.fill = ref_format['fill']
-                        if ref_format['border']:
-                            ubicacion_cell.border = ref_format['border']
-                        if ref_format['alignment']:
-                            ubicacion_cell.alignment = ref_format['alignment']
-                        if ref_format['number_format']:
-                            ubicacion_cell.number_format = ref_format['number_format']
-                    else:
-                        # Si está fuera del rango, obtener formato de la fila de referencia
-                        if ubicacion_col <= ws.max_column:
-                            ref_cell = ws.cell(row=start_row, column=ubicacion_col)
-                            
-                            if ref_cell.font:
-                                ubicacion_cell.font = ref_cell.font.copy()
-                            if ref_cell.fill:
-                                ubicacion_cell.fill = ref_cell.fill.copy()
-                            if ref_cell.border:
-                                ubicacion_cell.border = ref_cell.border.copy()
-                            if ref_cell.alignment:
-                                ubicacion_cell.alignment = ref_cell.alignment.copy()
-                            if ref_cell.number_format:
-                                ubicacion_cell.number_format = ref_cell.number_format
-        else:
-            # Crear desde cero con formato correcto si no hay plantilla
-            wb = _create_jumpers_excel(items)
+        while submit_next():
+            pass
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                finished[pending.pop(future)] = future.result()
+            # El orden de los miembros no depende de qué parte terminó primero
+            while next_part in finished:
+                file_bytes = finished.pop(next_part)
+                zf.writestr(zip_entry(filenames[next_part], zipfile.ZIP_STORED), file_bytes)
+                logger.info(f"📦 Parte lista: {filenames[next_part]} ({len(file_bytes)} bytes)")
+                next_part += 1
+                yield stream.drain()
+            while submit_next():
+                pass
+        zf.close()
+        yield stream.drain()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+async def _admitted_streaming_response(cost: int, body, media_type: str, filename: str) -> StreamingResponse:
+    """Respuesta en streaming que conserva su lugar en el carril hasta terminar de enviarse"""
+    exit_stack = AsyncExitStack()
+    await exit_stack.enter_async_context(ADMISSION.admit(cost))
+    # El cuerpo se genera fuera del endpoint: el plazo se revisa aquí entre bloques
+    token = current_token()
+
+    async def release_when_done():
+        try:
+            async for chunk in body:
+                if token is not None:
+                    token.check()
+                yield chunk
+        except GenerationCancelled as e:
+            CANCELLATION.count(e.reason)
+            logger.warning(f"🛑 Envío de {filename} cancelado ({e.reason}), se corta la respuesta")
+            # Con los encabezados ya enviados sólo queda cortar la conexión (como cualquier error del envío)
+            raise RuntimeError(f"generation cancelled: {e.reason}") from None
+        except (GeneratorExit, asyncio.CancelledError):
+            # El cliente cerró la conexión antes de recibir todo
+            CANCELLATION.count(REASON_DISCONNECT)
+            raise
+        finally:
+            await exit_stack.aclose()
+
+    # La tarea de fondo cubre el caso en que el cliente se desconecta antes de empezar a leer
+    return StreamingResponse(release_when_done(),
+                             media_type=media_type,
+                             headers={"Content-Disposition": f"attachment; filename=\"{filename}\""},
+                             background=BackgroundTask(exit_stack.aclose))
+
+
+async def _stream_parts_response(cost: int, parts, zip_filename: str,
+                                 strings: str = STRINGS_INLINE) -> StreamingResponse:
+    logger.info(f"🗂️ Exportación dividida en {len(parts)} libros: {zip_filename}")
+    return await _admitted_streaming_response(cost, _stream_workbook_parts(parts, strings, current_token()),
+                                              "application/zip",
+                                              zip_filename)
+
+
+def _get_format(request: Request, payload: Dict[str, Any]) -> str:
+    """Formato de salida: ?format=... o la llave "format" del payload (xlsx por defecto)"""
+    fmt = request.query_params.get("format") or payload.get("format") or FORMAT_XLSX
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(FORMATS)}")
+    return fmt
+
+
+def _get_string_encoding(request: Request, payload: Dict[str, Any]) -> str:
+    """Codificación de cadenas en xlsx: ?strings=... o la llave "strings" (inline por defecto)"""
+    strings = request.query_params.get("strings") or payload.get("strings") or STRINGS_INLINE
+    if strings not in STRING_ENCODINGS:
+        raise HTTPException(status_code=400, detail=f"strings must be one of: {', '.join(STRING_ENCODINGS)}")
+    return strings
+
+
+def _report_rows(report: str, items: List[Dict[str, Any]]):
+    """Filas ya mapeadas, en el mismo orden que el reporte con plantilla (normalizadas por lotes)"""
+    if report == "computo":
+        # El ID consecutivo de los items sin ID depende de la posición en toda la lista ordenada
+        items = sorted(items, key=_computo_id_value)
+        for start in range(0, len(items), NORMALIZE_BATCH):
+            check_cancelled()
+            yield from _computo_rows(items[start:start + NORMALIZE_BATCH], start)
+        return
+    columns = COLUMN_MAPS[report]
+    for start in range(0, len(items), NORMALIZE_BATCH):
+        check_cancelled()
+        yield from table_rows(columns, items[start:start + NORMALIZE_BATCH])
+
+
+def _blocking_batches(batches) -> Iterator[List[Dict[str, Any]]]:
+    """Lotes de un iterador asíncrono consumidos desde el hilo del escritor (cada lote se pide al event loop)"""
+    while True:
+        try:
+            batch = anyio.from_thread.run(batches.__anext__)
+        except StopAsyncIteration:
+            return
+        yield batch
 
-        file_bytes = _save_workbook_to_bytes(wb)
-        if not file_bytes:
-            raise RuntimeError("Generated file is empty")
 
-        global LAST_GENERATED_FILE_CONTENT, LAST_GENERATED_FILENAME
-        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        filename = f"inventario_jumpers_{timestamp}.xlsx"
-        LAST_GENERATED_FILE_CONTENT = file_bytes
-        LAST_GENERATED_FILENAME = filename
+def _source_rows(report: str, batches: Iterator[List[Dict[str, Any]]]):
+    """Filas mapeadas lote por lote; la consulta ya viene en el orden del reporte"""
+    columns = COLUMN_MAPS[report]
+    offset = 0
+    for batch in batches:
+        yield from _computo_rows(batch, offset) if report == "computo" else table_rows(columns, batch)
+        offset += len(batch)
 
-        logger.info(f"📦 Tamaño del archivo generado: {len(file_bytes)} bytes")
 
-        return Response(content=file_bytes,
-                        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                        headers={"Content-Disposition": f"attachment; filename=\"{filename}\""})
+async def _stream_source_report(request: Request, spec: ReportSpec, payload: Dict[str, Any]) -> Optional[Response]:
+    """CSV o xlsx sin estilo escrito conforme llegan los lotes del cursor de Postgres (None si no aplica)"""
+    query = _get_query_spec(payload)
+    if query is None or payload.get("snapshot") is not None or _get_consolidate(spec.name, payload):
+        return None
+    fmt = _get_format(request, payload)
+    if fmt == FORMAT_XLSX:
+        # La plantilla necesita todas las filas para ordenar, dividir y combinar grupos
+        return None
+    strings = _get_string_encoding(request, payload)
 
-    except Exception as e:
-        logger.exception("Error generating jumpers excel")
-        raise HTTPException(status_code=500, detail=str(e))
+    batches = DB_SOURCE.iter_batches(spec.name, query)
+    first = await _fetch_source(anext, batches, None)
+    if first is None:
+        raise HTTPException(status_code=404, detail="source query returned no rows")
 
+    async def chained():
+        yield first
+        async for batch in batches:
+            yield batch
 
-@app.post("/api/generate-computo-excel")
-async def generate_computo_excel(request: Request):
-    payload = await request.json()
-    items: List[Dict[str, Any]] = payload.get("items") or []
-    if not isinstance(items, list) or len(items) == 0:
-        raise HTTPException(status_code=400, detail="items must be a non-empty list")
+    stream = chained()
+    rows = _source_rows(spec.name, _blocking_batches(stream))
+    body, media_type, extension = _fast_format_body(fmt, [(spec.name, report_headers(spec.name), rows)],
+                                                    strings=strings)
 
+    async def body_then_close():
+        # La conexión se devuelve al pool aunque el cliente corte la descarga
+        try:
+            async for chunk in iterate_in_threadpool(body):
+                yield chunk
+        finally:
+            await stream.aclose()
+            await batches.aclose()
+
+    filename = f"{spec.filename_prefix}_{_timestamp()}.{extension}"
+    logger.info(f"🗄️ {spec.name} en formato {fmt} desde la base de datos, por lotes: {filename}")
+    # Sin contar las filas antes de escribir: el costo usa el máximo que puede devolver la consulta
+    cost = estimate_cost(min(query.limit or DB_SOURCE.max_rows, DB_SOURCE.max_rows), spec.columns)
     try:
-        # Usar plantilla si existe
-        if _ensure_template(TEMPLATE_PATH_COMPUTO):
-            logger.info(f"📄 Usando plantilla: {TEMPLATE_PATH_COMPUTO}")
-            wb = openpyxl.load_workbook(TEMPLATE_PATH_COMPUTO)
-            ws = wb.active
-            
-            # La inserción empieza en la fila 5 (celda A5)
-            start_row = 5
-            
-            # Buscar la primera fila vacía desde la fila 5
-            while ws.cell(row=start_row, column=1).value is not None:
-                start_row += 1
-            
-            logger.info(f"📝 Escribiendo {len(items)} equipos desde la fila {start_row} (celda A{start_row})")
-            
-            # Obtener el formato de la fila 5 (fila de referencia)
-            # La plantilla tiene 40 columnas según los encabezados
-            reference_row = 5
-            reference_cells = {}
-            for col in range(1, 41):  # Columnas A-AN (40 columnas)
-                ref_cell = ws.cell(row=reference_row, column=col)
-                reference_cells[col] = {
-                    'font': ref_cell.font.copy() if ref_cell.font else None,
-                    'fill': ref_cell.fill.copy() if ref_cell.fill else None,
-                    'border': ref_cell.border.copy() if ref_cell.border else None,
-                    'alignment': ref_cell.alignment.copy() if ref_cell.alignment else None,
-                    'number_format': ref_cell.number_format,
-                }
-            
-            # Ordenar items por ID de menor a mayor
-            def get_id_value(item):
-                id_val = item.get("id")
-                if id_val is None:
-                    return 0
-                try:
-                    if isinstance(id_val, int):
-                        return id_val
-                    if isinstance(id_val, str):
-                        return int(id_val) if id_val.isdigit() else 0
-                    return int(id_val)
-                except (ValueError, TypeError):
-                    return 0
-            
-            sorted_items = sorted(items, key=get_id_value)
-            
-            # Escribir cada equipo/accesorio en una fila usando función segura y copiando formato
-            for idx, item in enumerate(sorted_items, start=0):
-                row = start_row + idx
-                
-                # Mapear campos según la plantilla (40 columnas)
-                # Col A (1): ID
-                _safe_set_cell_value(ws, row, 1, item.get("id", idx + 1))
-                # Col B (2): INVENTARIO
-                _safe_set_cell_value(ws, row, 2, item.get("inventario", ""))
-                # Col C (3): EQUIPO PM
-                _safe_set_cell_value(ws, row, 3, item.get("equipo_pm", ""))
-                # Col D (4): FECHA REGISTRO
-                _safe_set_cell_value(ws, row, 4, item.get("fecha_registro", ""))
-                # Col E (5): TIPO DE EQUIPO
-                _safe_set_cell_value(ws, row, 5, item.get("tipo_equipo", ""))
-                # Col F (6): MARCA
-                _safe_set_cell_value(ws, row, 6, item.get("marca", ""))
-                # Col G (7): MODELO
-                _safe_set_cell_value(ws, row, 7, item.get("modelo", ""))
-                # Col H (8): PROCESADOR
-                _safe_set_cell_value(ws, row, 8, item.get("procesador", ""))
-                # Col I (9): NUMERO DE SERIE
-                _safe_set_cell_value(ws, row, 9, item.get("numero_serie", ""))
-                # Col J (10): DISCO DURO
-                _safe_set_cell_value(ws, row, 10, item.get("disco_duro", ""))
-                # Col K (11): MEMORIA
-                _safe_set_cell_value(ws, row, 11, item.get("memoria", ""))
-                # Col L (12): SISTEMA OPERATIVO INSTALADO
-                _safe_set_cell_value(ws, row, 12, item.get("sistema_operativo_instalado", item.get("sistema_operativo", "")))
-                # Col M (13): ETIQUETA DE SISTEMA OPERATIVO
-                _safe_set_cell_value(ws, row, 13, item.get("etiqueta_sistema_operativo", ""))
-                # Col N (14): OFFICE INSTALADO
-                _safe_set_cell_value(ws, row, 14, item.get("office_instalado", ""))
-                # Col O (15): DIRECCIÓN FISICA DEL EQUIPO
-                _safe_set_cell_value(ws, row, 15, item.get("direccion_fisica", item.get("ubicacion_fisica", "")))
-                # Col P (16): ESTADO
-                _safe_set_cell_value(ws, row, 16, item.get("estado", ""))
-                # Col Q (17): CIUDAD
-                _safe_set_cell_value(ws, row, 17, item.get("ciudad", ""))
-                # Col R (18): TIPO DE EDIFICIO
-                _safe_set_cell_value(ws, row, 18, item.get("tipo_edificio", ""))
-                # Col S (19): NOMBRE DEL EDIFICIO
-                _safe_set_cell_value(ws, row, 19, item.get("nombre_edificio", ""))
-                # Col T (20): TIPO DE USO
-                _safe_set_cell_value(ws, row, 20, item.get("tipo_uso", ""))
-                # Col U (21): NOMBRE DEL EQUIPO EN DOMINIO
-                _safe_set_cell_value(ws, row, 21, item.get("nombre_equipo_dominio", ""))
-                # Col V (22): STATUS
-                _safe_set_cell_value(ws, row, 22, item.get("status", ""))
-                # Col W (23): DIRECCIÓN ADMINISTRATIVA
-                _safe_set_cell_value(ws, row, 23, item.get("direccion_administrativa", ""))
-                # Col X (24): SUBDIRECCIÓN
-                _safe_set_cell_value(ws, row, 24, item.get("subdireccion", ""))
-                # Col Y (25): GERENCIA
-                _safe_set_cell_value(ws, row, 25, item.get("gerencia", ""))
-                # Col Z (26): EXPEDIENTE (Usuario Responsable) - INTERCAMBIO: La plantilla tiene Responsable primero
-                _safe_set_cell_value(ws, row, 26, item.get("expediente_responsable", ""))
-                # Col AA (27): NOMBRE COMPLETO (Usuario Responsable)
-                _safe_set_cell_value(ws, row, 27, item.get("nombre_completo_responsable", ""))
-                # Col AB (28): APELLIDO PATERNO (Usuario Responsable) - CORREGIDO: Orden correcto según plantilla
-                _safe_set_cell_value(ws, row, 28, item.get("apellido_paterno_responsable", ""))
-                # Col AC (29): APELLIDO MATERNO (Usuario Responsable) - CORREGIDO: Orden correcto según plantilla
-                _safe_set_cell_value(ws, row, 29, item.get("apellido_materno_responsable", ""))
-                # Col AD (30): NOMBRE (Usuario Responsable) - CORREGIDO: Orden correcto según plantilla
-                _safe_set_cell_value(ws, row, 30, item.get("nombre_responsable", ""))
-                # Col AE (31): EMPRESA (Usuario Responsable)
-                _safe_set_cell_value(ws, row, 31, item.get("empresa_responsable", ""))
-                # Col AF (32): PUESTO (Usuario Responsable)
-                _safe_set_cell_value(ws, row, 32, item.get("puesto_responsable", ""))
-                # Col AG (33): EXPEDIENTE (Usuario Final) - INTERCAMBIO: La plantilla tiene Final después
-                _safe_set_cell_value(ws, row, 33, item.get("expediente_final", ""))
-                # Col AH (34): NOMBRE COMPLETO (Usuario Final)
-                _safe_set_cell_value(ws, row, 34, item.get("nombre_completo_final", ""))
-                # Col AI (35): APELLIDO PATERNO (Usuario Final)
-                # Según plantilla: EXPEDIENTE | NOMBRE COMPLETO | APELLIDO PATERNO | APELLIDO MATERNO | NOMBRE | EMPRESA | PUESTO
-                # CORREGIDO: Los datos estaban rotados. Según la imagen:
-                # - Col AI tiene apellidos paternos (correcto)
-                # - Col AJ tiene nombres (debería tener apellidos maternos)
-                # - Col AK tiene apellidos paternos (debería tener nombres)
-                # Esto significa que el código estaba rotado. Ahora corregido:
-                _safe_set_cell_value(ws, row, 35, item.get("apellido_paterno_final", ""))
-                # Col AJ (36): APELLIDO MATERNO (Usuario Final)
-                _safe_set_cell_value(ws, row, 36, item.get("apellido_materno_final", ""))
-                # Col AK (37): NOMBRE (Usuario Final)
-                _safe_set_cell_value(ws, row, 37, item.get("nombre_final", ""))
-                # Col AL (38): EMPRESA (Usuario Final)
-                _safe_set_cell_value(ws, row, 38, item.get("empresa_final", ""))
-                # Col AM (39): PUESTO (Usuario Final)
-                _safe_set_cell_value(ws, row, 39, item.get("puesto_final", ""))
-                # Col AN (40): OBSERVACIONES
-                _safe_set_cell_value(ws, row, 40, item.get("observaciones", ""))
-                
-                # Aplicar formato de la fila 5 a cada celda
-                for col in range(1, 41):
-                    cell = ws.cell(row=row, column=col)
-                    ref_format = reference_cells[col]
-                    
-                    if ref_format['font']:
-                        cell.font = ref_format['font']
-                    if ref_format['fill']:
-                        cell.fill = ref_format['fill']
-                    if ref_format['border']:
-                        cell.border = ref_format['border']
-                    if ref_format['alignment']:
-                        cell.alignment = ref_format['alignment']
-                    if ref_format['number_format']:
-                        cell.number_format = ref_format['number_format']
-            
-            # Detectar grupos de filas con el mismo ID y EQUIPO PM para combinar celdas
-            # Columna A (ID) y Columna C (EQUIPO PM)
-            # Agrupar por (ID, EQUIPO_PM) como tupla
-            groups = {}
-            for idx, item in enumerate(sorted_items, start=0):
-                row = start_row + idx
-                item_id = item.get("id")
-                item_equipo_pm = item.get("equipo_pm", "")
-                group_key = (item_id, item_equipo_pm)
-                
-                if group_key not in groups:
-                    groups[group_key] = {'start_row': row, 'end_row': row}
-                else:
-                    groups[group_key]['end_row'] = row
-            
-            # Combinar celdas para cada grupo
-            for group_key, group_info in groups.items():
-                start_row_group = group_info['start_row']
-                end_row_group = group_info['end_row']
-                
-                # Solo combinar si hay más de una fila en el grupo
-                if end_row_group > start_row_group:
-                    # Combinar celdas de ID (columna A) para este grupo
-                    try:
-                        ws.merge_cells(start_row=start_row_group, start_column=1, end_row=end_row_group, end_column=1)
-                        # Centrar el texto en la celda combinada
-                        merged_cell = ws.cell(row=start_row_group, column=1)
-                        merged_cell.alignment = Alignment(horizontal='center', vertical='center')
-                        logger.info(f"✅ Celdas de ID combinadas: filas {start_row_group}-{end_row_group} (ID: {group_key[0]})")
-                    except Exception as e:
-                        logger.warning(f"⚠️ Error al combinar celdas de ID (filas {start_row_group}-{end_row_group}): {e}")
-                    
-                    # Combinar celdas de EQUIPO PM (columna C) para este grupo
-                    try:
-                        ws.merge_cells(start_row=start_row_group, start_column=3, end_row=end_row_group, end_column=3)
-                        # Centrar el texto en la celda combinada
-                        merged_cell = ws.cell(row=start_row_group, column=3)
-                        merged_cell.alignment = Alignment(horizontal='center', vertical='center')
-                        logger.info(f"✅ Celdas de EQUIPO PM combinadas: filas {start_row_group}-{end_row_group} (EQUIPO PM: {group_key[1]})")
-                    except Exception as e:
-                        logger.warning(f"⚠️ Error al combinar celdas de EQUIPO PM (filas {start_row_group}-{end_row_group}): {e}")
+        return await _admitted_streaming_response(cost, body_then_close(), media_type, filename)
+    except BaseException:
+        await batches.aclose()
+        raise
+
+
+def _fast_format_body(fmt: str, sheets: List[Sheet], leading_header: Optional[str] = None,
+                      strings: str = STRINGS_INLINE):
+    """(bloques de bytes, media type, extensión) de un formato rápido"""
+    if fmt == FORMAT_CSV:
+        # CSV es una sola tabla: con varias hojas se antepone una columna que indica la hoja
+        if leading_header:
+            header = [leading_header] + list(sheets[0][1])
+            rows = ([title] + list(row) for title, _, sheet_rows in sheets for row in sheet_rows)
         else:
-            # Crear desde cero con formato correcto
-            wb = _create_computo_excel(items)
+            _, header, rows = sheets[0]
+        return iter_csv(header, rows), CSV_MEDIA_TYPE, "csv"
+    return iter_raw_xlsx(sheets, strings), XLSX_MEDIA_TYPE, "xlsx"
 
-        file_bytes = _save_workbook_to_bytes(wb)
-        if not file_bytes:
-            raise RuntimeError("Generated file is empty")
 
-        global LAST_GENERATED_FILE_CONTENT, LAST_GENERATED_FILENAME
-        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        filename = f"inventario_computo_{timestamp}.xlsx"
-        LAST_GENERATED_FILE_CONTENT = file_bytes
-        LAST_GENERATED_FILENAME = filename
+async def _fast_format_response(fmt: str, cost: int, sheets: List[Sheet], filename_base: str,
+                               leading_header: Optional[str] = None,
+                               strings: str = STRINGS_INLINE) -> StreamingResponse:
+    """CSV o xlsx sin estilo, generado en streaming sin cargar la plantilla"""
+    body, media_type, extension = _fast_format_body(fmt, sheets, leading_header, strings)
+    logger.info(f"⚡ Exportación en formato {fmt}: {filename_base}.{extension}")
+    return await _admitted_streaming_response(cost, iterate_in_threadpool(body), media_type,
+                                              f"{filename_base}.{extension}")
 
-        logger.info(f"📦 Tamaño del archivo generado: {len(file_bytes)} bytes")
 
-        return Response(content=file_bytes,
-                        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                        headers={"Content-Disposition": f"attachment; filename=\"{filename}\""})
+def _get_snapshot_request(payload: Dict[str, Any]) -> Optional[SnapshotRequest]:
+    """Llave "snapshot" del payload (None si no se pide guardar ni comparar)"""
+    if payload.get("snapshot") is None:
+        return None
+    if not SNAPSHOTS.enabled:
+        raise HTTPException(status_code=503, detail="snapshots are disabled (EXCEL_SNAPSHOT_DB is empty)")
+    try:
+        return SnapshotRequest.from_payload(payload["snapshot"])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    except Exception as e:
-        logger.exception("Error generating computo excel")
-        raise HTTPException(status_code=500, detail=str(e))
 
+def _fingerprint_report(report: str, items: List[Dict[str, Any]], key):
+    """Filas del reporte en el orden de exportación y la (llave, hash) de cada una"""
+    key = tuple(key) or DEFAULT_KEYS[report]
+    positions = key_fields(report, key)
+    rows = list(_report_rows(report, items))
+    return rows, list(fingerprint_rows(rows, positions)), key
 
-@app.post("/api/generate-sdr-excel")
-async def generate_sdr_excel(request: Request):
-    payload = await request.json()
-    items: List[Dict[str, Any]] = payload.get("items") or []
-    if not isinstance(items, list) or len(items) == 0:
-        raise HTTPException(status_code=400, detail="items must be a non-empty list")
 
+async def _delta_response(spec: ReportSpec, snapshot: SnapshotRequest, rows, fingerprints, key,
+                          fmt: str, strings: str) -> Response:
+    """Sólo las filas nuevas y modificadas desde el snapshot ``since``, con su marcador de cambio"""
     try:
-        # Intentar usar plantilla si existe, sino crear desde cero
-        if _ensure_template(TEMPLATE_PATH_SDR):
-            wb = openpyxl.load_workbook(TEMPLATE_PATH_SDR)
-            ws = wb.active
-            
-            # Tomar el primer item (ya que es un formulario único, no una lista de items)
-            item = items[0] if items else {}
-            
-            # Mapear campos a las filas correspondientes de la plantilla
-            # Las columnas B y C están combinadas, así que escribimos en B
-            # Datos de Falla de aviso
-            ws.cell(row=9, column=2, value=item.get("fecha", item.get("date", "")))  # Fecha
-            ws.cell(row=10, column=2, value=item.get("descripcion_aviso", item.get("descripcion_del_aviso", "")))  # Descripción del Aviso
-            ws.cell(row=11, column=2, value=item.get("grupo_planificador", ""))  # Grupo planificador
-            ws.cell(row=12, column=2, value=item.get("puesto_trabajo_responsable", ""))  # Puesto de trabajo responsable
-            ws.cell(row=13, column=2, value=item.get("autor_aviso", ""))  # Autor de aviso
-            ws.cell(row=14, column=2, value=item.get("motivo_intervencion", ""))  # Motivo de intervención
-            ws.cell(row=15, column=2, value=item.get("modelo_dano", item.get("modelo_del_dano", "")))  # Modelo del Daño
-            ws.cell(row=16, column=2, value=item.get("causa_averia", ""))  # Causa de la avería
-            ws.cell(row=17, column=2, value=item.get("repercusion_funcionamiento", ""))  # Repercusión en el funcionamiento
-            ws.cell(row=18, column=2, value=item.get("estado_instalacion", ""))  # Estado de la Instalación
-            ws.cell(row=19, column=2, value=item.get("motivo_intervencion_afectacion", ""))  # Motivo de Intervención (AFECTACION)
-            ws.cell(row=21, column=2, value=item.get("atencion_dano", ""))  # Atención del Daño
-            ws.cell(row=22, column=2, value=item.get("prioridad", ""))  # Prioridad
-            
-            # Lugar del Daño
-            ws.cell(row=25, column=2, value=item.get("centro_emplazamiento", ""))  # Centro Emplazamiento
-            ws.cell(row=26, column=2, value=item.get("area_empresa", ""))  # Área de empresa
-            ws.cell(row=27, column=2, value=item.get("puesto_trabajo_emplazamiento", ""))  # Puesto trabajo de emplazamiento
-            ws.cell(row=28, column=2, value=item.get("division", ""))  # División
-            ws.cell(row=29, column=2, value=item.get("estado_instalacion_lugar", ""))  # Estado de Instalación
-            ws.cell(row=30, column=2, value=item.get("datos_disponibles", ""))  # Datos disponibles
-            ws.cell(row=32, column=2, value=item.get("emplazamiento_1", item.get("emplazamiento", "")))  # Emplazamiento (primera ocurrencia)
-            ws.cell(row=33, column=2, value=item.get("emplazamiento_2", item.get("emplazamiento", "")))  # Emplazamiento (segunda ocurrencia)
-            ws.cell(row=34, column=2, value=item.get("local", ""))  # Local
-            ws.cell(row=35, column=2, value=item.get("campo_clasificacion", ""))  # Campo de clasificación
-            
-            # Datos de la unidad Dañada
-            ws.cell(row=38, column=2, value=item.get("tipo_unidad_danada", ""))  # Tipo
-            ws.cell(row=39, column=2, value=item.get("no_serie_unidad_danada", ""))  # No de serie
-            
-            # Datos de la unidad que se montó
-            ws.cell(row=42, column=2, value=item.get("tipo_unidad_montada", ""))  # Tipo
-            ws.cell(row=43, column=2, value=item.get("no_serie_unidad_montada", ""))  # No de serie
-            
-        else:
-            # Crear desde cero con formato correcto
-            wb = _create_sdr_excel(items)
+        since, previous = await run_in_threadpool(SNAPSHOTS.load, spec.name, snapshot.inventory, snapshot.since,
+                                                  ",".join(key))
+    except SnapshotNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    delta = compute_delta(since, rows, fingerprints, previous)
+    logger.info(f"🧮 Cambios de {spec.name}/{snapshot.inventory} desde {since}: {delta.summary()}")
+
+    header = report_headers(spec.name)
+    cost = estimate_cost(len(delta.added) + len(delta.modified), spec.columns)
+    filename_base = f"{spec.filename_prefix}_cambios_{_timestamp()}"
+    if fmt != FORMAT_XLSX:
+        sheets = [("NUEVO", header, delta.added), ("MODIFICADO", header, delta.modified)]
+        response = await _fast_format_response(fmt, cost, sheets, filename_base, leading_header="CAMBIO",
+                                               strings=strings)
+    else:
+        key_headers = [header[i] for i in key_fields(spec.name, key)]
+        async with ADMISSION.admit(cost):
+            file_bytes = await run_in_threadpool(render_delta_workbook, header, key_headers, delta.added,
+                                                 delta.modified, delta.removed_keys)
+        response = _excel_response(file_bytes, f"{filename_base}.xlsx")
+    response.headers["X-Snapshot-Since"] = since
+    return response
+
+
+async def _generate_list_report(request: Request, spec: ReportSpec, payload: Dict[str, Any],
+                                items: List[Dict[str, Any]]) -> Response:
+    fmt = _get_format(request, payload)
+    strings = _get_string_encoding(request, payload)
+    snapshot = _get_snapshot_request(payload)
+    if snapshot is None:
+        return await _export_list_report(request, spec, payload, items, fmt, strings)
 
-        file_bytes = _save_workbook_to_bytes(wb)
-        if not file_bytes:
-            raise RuntimeError("Generated file is empty")
+    try:
+        rows, fingerprints, key = await run_in_threadpool(_fingerprint_report, spec.name, items, snapshot.key)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if snapshot.since is not None:
+        response = await _delta_response(spec, snapshot, rows, fingerprints, key, fmt, strings)
+    else:
+        response = await _export_list_report(request, spec, payload, items, fmt, strings)
+    if snapshot.save:
+        snapshot_id = await run_in_threadpool(SNAPSHOTS.save, spec.name, snapshot.inventory, ",".join(key),
+                                              fingerprints)
+        response.headers["X-Snapshot-Id"] = snapshot_id
+        logger.info(f"📸 Snapshot {snapshot_id} de {spec.name}/{snapshot.inventory}: {len(fingerprints)} filas")
+    return response
+
+
+def _plan_list_report(spec: ReportSpec, payload: Dict[str, Any], items: List[Dict[str, Any]]) -> SplitPlan:
+    """Cómo se divide la exportación xlsx de un reporte de lista (llave "split" del payload)"""
+    plan = _get_split_policy(payload, spec.first_data_row).plan(items, sort_key=spec.sort_key)
+    # Sin plantilla no hay encabezado que repetir en hojas nuevas: entregar varios libros
+    if plan.mode == MODE_SHEETS and not _ensure_template(spec.template_path):
+        plan.mode = MODE_WORKBOOKS
+    return plan
+
+
+def _list_report_parts(spec: ReportSpec, plan: SplitPlan, datestamp: str) -> List[tuple]:
+    """(nombre, builder, items) de cada libro de una exportación dividida en varios archivos"""
+    return [(f"{spec.filename_prefix}_{datestamp}_parte_{part:02d}.xlsx", spec.build_workbook, chunk)
+            for part, chunk in enumerate(plan.chunks, start=1)]
+
+
+def _file_cache_key(report: str, template_path: str, *parts: Any, items) -> str:
+    """Llave del archivo terminado: plantilla, fecha (va en los encabezados), versión de openpyxl,
+    parámetros y contenido de los items"""
+    version = template_version(template_path) if os.path.exists(template_path) else "sin-plantilla"
+    return items_key(f"{report}-file", version, datetime.now().strftime("%Y-%m-%d"), openpyxl.__version__,
+                     *parts, items=items)
+
+
+def _list_report_file_key(spec: ReportSpec, plan: SplitPlan, items: List[Dict[str, Any]], strings: str) -> str:
+    return _file_cache_key(spec.name, spec.template_path, strings, plan.mode, [len(chunk) for chunk in plan.chunks],
+                           items=items)
+
+
+def _cached_excel_response(file_bytes: bytes, origin: str, filename: str) -> Response:
+    response = _excel_response(file_bytes, filename)
+    response.headers["X-File-Cache"] = origin
+    return response
+
+
+def _render_list_report(strings: str, spec: ReportSpec, plan: SplitPlan) -> bytes:
+    """Libro único (una hoja o una hoja por parte) de un reporte de lista"""
+    if plan.mode == MODE_SHEETS:
+        return _render_encoded_workbook(strings, _build_split_workbook, spec.name, plan.chunks)
+    return _render_encoded_workbook(strings, spec.build_workbook, plan.chunks[0])
+
+
+async def _export_list_report(request: Request, spec: ReportSpec, payload: Dict[str, Any],
+                              items: List[Dict[str, Any]], fmt: str, strings: str) -> Response:
+    cost = estimate_cost(len(items), spec.columns)
+    if fmt != FORMAT_XLSX:
+        sheets = [(spec.name, report_headers(spec.name), _report_rows(spec.name, items))]
+        return await _fast_format_response(fmt, cost, sheets, f"{spec.filename_prefix}_{_timestamp()}",
+                                           strings=strings)
+
+    plan = _plan_list_report(spec, payload, items)
+    if plan.mode == MODE_WORKBOOKS:
+        return await _stream_parts_response(cost, _list_report_parts(spec, plan, _datestamp()),
+                                            f"{spec.filename_prefix}_{_timestamp()}.zip", strings)
+
+    async def generate() -> bytes:
+        # Sólo la solicitud que genera ocupa lugar en el carril; las idénticas esperan el archivo
+        async with ADMISSION.admit(cost):
+            try:
+                return await run_in_threadpool(_render_list_report, strings, spec, plan)
+            except Exception as e:
+                logger.exception(f"Error generating {spec.name} excel")
+                raise HTTPException(status_code=500, detail=str(e))
 
-        global LAST_GENERATED_FILE_CONTENT, LAST_GENERATED_FILENAME
-        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        filename = f"solicitud_sdr_{timestamp}.xlsx"
-        LAST_GENERATED_FILE_CONTENT = file_bytes
-        LAST_GENERATED_FILENAME = filename
+    key = await run_in_threadpool(_list_report_file_key, spec, plan, items, strings) if FILE_CACHE.enabled else None
+    file_bytes, origin = await FILE_CACHE.get_or_generate(key, generate)
+    if origin != CACHE_MISS:
+        logger.info(f"♻️ {spec.name}: archivo tomado de caché ({origin})")
+    return _cached_excel_response(file_bytes, origin, f"{spec.filename_prefix}_{_timestamp()}.xlsx")
 
-        logger.info(f"📦 Tamaño del archivo generado: {len(file_bytes)} bytes")
 
-        return Response(content=file_bytes,
-                        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                        headers={"Content-Disposition": f"attachment; filename=\"{filename}\""})
+@app.post("/api/generate-jumpers-excel")
+@_payload_precheck
+@_cancellable
+async def generate_jumpers_excel(request: Request):
+    payload = await request.json()
+    streamed = await _stream_source_report(request, REPORTS["jumpers"], payload)
+    if streamed is not None:
+        return streamed
+    items = await _resolve_items("jumpers", payload)
+    return await _generate_list_report(request, REPORTS["jumpers"], payload, items)
 
-    except Exception as e:
-        logger.exception("Error generating SDR excel")
-        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/generate-computo-excel")
+@_payload_precheck
+@_cancellable
+async def generate_computo_excel(request: Request):
+    payload = await request.json()
+    streamed = await _stream_source_report(request, REPORTS["computo"], payload)
+    if streamed is not None:
+        return streamed
+    items = await _resolve_items("computo", payload)
+    return await _generate_list_report(request, REPORTS["computo"], payload, items)
+
+
+def _sdr_fast_sheets(items: List[Dict[str, Any]]) -> List[Sheet]:
+    # En los formatos rápidos cada item es una fila con los campos del formulario
+    return [("sdr", report_headers("sdr"), _report_rows("sdr", items))]
+
+
+def _render_sdr(items: List[Dict[str, Any]]) -> bytes:
+    """Formulario SDR del primer item"""
+    form = FORM_FILLER.get(TEMPLATE_PATH_SDR, SDR_FORM_CELLS)
+    if form is not None:
+        # Plantilla compilada: se escriben sólo las celdas del mapa, sin cargar openpyxl
+        return FORM_FILLER.render(form, items[0] if items else {})
+    return _render_workbook(_build_sdr_workbook, items)
+
+
+@app.post("/api/generate-sdr-excel")
+@_payload_precheck
+@_cancellable
+async def generate_sdr_excel(request: Request):
+    payload = await request.json()
+    items = _get_items(payload)
+
+    fmt = _get_format(request, payload)
+    if fmt != FORMAT_XLSX:
+        return await _fast_format_response(fmt, estimate_cost(len(items), SDR_CELLS), _sdr_fast_sheets(items),
+                                           f"solicitud_sdr_{_timestamp()}")
+
+    # Formulario único: el costo es fijo (~30 celdas) sin importar cuántos items lleguen
+    async with ADMISSION.admit(estimate_cost(1, SDR_CELLS)):
+        try:
+            if FORM_FILLER.get(TEMPLATE_PATH_SDR, SDR_FORM_CELLS) is not None:
+                file_bytes = _render_sdr(items)
+            else:
+                file_bytes = await run_in_threadpool(_render_sdr, items)
+            return _excel_response(file_bytes, f"solicitud_sdr_{_timestamp()}.xlsx")
+        except Exception as e:
+            logger.exception("Error generating SDR excel")
+            raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/api/generate-sicor-excel")
+@_payload_precheck
+@_cancellable
 async def generate_sicor_excel(request: Request):
     payload = await request.json()
-    items: List[Dict[str, Any]] = payload.get("items") or []
-    if not isinstance(items, list) or len(items) == 0:
-        raise HTTPException(status_code=400, detail="items must be a non-empty list")
+    streamed = await _stream_source_report(request, REPORTS["sicor"], payload)
+    if streamed is not None:
+        return streamed
+    items = await _resolve_items("sicor", payload)
+    return await _generate_list_report(request, REPORTS["sicor"], payload, items)
 
-    try:
-        # Usar plantilla si existe
-        if _ensure_template(TEMPLATE_PATH_SICOR):
-            logger.info(f"📄 Usando plantilla: {TEMPLATE_PATH_SICOR}")
-            wb = openpyxl.load_workbook(TEMPLATE_PATH_SICOR)
-            ws = wb.active
-            
-            # Actualizar la fecha en el encabezado (fila 2, celda C2 que está en merged cell C2:H2)
-            try:
-                header_cell = ws.cell(row=2, column=3)  # Columna C, fila 2
-                header_text = str(header_cell.value) if header_cell.value else ""
-                
-                # Obtener fecha actual en formato DD/MM/YYYY
-                now = datetime.now()
-                fecha_actual = now.strftime("%d/%m/%Y")
-                
-                # Reemplazar la fecha al final del texto (formato DD/MM/YYYY)
-                # Buscar patrón de fecha al final: " - DD/MM/YYYY" o " - DD/MM/YYYY" al final
-                # Mantener todo el texto antes de la fecha
-                pattern = r'\s*-\s*\d{2}/\d{2}/\d{4}\s*$'
-                if re.search(pattern, header_text):
-                    # Reemplazar la fecha al final
-                    nuevo_texto = re.sub(pattern, f' - {fecha_actual}', header_text)
-                else:
-                    # Si no hay fecha al final, agregarla
-                    nuevo_texto = f"{header_text.rstrip()} - {fecha_actual}"
-                
-                # Actualizar la celda con el nuevo texto
-                header_cell.value = nuevo_texto
-                logger.info(f"📅 Fecha actualizada en encabezado: {fecha_actual}")
-            except Exception as e:
-                logger.warning(f"⚠️ No se pudo actualizar la fecha en el encabezado: {e}")
-            
-            # Los datos empiezan en la fila 5, columna B (columna 2)
-            start_row = 5
-            start_col = 2  # Columna B
-            
-            # Buscar la primera fila vacía desde la fila 5
-            while ws.cell(row=start_row, column=start_col).value is not None:
-                start_row += 1
-            
-            logger.info(f"📝 Escribiendo {len(items)} tarjetas desde la fila {start_row}, columna {start_col}")
-            
-            # Obtener el formato de la fila 5 (fila de referencia) si existe
-            reference_row = 5
-            reference_cells = {}
-            for col in range(start_col, start_col + 7):  # 7 columnas: B-H
-                ref_cell = ws.cell(row=reference_row, column=col)
-                reference_cells[col] = {
-                    'font': ref_cell.font.copy() if ref_cell.font else None,
-                    'fill': ref_cell.fill.copy() if ref_cell.fill else None,
-                    'border': ref_cell.border.copy() if ref_cell.border else None,
-                    'alignment': ref_cell.alignment.copy() if ref_cell.alignment else None,
-                    'number_format': ref_cell.number_format,
-                }
-            
-            # Escribir cada tarjeta en una fila usando función segura y copiando formato
-            for idx, item in enumerate(items, start=0):
-                row = start_row + idx
-                en_stock = str(item.get("en_stock", "SI")).upper().strip()
-                is_no_stock = en_stock == "NO"
-                
-                # Mapear campos según la plantilla (empezando en columna B)
-                # Col B (2): EN STOCK -> en_stock
-                _safe_set_cell_value(ws, row, 2, en_stock)
-                # Col C (3): No. -> numero
-                _safe_set_cell_value(ws, row, 3, item.get("numero", ""))
-                # Col D (4): CODIGO -> codigo
-                _safe_set_cell_value(ws, row, 4, item.get("codigo", ""))
-                # Col E (5): SERIE -> serie
-                _safe_set_cell_value(ws, row, 5, item.get("serie", ""))
-                # Col F (6): MARCA -> marca
-                _safe_set_cell_value(ws, row, 6, item.get("marca", ""))
-                # Col G (7): POSICION -> posicion
-                _safe_set_cell_value(ws, row, 7, item.get("posicion", ""))
-                # Col H (8): COMENTARIOS -> comentarios
-                _safe_set_cell_value(ws, row, 8, item.get("comentarios", ""))
-                
-                # Aplicar formato de la fila 5 a cada celda
-                for col in range(start_col, start_col + 7):
-                    cell = ws.cell(row=row, column=col)
-                    ref_format = reference_cells.get(col, {})
-                    
-                    # Si NO está en stock, aplicar fondo rojo a toda la fila
-                    if is_no_stock:
-                        # Fondo rojo para toda la fila
-                        cell.fill = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
-                        
-                        # Texto blanco para columnas B (en_stock) y C (numero)
-                        if col == 2 or col == 3:  # Columnas B y C
-                            ref_font = ref_format.get('font')
-                            cell.font = Font(
-                                color="FFFFFF",  # Blanco
-                                bold=ref_font.bold if ref_font else False,
-                                size=ref_font.size if ref_font else 11
-                            )
-                        else:
-                            # Para otras columnas, mantener el formato original pero con fondo rojo
-                            if ref_format.get('font'):
-                                ref_font = ref_format['font']
-                                font_copy = Font(
-                                    color=ref_font.color if ref_font.color else "000000",
-                                    bold=ref_font.bold if ref_font.bold is not None else False,
-                                    size=ref_font.size if ref_font.size else 11
-                                )
-                                cell.font = font_copy
-                    else:
-                        # Si está en stock, aplicar formato normal
-                        if ref_format.get('font'):
-                            cell.font = ref_format['font']
-                        if ref_format.get('fill'):
-                            cell.fill = ref_format['fill']
-                        
-                        # Columna D (CODIGO) con fondo azul #558ED5 cuando está en stock
-                        if col == 4:  # Columna D (CODIGO)
-                            cell.fill = PatternFill(start_color="558ED5", end_color="558ED5", fill_type="solid")
-                    
-                    # Aplicar otros formatos (border, alignment, number_format) siempre
-                    if ref_format.get('border'):
-                        cell.border = ref_format['border']
-                    if ref_format.get('alignment'):
-                        cell.alignment = ref_format['alignment']
-                    if ref_format.get('number_format'):
-                        cell.number_format = ref_format['number_format']
-        else:
-            # Si no hay plantilla, crear estructura básica
-            logger.warning("No se encontró plantilla SICOR, creando estructura básica")
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Inventario SICOR"
-            
-            # Título
-            title_cell = ws.cell(row=1, column=2, value=f'INVENTARIO SICOR {_get_month_year()}')
-            title_cell.font = Font(bold=True, size=14)
-            title_cell.alignment = Alignment(horizontal='center', vertical='center')
-            
-            # Encabezados (fila 4)
-            headers = ['EN STOCK', 'No.', 'CODIGO', 'SERIE', 'MARCA', 'POSICION', 'COMENTARIOS']
-            for idx, header in enumerate(headers, start=2):
-                cell = ws.cell(row=4, column=idx, value=header)
-                _apply_cell_style(cell, bold=True, center=True)
-            
-            # Datos (fila 5 en adelante)
-            for idx, item in enumerate(items, start=0):
-                row = 5 + idx
-                en_stock = str(item.get("en_stock", "SI")).upper().strip()
-                is_no_stock = en_stock == "NO"
-                
-                ws.cell(row=row, column=2, value=en_stock)
-                ws.cell(row=row, column=3, value=item.get("numero", ""))
-                ws.cell(row=row, column=4, value=item.get("codigo", ""))
-                ws.cell(row=row, column=5, value=item.get("serie", ""))
-                ws.cell(row=row, column=6, value=item.get("marca", ""))
-                ws.cell(row=row, column=7, value=item.get("posicion", ""))
-                ws.cell(row=row, column=8, value=item.get("comentarios", ""))
-                
-                # Aplicar estilo
-                for col in range(2, 9):
-                    cell = ws.cell(row=row, column=col)
-                    
-                    # Si NO está en stock, aplicar fondo rojo a toda la fila
-                    if is_no_stock:
-                        # Fondo rojo para toda la fila
-                        cell.fill = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
-                        
-                        # Texto blanco para columnas B (en_stock) y C (numero)
-                        if col == 2 or col == 3:  # Columnas B y C
-                            cell.font = Font(color="FFFFFF", bold=False, size=11)
-                        else:
-                            # Para otras columnas, mantener texto normal pero con fondo rojo
-                            cell.font = Font(color="000000", bold=False, size=11)
-                    else:
-                        # Si está en stock, aplicar estilo normal
-                        _apply_cell_style(cell, bold=False, center=True)
-                        
-                        # Columna D (CODIGO) con fondo azul #558ED5 cuando está en stock
-                        if col == 4:  # Columna D (CODIGO)
-                            cell.fill = PatternFill(start_color="558ED5", end_color="558ED5", fill_type="solid")
-
-        file_bytes = _save_workbook_to_bytes(wb)
-        if not file_bytes:
-            raise RuntimeError("Generated file is empty")
-
-        global LAST_GENERATED_FILE_CONTENT, LAST_GENERATED_FILENAME
-        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        filename = f"inventario_sicor_{timestamp}.xlsx"
-        LAST_GENERATED_FILE_CONTENT = file_bytes
-        LAST_GENERATED_FILENAME = filename
-
-        logger.info(f"📦 Tamaño del archivo generado: {len(file_bytes)} bytes")
-
-        return Response(content=file_bytes,
-                        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                        headers={"Content-Disposition": f"attachment; filename=\"{filename}\""})
 
-    except Exception as e:
-        logger.exception("Error generating SICOR excel")
-        raise HTTPException(status_code=500, detail=str(e))
+def _bitacora_fast_sheets(years_data: List[Dict[str, Any]]) -> List[Sheet]:
+    # Una hoja por año (en CSV, una columna AÑO al inicio)
+    return [(str(yd.get("year")), report_headers("bitacora"), _report_rows("bitacora", yd.get("items") or []))
+            for yd in years_data if yd.get("items")]
+
+
+def _plan_bitacora(policy: SplitPolicy, years_data: List[Dict[str, Any]]) -> List[tuple]:
+    """Cada año se evalúa por separado: un año enorme puede continuar en hojas "2024 (2)", "2024 (3)"...
+    o, si excede el tamaño por archivo, toda la exportación se entrega como libros en un ZIP"""
+    return [(yd.get("year"), policy.plan(yd.get("items") or [])) for yd in years_data]
+
+
+def _bitacora_parts(year_plans: List[tuple], datestamp: str) -> List[tuple]:
+    return [(f"bitacora_envio_{year}_{datestamp}_parte_{part:02d}.xlsx",
+             _build_bitacora_workbook, [{"year": year, "items": chunk}])
+            for year, plan in year_plans
+            for part, chunk in enumerate(plan.chunks, start=1) if chunk]
+
+
+def _bitacora_filename(years_data: List[Dict[str, Any]], timestamp: str) -> str:
+    # Nombre de archivo con los años exportados
+    years_str = "_".join(sorted(str(yd.get("year", "")) for yd in years_data))
+    return f"bitacora_envio_{years_str}_{timestamp}.xlsx"
 
 
 @app.post("/api/generate-bitacora-excel")
+@_payload_precheck
+@_cancellable
 async def generate_bitacora_excel(request: Request):
     payload = await request.json()
-    
-    # Nuevo formato: years_data es una lista de objetos con 'year' e 'items'
-    years_data: List[Dict[str, Any]] = payload.get("years_data") or []
-    
-    # Compatibilidad con formato antiguo (un solo año)
-    if not years_data:
-        items: List[Dict[str, Any]] = payload.get("items") or []
-        year = payload.get("year", datetime.now().year)
-        if items:
-            years_data = [{"year": year, "items": items}]
-    
-    if not isinstance(years_data, list) or len(years_data) == 0:
-        raise HTTPException(status_code=400, detail="years_data must be a non-empty list")
-    
-    # Ordenar años de forma ascendente
-    years_data.sort(key=lambda x: x.get("year", 0))
-
-    try:
-        # Crear un nuevo workbook
-        wb = Workbook()
-        # Eliminar la hoja por defecto
-        wb.remove(wb.active)
-        
-        # Usar plantilla si existe - CARGAR SOLO UNA VEZ para optimizar
-        template_exists = _ensure_template(TEMPLATE_PATH_BITACORA)
-        template_wb = None
-        template_ws = None
-        template_merged_ranges = None
-        template_column_widths = None
-        template_row_heights = None
-        
-        if template_exists:
-            logger.info(f"📄 Cargando plantilla una vez: {TEMPLATE_PATH_BITACORA}")
-            template_wb = openpyxl.load_workbook(TEMPLATE_PATH_BITACORA)
-            template_ws = template_wb.active
-            template_merged_ranges = list(template_ws.merged_cells.ranges)
-            template_column_widths = {col: template_ws.column_dimensions[col].width for col in template_ws.column_dimensions}
-            template_row_heights = {row: template_ws.row_dimensions[row].height for row in template_ws.row_dimensions}
-        
-        # Procesar cada año
-        total_years = len(years_data)
-        for idx, year_data in enumerate(years_data, start=1):
-            year = year_data.get("year")
-            items: List[Dict[str, Any]] = year_data.get("items") or []
-            
-            if not items:
-                logger.warning(f"⚠️ No hay items para el año {year}, saltando...")
-                continue
-            
-            logger.info(f"📝 [{idx}/{total_years}] Procesando año {year} con {len(items)} registros")
-            
-            # Crear o copiar hoja para este año
-            if template_exists and template_ws:
-                # Crear nueva hoja con el nombre del año
-                ws = wb.create_sheet(title=str(year))
-                
-                # Copiar todas las celdas de la plantilla (reutilizando la plantilla cargada)
-                for row in template_ws.iter_rows():
-                    for cell in row:
-                        new_cell = ws.cell(row=cell.row, column=cell.column)
-                        new_cell.value = cell.value
-                        if cell.has_style:
-                            new_cell.font = cell.font.copy() if cell.font else None
-                            new_cell.fill = cell.fill.copy() if cell.fill else None
-                            new_cell.border = cell.border.copy() if cell.border else None
-                            new_cell.alignment = cell.alignment.copy() if cell.alignment else None
-                            new_cell.number_format = cell.number_format
-                
-                # Copiar merged cells (reutilizando los rangos guardados)
-                for merged_range in template_merged_ranges:
-                    ws.merge_cells(str(merged_range))
-                
-                # Copiar anchos de columna (reutilizando los anchos guardados)
-                for col, width in template_column_widths.items():
-                    ws.column_dimensions[col].width = width
-                
-                # Copiar altos de fila (reutilizando los altos guardados)
-                for row, height in template_row_heights.items():
-                    ws.row_dimensions[row].height = height
-            else:
-                # Crear hoja nueva sin plantilla
-                ws = wb.create_sheet(title=str(year))
-            
-            # Actualizar la fecha en el encabezado si existe (similar a SICOR)
+    years_data = await _resolve_years_data(payload)
+
+    total_rows = sum(len(yd.get("items") or []) for yd in years_data)
+    cost = estimate_cost(total_rows, BITACORA_COLUMNS)
+
+    fmt = _get_format(request, payload)
+    strings = _get_string_encoding(request, payload)
+    if fmt != FORMAT_XLSX:
+        years_str = "_".join(str(yd.get("year", "")) for yd in years_data)
+        return await _fast_format_response(fmt, cost, _bitacora_fast_sheets(years_data),
+                                           f"bitacora_envio_{years_str}_{_timestamp()}",
+                                           leading_header="AÑO", strings=strings)
+
+    policy = _get_split_policy(payload, BITACORA_FIRST_ROW)
+    year_plans = _plan_bitacora(policy, years_data)
+    if any(plan.mode == MODE_WORKBOOKS for _, plan in year_plans):
+        return await _stream_parts_response(cost, _bitacora_parts(year_plans, _datestamp()),
+                                            f"bitacora_envio_{_timestamp()}.zip", strings)
+
+    async def generate() -> bytes:
+        async with ADMISSION.admit(cost):
             try:
-                # Buscar celda con fecha en las primeras filas
-                for row in range(1, 5):
-                    for col in range(1, 10):
-                        cell = ws.cell(row=row, column=col)
-                        if cell.value and isinstance(cell.value, str):
-                            cell_text = str(cell.value)
-                            # Si contiene "fecha" o un patrón de fecha, actualizar
-                            if "fecha" in cell_text.lower() or re.search(r'\d{2}/\d{2}/\d{4}', cell_text):
-                                now = datetime.now()
-                                fecha_actual = now.strftime("%d/%m/%Y")
-                                pattern = r'\s*-\s*\d{2}/\d{2}/\d{4}\s*$'
-                                if re.search(pattern, cell_text):
-                                    nuevo_texto = re.sub(pattern, f' - {fecha_actual}', cell_text)
-                                else:
-                                    nuevo_texto = f"{cell_text.rstrip()} - {fecha_actual}"
-                                cell.value = nuevo_texto
-                                logger.info(f"📅 Fecha actualizada en encabezado (año {year}): {fecha_actual}")
-                                break
+                file_bytes = await _render_bitacora(years_data, policy.max_rows_per_sheet)
+                if strings != STRINGS_INLINE:
+                    file_bytes = await run_in_threadpool(share_strings, file_bytes, strings)
+                return file_bytes
             except Exception as e:
-                logger.warning(f"⚠️ No se pudo actualizar la fecha en el encabezado (año {year}): {e}")
-            
-            # Los datos empiezan en B4 (fila 4, columna B = columna 2)
-            start_row = 4
-            start_col = 2  # Columna B
-            
-            # Buscar la primera fila vacía desde la fila 4 (B4)
-            # Si B4 ya tiene datos, buscar la siguiente fila vacía
-            while ws.cell(row=start_row, column=start_col).value is not None:
-                start_row += 1
-            
-            logger.info(f"📝 Escribiendo {len(items)} registros de bitácora (año {year}) desde la fila {start_row}, columna B")
-            
-            # Obtener el formato de la fila 4 (B4) como referencia si existe
-            reference_row = 4
-            reference_cells = {}
-            # 13 columnas empezando desde B: Consecutivo, Fecha, Técnico, Tarjeta, Código, Serie, Folio, Envía, Recibe, Guía, Anexos, COBO (INCIDENTE), Observaciones
-            for col in range(start_col, start_col + 13):
-                ref_cell = ws.cell(row=reference_row, column=col)
-                reference_cells[col] = {
-                    'font': ref_cell.font.copy() if ref_cell.font else None,
-                    'fill': ref_cell.fill.copy() if ref_cell.fill else None,
-                    'border': ref_cell.border.copy() if ref_cell.border else None,
-                    'alignment': ref_cell.alignment.copy() if ref_cell.alignment else None,
-                    'number_format': ref_cell.number_format,
-                }
-            
-            # Escribir cada registro de bitácora en una fila empezando desde B4
-            for idx, item in enumerate(items, start=0):
-                row = start_row + idx
-                
-                # Mapear campos según la plantilla empezando desde columna B (2)
-                # Columna B (2): Consecutivo
-                _safe_set_cell_value(ws, row, 2, item.get("consecutivo", ""))
-                # Columna C (3): Fecha
-                fecha_str = item.get("fecha", "")
-                if fecha_str:
-                    try:
-                        # Convertir de YYYY-MM-DD a DD/MM/YYYY si es necesario
-                        fecha_date = datetime.strptime(fecha_str, "%Y-%m-%d")
-                        fecha_formateada = fecha_date.strftime("%d/%m/%Y")
-                        _safe_set_cell_value(ws, row, 3, fecha_formateada)
-                    except:
-                        _safe_set_cell_value(ws, row, 3, fecha_str)
-                else:
-                    _safe_set_cell_value(ws, row, 3, "")
-                # Columna D (4): Técnico
-                _safe_set_cell_value(ws, row, 4, item.get("tecnico", ""))
-                # Columna E (5): Tarjeta
-                _safe_set_cell_value(ws, row, 5, item.get("tarjeta", ""))
-                # Columna F (6): Código
-                _safe_set_cell_value(ws, row, 6, item.get("codigo", ""))
-                # Columna G (7): Serie
-                _safe_set_cell_value(ws, row, 7, item.get("serie", ""))
-                # Columna H (8): Folio
-                _safe_set_cell_value(ws, row, 8, item.get("folio", ""))
-                # Columna I (9): Envía
-                _safe_set_cell_value(ws, row, 9, item.get("envia", ""))
-                # Columna J (10): Recibe
-                _safe_set_cell_value(ws, row, 10, item.get("recibe", ""))
-                # Columna K (11): Guía
-                _safe_set_cell_value(ws, row, 11, item.get("guia", ""))
-                # Columna L (12): Anexos
-                _safe_set_cell_value(ws, row, 12, item.get("anexos", ""))
-                # Columna M (13): COBO (en la plantilla se llama "INCIDENTE")
-                _safe_set_cell_value(ws, row, 13, item.get("cobo", ""))
-                # Columna N (14): Observaciones (última columna)
-                _safe_set_cell_value(ws, row, 14, item.get("observaciones", ""))
-                
-                # Aplicar formato de la fila de referencia (B4) a cada celda
-                for col in range(start_col, start_col + 13):
-                    cell = ws.cell(row=row, column=col)
-                    ref_format = reference_cells.get(col, {})
-                    
-                    if ref_format.get('font'):
-                        cell.font = ref_format['font']
-                    if ref_format.get('fill'):
-                        cell.fill = ref_format['fill']
-                    if ref_format.get('border'):
-                        cell.border = ref_format['border']
-                    if ref_format.get('alignment'):
-                        cell.alignment = ref_format['alignment']
-                    if ref_format.get('number_format'):
-                        cell.number_format = ref_format['number_format']
-            
-            # Si no hay plantilla, crear estructura básica para esta hoja (solo encabezados)
-            if not template_exists:
-                # Título
-                title_cell = ws.cell(row=1, column=1, value=f'BITÁCORA DE ENVÍOS - AÑO {year}')
-                title_cell.font = Font(bold=True, size=14)
-                title_cell.alignment = Alignment(horizontal='center', vertical='center')
-                
-                # Encabezados (fila 3, empezando desde columna B)
-                headers = ['Consecutivo', 'Fecha', 'Técnico', 'Tarjeta', 'Código', 'Serie', 'Folio', 
-                          'Envía', 'Recibe', 'Guía', 'Anexos', 'INCIDENTE', 'Observaciones']
-                for col, header in enumerate(headers, start=2):  # Empezar desde columna B (2)
-                    cell = ws.cell(row=3, column=col, value=header)
-                    _apply_cell_style(cell, bold=True, center=True)
-        
-        # Las hojas ya están ordenadas porque years_data está ordenado
-        # Pero por si acaso, reordenarlas explícitamente
-        # Crear un diccionario con las hojas
-        sheets_dict = {ws.title: ws for ws in wb.worksheets}
-        sorted_sheet_names = sorted(sheets_dict.keys(), key=lambda x: int(x) if x.isdigit() else 9999)
-        
-        # Reordenar las hojas moviendo cada una a su posición correcta
-        for i, sheet_name in enumerate(sorted_sheet_names):
-            if i == 0:
-                continue  # La primera hoja ya está en su lugar
-            sheet = sheets_dict[sheet_name]
-            current_index = wb.index(sheet)
-            target_index = i
-            if current_index != target_index:
-                # Mover la hoja a la posición correcta
-                wb.move_sheet(sheet, offset=target_index - current_index)
-
-        file_bytes = _save_workbook_to_bytes(wb)
-        if not file_bytes:
-            raise RuntimeError("Generated file is empty")
-
-        global LAST_GENERATED_FILE_CONTENT, LAST_GENERATED_FILENAME
-        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        # Generar nombre de archivo con los años exportados
-        years_list = sorted([str(yd.get("year", "")) for yd in years_data])
-        years_str = "_".join(years_list)
-        filename = f"bitacora_envio_{years_str}_{timestamp}.xlsx"
-        LAST_GENERATED_FILE_CONTENT = file_bytes
-        LAST_GENERATED_FILENAME = filename
-        
-        logger.info(f"📊 Archivo generado con {len(wb.worksheets)} hoja(s): {[ws.title for ws in wb.worksheets]}")
-
-        logger.info(f"📦 Tamaño del archivo generado: {len(file_bytes)} bytes")
-
-        return Response(content=file_bytes,
-                        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                        headers={"Content-Disposition": f"attachment; filename=\"{filename}\""})
-
-    except Exception as e:
-        logger.exception("Error generating bitacora excel")
-        raise HTTPException(status_code=500, detail=str(e))
+                logger.exception("Error generating bitacora excel")
+                raise HTTPException(status_code=500, detail=str(e))
+
+    key = None
+    if FILE_CACHE.enabled:
+        key = await run_in_threadpool(_file_cache_key, "bitacora", TEMPLATE_PATH_BITACORA, strings,
+                                      policy.max_rows_per_sheet, items=years_data)
+    file_bytes, origin = await FILE_CACHE.get_or_generate(key, generate)
+    if origin != CACHE_MISS:
+        logger.info(f"♻️ Bitácora: archivo tomado de caché ({origin})")
+    return _cached_excel_response(file_bytes, origin, _bitacora_filename(years_data, _timestamp()))
+
+
+def _preview_rows(report: str, items: List[Dict[str, Any]], limit: int) -> List[List[Any]]:
+    """Primeras ``limit`` filas del reporte, normalizando sólo los items que se muestran"""
+    if report == "computo":
+        # nsmallest equivale a sorted()[:limit]: mismos IDs consecutivos que la exportación completa
+        return _computo_rows(heapq.nsmallest(limit, items, key=_computo_id_value))
+    return table_rows(COLUMN_MAPS[report], items[:limit])
+
+
+def _get_preview_limit(request: Request, payload: Dict[str, Any]) -> int:
+    """Filas a mostrar: ?rows=... o la llave "preview_rows" (PREVIEW_ROWS por defecto)"""
+    value = request.query_params.get("rows") or payload.get("preview_rows") or PREVIEW_ROWS
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="rows must be an integer")
+    if not 1 <= limit <= PREVIEW_MAX_ROWS:
+        raise HTTPException(status_code=400, detail=f"rows must be between 1 and {PREVIEW_MAX_ROWS}")
+    return limit
+
+
+@app.post("/api/preview/{report}")
+async def preview_report(report: str, request: Request):
+    """Encabezados y primeras filas del reporte ya mapeadas, sin plantilla ni libro (JSON o HTML)"""
+    if report not in COLUMN_MAPS:
+        raise HTTPException(status_code=404, detail=f"report must be one of: {', '.join(COLUMN_MAPS)}")
+    payload = await request.json()
+    fmt = request.query_params.get("format") or "json"
+    if fmt not in PREVIEW_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(PREVIEW_FORMATS)}")
+    limit = _get_preview_limit(request, payload)
+    header = report_headers(report)
+
+    # Con "source" se pide una fila de más para saber si hay más datos que los mostrados
+    if report == "bitacora":
+        years_data = await _resolve_years_data(payload, limit + 1)
+        total = sum(len(yd.get("items") or []) for yd in years_data)
+        sheets, remaining = [], limit
+        for yd in years_data:
+            items = yd.get("items") or []
+            if items and remaining > 0:
+                rows = _preview_rows(report, items, remaining)
+                sheets.append((str(yd.get("year")), header, rows))
+                remaining -= len(rows)
+    else:
+        items = await _resolve_items(report, payload, limit + 1)
+        total = len(items)
+        sheets = [(report, header, _preview_rows(report, items, limit))]
+
+    shown = sum(len(rows) for _, _, rows in sheets)
+    if fmt == "html":
+        return HTMLResponse(render_html(sheets), media_type=HTML_MEDIA_TYPE)
+    return JSONResponse(jsonable_encoder({
+        "report": report,
+        "rows": shown,
+        "total_items": total if payload.get("source") is None else None,
+        "truncated": total > shown,
+        "sheets": [{"name": name, "header": list(sheet_header), "rows": rows} for name, sheet_header, rows in sheets],
+    }))
+
+
+async def _spool_upload(request: Request):
+    """Archivo subido como multipart (campo "file") o como cuerpo crudo, sin cargarlo completo en memoria"""
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="multipart upload must include a 'file' field")
+        return upload.file
+    spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES)
+    async for chunk in request.stream():
+        spool.write(chunk)
+    if spool.tell() == 0:
+        raise HTTPException(status_code=400, detail="request body must be an xlsx file")
+    spool.seek(0)
+    return spool
+
+
+@app.post("/api/import/{report}")
+async def import_report(report: str, request: Request):
+    """Convierte un libro con el formato de la plantilla de vuelta en items (NDJSON en streaming)"""
+    if report not in IMPORT_REPORTS:
+        raise HTTPException(status_code=404, detail=f"report must be one of: {', '.join(IMPORT_REPORTS)}")
+    upload = await _spool_upload(request)
+    try:
+        imported = await run_in_threadpool(ImportedWorkbook, upload, report)
+    except ImportFormatError as e:
+        upload.close()
+        raise HTTPException(status_code=400, detail=str(e))
+
+    logger.info(f"📥 Importando {report}: {len(imported.sheets)} hojas, ~{imported.estimated_rows} filas")
+    cost = estimate_cost(imported.estimated_rows, len(COLUMN_MAPS[report]))
+    body = iterate_in_threadpool(iter_ndjson(imported.iter_items()))
+    return await _admitted_streaming_response(cost, body, NDJSON_MEDIA_TYPE, f"{report}_import_{_timestamp()}.ndjson")
+
+
+def _diff_side(value: Any, name: str) -> List[Dict[str, Any]]:
+    """Items de un lado del diff; acepta también years_data de bitácora (lista de {"year", "items"})"""
+    if not isinstance(value, list):
+        raise HTTPException(status_code=400, detail=f"{name} must be a list of items")
+    if value and all(isinstance(entry, dict) and "items" in entry for entry in value):
+        return [item for entry in value for item in (entry.get("items") or [])]
+    return value
+
+
+def _read_import(upload, report: str) -> List[Dict[str, Any]]:
+    return list(ImportedWorkbook(upload, report).iter_items())
+
+
+async def _diff_inputs(report: str, request: Request):
+    """(antes, después, llave) desde JSON o desde dos libros subidos como multipart ("before" y "after")"""
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form()
+        sides = []
+        for name in ("before", "after"):
+            upload = form.get(name)
+            if upload is None or isinstance(upload, str):
+                raise HTTPException(status_code=400, detail=f"multipart upload must include a '{name}' file")
+            try:
+                sides.append(await run_in_threadpool(_read_import, upload.file, report))
+            except ImportFormatError as e:
+                raise HTTPException(status_code=400, detail=f"{name}: {e}")
+        key = form.get("key")
+    else:
+        payload = await request.json()
+        sides = [_diff_side(payload.get(name), name) for name in ("before", "after")]
+        key = payload.get("key")
+    key = request.query_params.get("key") or key or ()
+    if isinstance(key, str):
+        key = [part.strip() for part in key.split(",") if part.strip()]
+    return sides[0], sides[1], key
+
+
+@app.post("/api/diff/{report}")
+async def diff_report(report: str, request: Request):
+    """Filas agregadas, eliminadas y modificadas entre dos inventarios (xlsx con estilo o JSON)"""
+    if report not in DEFAULT_KEYS:
+        raise HTTPException(status_code=404, detail=f"report must be one of: {', '.join(DEFAULT_KEYS)}")
+    fmt = request.query_params.get("format") or "xlsx"
+    if fmt not in DIFF_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(DIFF_FORMATS)}")
+    before, after, key = await _diff_inputs(report, request)
+
+    async with ADMISSION.admit(estimate_cost(len(before) + len(after), len(COLUMN_MAPS[report]))):
+        try:
+            diff = await run_in_threadpool(diff_items, report, before, after, key)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        logger.info(f"🔍 Diff de {report} por {' + '.join(diff.key)}: {diff.summary()}")
+        if fmt == "json":
+            return JSONResponse(jsonable_encoder(diff.to_dict()))
+        file_bytes = await run_in_threadpool(render_diff_workbook, diff)
+        return _excel_response(file_bytes, f"diff_{report}_{_timestamp()}.xlsx")
+
+
+@app.get("/api/snapshots/{report}/{inventory}")
+def list_snapshots(report: str, inventory: str):
+    """Snapshots guardados de un inventario (para elegir el ``since`` de una exportación delta)"""
+    if report not in REPORTS:
+        raise HTTPException(status_code=404, detail=f"report must be one of: {', '.join(REPORTS)}")
+    if not SNAPSHOTS.enabled:
+        raise HTTPException(status_code=503, detail="snapshots are disabled (EXCEL_SNAPSHOT_DB is empty)")
+    return {"report": report, "inventory": inventory, "snapshots": SNAPSHOTS.history(report, inventory)}
 
 
 @app.get("/api/debug-last-file")
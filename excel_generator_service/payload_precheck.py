@@ -0,0 +1,155 @@
+"""Verificación previa del payload por hash para no volver a subirlo.
+
+La app sube payloads de varios MB (la bitácora de un año completo, por ejemplo)
+que el servicio muchas veces ya recibió. Con el encabezado ``X-Payload-Sha256``
+(sha256 en hex de los bytes exactos del cuerpo) los endpoints ``generate-*``
+aceptan una solicitud sin cuerpo:
+
+- si hay un resultado de hoy para el mismo endpoint, parámetros y hash, se
+  entrega tal cual;
+- si el servicio conserva el payload, se genera con él como si se hubiera subido;
+- si no, responde ``428`` y el cliente repite la solicitud con el cuerpo.
+
+Cuando llega el cuerpo se verifica su hash y se guarda. Los resultados se
+guardan sólo para payloads sin ``source`` (los datos salen de Postgres y
+pueden cambiar) ni ``snapshot`` (guardar un snapshot es un efecto que se debe
+repetir). Con ``EXCEL_CACHE_BACKEND=redis`` los payloads y resultados se
+comparten entre instancias.
+"""
+import hashlib
+import json
+import os
+import re
+import struct
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from cache_backend import CacheBackend, LocalBackend
+
+PAYLOAD_HASH_HEADER = "X-Payload-Sha256"
+PAYLOAD_CACHE_HEADER = "X-Payload-Cache"
+# Respuesta a una verificación sin cuerpo cuando el servicio no tiene el payload
+UPLOAD_REQUIRED_STATUS = 428
+
+# Llaves del payload que impiden reutilizar el resultado
+UNCACHEABLE_KEYS = ("source", "snapshot")
+
+_DIGEST = re.compile(r"^[0-9a-f]{64}$")
+_LENGTH = struct.Struct("<I")
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class InvalidPayloadHash(ValueError):
+    """El encabezado no es un sha256 en hex o no corresponde al cuerpo recibido"""
+
+
+def parse_digest(value: str) -> str:
+    digest = value.strip().lower()
+    if not _DIGEST.match(digest):
+        raise InvalidPayloadHash(f"{PAYLOAD_HASH_HEADER} must be a hex sha256 digest")
+    return digest
+
+
+def verify_body(digest: str, body: bytes):
+    if hashlib.sha256(body).hexdigest() != digest:
+        raise InvalidPayloadHash(f"{PAYLOAD_HASH_HEADER} does not match the request body")
+
+
+def cacheable_result(body: bytes) -> bool:
+    """Si el resultado depende sólo del payload (sin ``source`` ni ``snapshot``)"""
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return False
+    return isinstance(payload, dict) and not any(payload.get(key) is not None for key in UNCACHEABLE_KEYS)
+
+
+@dataclass
+class StoredResult:
+    """Archivo generado para un payload: contenido, media type y Content-Disposition"""
+    content: bytes
+    media_type: str
+    disposition: str
+
+    def encode(self) -> bytes:
+        header = json.dumps({"media_type": self.media_type, "disposition": self.disposition}).encode("utf-8")
+        return _LENGTH.pack(len(header)) + header + self.content
+
+    @classmethod
+    def decode(cls, data: bytes) -> "StoredResult":
+        (size,) = _LENGTH.unpack_from(data)
+        header = json.loads(data[_LENGTH.size:_LENGTH.size + size])
+        return cls(data[_LENGTH.size + size:], header["media_type"], header["disposition"])
+
+
+class PayloadStore:
+    """Payloads por hash y resultados por (endpoint, parámetros, hash, fecha); ``max_bytes`` = 0 lo desactiva."""
+
+    def __init__(self, max_bytes: int, payload_ttl: int, result_ttl: int, backend: Optional[CacheBackend] = None):
+        self.max_bytes = max(0, max_bytes)
+        self.payload_ttl = max(0, payload_ttl) or None
+        self.result_ttl = max(0, result_ttl) or None
+        self.backend = backend if backend is not None else LocalBackend(self.max_bytes)
+        self.prechecks = 0
+        self.result_hits = 0
+        self.payload_hits = 0
+        self.uploads_required = 0
+        self.uploads = 0
+        self.mismatches = 0
+        self.stored_results = 0
+
+    @classmethod
+    def from_env(cls, backend: Optional[CacheBackend] = None) -> "PayloadStore":
+        return cls(max_bytes=_env_int("EXCEL_PAYLOAD_CACHE_MAX_BYTES", 256 * 1024 * 1024),
+                   payload_ttl=_env_int("EXCEL_PAYLOAD_CACHE_TTL", 7 * 24 * 3600),
+                   result_ttl=_env_int("EXCEL_PAYLOAD_RESULT_TTL", 24 * 3600),
+                   backend=backend)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def result_key(path: str, query: str, digest: str) -> str:
+        # La fecha va en los encabezados del archivo: un resultado sólo sirve el día en que se generó
+        params = "&".join(sorted(query.split("&"))) if query else ""
+        return hashlib.sha256(f"{path}?{params}#{digest}@{datetime.now():%Y-%m-%d}".encode("utf-8")).hexdigest()
+
+    def get_result(self, key: str) -> Optional[StoredResult]:
+        data = self.backend.get("result:" + key)
+        if data is None:
+            return None
+        try:
+            return StoredResult.decode(data)
+        except (struct.error, ValueError, KeyError):
+            return None
+
+    def put_result(self, key: str, result: StoredResult):
+        data = result.encode()
+        if len(data) <= self.max_bytes:
+            self.backend.set("result:" + key, data, self.result_ttl)
+            self.stored_results += 1
+
+    def get_payload(self, digest: str) -> Optional[bytes]:
+        body = self.backend.get("payload:" + digest)
+        # Una entrada corrupta no debe generar otro archivo que el pedido
+        if body is not None and hashlib.sha256(body).hexdigest() != digest:
+            return None
+        return body
+
+    def put_payload(self, digest: str, body: bytes):
+        if len(body) <= self.max_bytes:
+            self.backend.set("payload:" + digest, body, self.payload_ttl)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "prechecks": self.prechecks, "result_hits": self.result_hits,
+                "payload_hits": self.payload_hits, "uploads_required": self.uploads_required,
+                "uploads": self.uploads, "mismatches": self.mismatches, "stored_results": self.stored_results,
+                **self.backend.snapshot()}
@@ -0,0 +1,173 @@
+"""Caché de hojas ya generadas para exportaciones incrementales.
+
+La bitácora exporta varios años en un mismo libro y los años cerrados casi
+nunca cambian. Cada año se genera como una parte independiente (XML de sus
+hojas, con cadenas en línea) y se guarda bajo un hash de sus items y de la
+versión de la plantilla; en la siguiente exportación sólo se regeneran los
+años cuyo hash cambió y las partes en caché se ensamblan en el libro final.
+
+Las partes y el paquete base se guardan serializados en un ``CacheBackend``:
+el LRU local del proceso o, con ``EXCEL_CACHE_BACKEND=redis``, el Redis que
+comparten todas las instancias (un año generado en una sirve a las demás).
+"""
+import hashlib
+import json
+import os
+import struct
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from cache_backend import CacheBackend, LocalBackend
+
+# Se incrementa cuando cambia la forma en que se generan las hojas
+CACHE_FORMAT_VERSION = 1
+
+# Marcador que se escribe en lugar de la fecha del encabezado; se sustituye al ensamblar
+FECHA_PLACEHOLDER = "__FECHA_ACTUAL__"
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+_TEMPLATE_VERSIONS: Dict[str, Tuple[float, int, str]] = {}
+
+
+def template_version(path: str) -> str:
+    """Hash del archivo de plantilla (se recalcula sólo si cambia su mtime o tamaño)"""
+    stat = os.stat(path)
+    cached = _TEMPLATE_VERSIONS.get(path)
+    if cached and cached[:2] == (stat.st_mtime, stat.st_size):
+        return cached[2]
+    with open(path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    _TEMPLATE_VERSIONS[path] = (stat.st_mtime, stat.st_size, digest)
+    return digest
+
+
+def items_key(report: str, version: str, *parts: Any, items: Sequence[Dict[str, Any]]) -> str:
+    """Llave de caché: reporte, versión de plantilla, parámetros y contenido de los items"""
+    h = hashlib.sha256()
+    h.update(json.dumps([CACHE_FORMAT_VERSION, report, version, *parts], default=str).encode("utf-8"))
+    h.update(json.dumps(items, sort_keys=True, default=str, ensure_ascii=False).encode("utf-8"))
+    return h.hexdigest()
+
+
+_LENGTH = struct.Struct("<I")
+
+
+@dataclass
+class SheetPart:
+    """Hojas generadas de un año: (nombre, XML) y la firma de estilos del libro de origen"""
+    styles: bytes
+    sheets: List[Tuple[str, bytes]]
+
+    @property
+    def size(self) -> int:
+        return len(self.styles) + sum(len(xml) for _, xml in self.sheets)
+
+    def encode(self) -> bytes:
+        """Bloques con su longitud: estilos, número de hojas y (nombre, XML) de cada hoja"""
+        chunks = [_LENGTH.pack(len(self.styles)), self.styles, _LENGTH.pack(len(self.sheets))]
+        for title, xml in self.sheets:
+            encoded = title.encode("utf-8")
+            chunks += [_LENGTH.pack(len(encoded)), encoded, _LENGTH.pack(len(xml)), xml]
+        return b"".join(chunks)
+
+    @classmethod
+    def decode(cls, data: bytes) -> "SheetPart":
+        view, offset = memoryview(data), 0
+
+        def block() -> bytes:
+            nonlocal offset
+            (size,) = _LENGTH.unpack_from(view, offset)
+            offset += _LENGTH.size + size
+            return bytes(view[offset - size:offset])
+
+        styles = block()
+        (count,) = _LENGTH.unpack_from(view, offset)
+        offset += _LENGTH.size
+        sheets = []
+        for _ in range(count):
+            title = block().decode("utf-8")
+            sheets.append((title, block()))
+        return cls(styles=styles, sheets=sheets)
+
+
+class SheetCache:
+    """Partes por año en un ``CacheBackend`` (LRU local acotado por bytes si no se indica otro);
+    ``max_bytes`` = 0 la desactiva."""
+
+    def __init__(self, max_bytes: int, backend: Optional[CacheBackend] = None, ttl: Optional[int] = None):
+        self.max_bytes = max(0, max_bytes)
+        self.backend = backend if backend is not None else LocalBackend(self.max_bytes)
+        self.ttl = ttl or None
+        # Paquetes base ya usados por este proceso (uno por versión de plantilla)
+        self._bases: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls, backend: Optional[CacheBackend] = None) -> "SheetCache":
+        return cls(_env_int("EXCEL_SHEET_CACHE_MAX_BYTES", 256 * 1024 * 1024), backend,
+                   _env_int("EXCEL_SHEET_CACHE_TTL", 7 * 24 * 3600))
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, key: str) -> Optional[SheetPart]:
+        data = self.backend.get("sheet:" + key)
+        part = None
+        if data is not None:
+            try:
+                part = SheetPart.decode(data)
+            except (struct.error, UnicodeDecodeError):
+                # Entrada truncada o de otro formato: cuenta como fallo y se regenera
+                self.errors += 1
+        with self._lock:
+            if part is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return part
+
+    def put(self, key: str, part: SheetPart):
+        if part.size > self.max_bytes:
+            return
+        self.backend.set("sheet:" + key, part.encode(), self.ttl)
+
+    def get_base(self, version: str) -> Optional[bytes]:
+        """Paquete base (estilos, tema, propiedades) de una versión de plantilla"""
+        package = self._bases.get(version)
+        if package is None and self.enabled:
+            # Otra instancia pudo generar los años que esta toma de la caché compartida
+            package = self.backend.get("base:" + version)
+            if package is not None:
+                self._bases[version] = package
+        return package
+
+    def has_local_base(self, version: str) -> bool:
+        """Si este proceso ya tiene el paquete base (sin consultar el backend)"""
+        return version in self._bases
+
+    def put_base(self, version: str, package: bytes):
+        self._bases[version] = package
+        if self.enabled:
+            self.backend.set("base:" + version, package, self.ttl)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            **self.backend.snapshot(),
+        }
@@ -0,0 +1,190 @@
+"""Snapshots de exportaciones para generar sólo los cambios (exportaciones delta).
+
+Por cada exportación con ``snapshot`` se guarda un índice compacto de sus filas
+(llave de la fila -> hash de 16 bytes de su contenido, ver ``inventory_diff``)
+bajo el reporte y el inventario. Una exportación posterior con ``since`` compara
+sus filas contra ese índice y entrega sólo las nuevas y las modificadas, con un
+marcador de cambio, además de las llaves eliminadas.
+
+Los índices viven en SQLite (``EXCEL_SNAPSHOT_DB``) y se conservan los últimos
+``EXCEL_SNAPSHOT_KEEP`` por reporte e inventario.
+"""
+import os
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+SINCE_LATEST = "latest"
+
+# Fuera del código: data/ está en .gitignore
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "snapshots.sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id TEXT PRIMARY KEY,
+    report TEXT NOT NULL,
+    inventory TEXT NOT NULL,
+    key_fields TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    rows INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS snapshots_inventory ON snapshots (report, inventory, created_at);
+CREATE TABLE IF NOT EXISTS snapshot_rows (
+    snapshot_id TEXT NOT NULL,
+    row_key TEXT NOT NULL,
+    digest BLOB NOT NULL,
+    PRIMARY KEY (snapshot_id, row_key)
+) WITHOUT ROWID;
+"""
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class SnapshotNotFound(KeyError):
+    """No existe el snapshot pedido en ``since`` para el reporte e inventario."""
+
+
+@dataclass(frozen=True)
+class SnapshotRequest:
+    """Llave ``snapshot`` del payload: inventario, snapshot base (``since``) y si se guarda uno nuevo."""
+    inventory: str
+    since: Optional[str] = None
+    save: bool = True
+    key: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_payload(cls, value: Any) -> "SnapshotRequest":
+        if not isinstance(value, dict) or not str(value.get("inventory") or "").strip():
+            raise ValueError("snapshot must be an object with a non-empty 'inventory'")
+        key = value.get("key") or ()
+        if isinstance(key, str):
+            key = [part.strip() for part in key.split(",") if part.strip()]
+        since = value.get("since")
+        return cls(inventory=str(value["inventory"]).strip(),
+                   since=str(since) if since is not None else None,
+                   save=bool(value.get("save", True)),
+                   key=tuple(key))
+
+
+@dataclass
+class SnapshotDelta:
+    """Filas de la exportación actual comparadas contra un snapshot"""
+    since: str
+    added: List[List[Any]]
+    modified: List[List[Any]]
+    removed_keys: List[str]
+    unchanged: int
+
+    def summary(self) -> Dict[str, int]:
+        return {"added": len(self.added), "modified": len(self.modified), "removed": len(self.removed_keys),
+                "unchanged": self.unchanged}
+
+
+def compute_delta(since: str, rows: List[List[Any]], fingerprints: List[Tuple[str, bytes]],
+                  previous: Dict[str, bytes]) -> SnapshotDelta:
+    """Separa ``rows`` en nuevas y modificadas respecto de ``previous`` (llave -> hash)"""
+    added, modified, unchanged = [], [], 0
+    for row, (row_key, digest) in zip(rows, fingerprints):
+        old = previous.get(row_key)
+        if old is None:
+            added.append(row)
+        elif old != digest:
+            modified.append(row)
+        else:
+            unchanged += 1
+    current = {row_key for row_key, _ in fingerprints}
+    removed = [row_key for row_key in previous if row_key not in current]
+    return SnapshotDelta(since, added, modified, removed, unchanged)
+
+
+class SnapshotStore:
+    """Índices de filas por exportación en SQLite; ``path`` vacío lo desactiva."""
+
+    def __init__(self, path: str, keep: int):
+        self.path = path
+        self.keep = max(1, keep)
+        self._lock = threading.Lock()
+        self._initialized = False
+        self.saved = 0
+        self.deltas = 0
+
+    @classmethod
+    def from_env(cls) -> "SnapshotStore":
+        return cls(os.environ.get("EXCEL_SNAPSHOT_DB", DEFAULT_DB_PATH), _env_int("EXCEL_SNAPSHOT_KEEP", 12))
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            if not self._initialized and os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            try:
+                if not self._initialized:
+                    conn.executescript(_SCHEMA)
+                    self._initialized = True
+                with conn:
+                    yield conn
+            finally:
+                conn.close()
+
+    def save(self, report: str, inventory: str, key_fields: str, fingerprints: List[Tuple[str, bytes]]) -> str:
+        """Guarda el índice de una exportación y descarta los snapshots más viejos del inventario"""
+        snapshot_id = uuid.uuid4().hex[:16]
+        with self._transaction() as conn:
+            conn.executemany("INSERT OR REPLACE INTO snapshot_rows (snapshot_id, row_key, digest) VALUES (?, ?, ?)",
+                             ((snapshot_id, row_key, digest) for row_key, digest in fingerprints))
+            conn.execute("INSERT INTO snapshots (id, report, inventory, key_fields, created_at, rows) "
+                         "VALUES (?, ?, ?, ?, ?, ?)",
+                         (snapshot_id, report, inventory, key_fields, datetime.now(timezone.utc).isoformat(),
+                          len(fingerprints)))
+            old = [(row[0],) for row in conn.execute(
+                "SELECT id FROM snapshots WHERE report = ? AND inventory = ? "
+                "ORDER BY created_at DESC LIMIT -1 OFFSET ?", (report, inventory, self.keep))]
+            conn.executemany("DELETE FROM snapshot_rows WHERE snapshot_id = ?", old)
+            conn.executemany("DELETE FROM snapshots WHERE id = ?", old)
+        self.saved += 1
+        return snapshot_id
+
+    def load(self, report: str, inventory: str, since: str, key_fields: str) -> Tuple[str, Dict[str, bytes]]:
+        """(id, llave -> hash) del snapshot ``since`` (o el más reciente con ``latest``)"""
+        with self._transaction() as conn:
+            if since == SINCE_LATEST:
+                found = conn.execute("SELECT id, key_fields FROM snapshots WHERE report = ? AND inventory = ? "
+                                     "ORDER BY created_at DESC LIMIT 1", (report, inventory)).fetchone()
+            else:
+                found = conn.execute("SELECT id, key_fields FROM snapshots "
+                                     "WHERE id = ? AND report = ? AND inventory = ?",
+                                     (since, report, inventory)).fetchone()
+            if found is None:
+                raise SnapshotNotFound(f"snapshot '{since}' not found for {report}/{inventory}")
+            if found[1] != key_fields:
+                raise ValueError(f"snapshot '{found[0]}' is keyed by {found[1]}, not {key_fields}")
+            rows = conn.execute("SELECT row_key, digest FROM snapshot_rows WHERE snapshot_id = ?", (found[0],))
+            previous = {row_key: bytes(digest) for row_key, digest in rows}
+        self.deltas += 1
+        return found[0], previous
+
+    def history(self, report: str, inventory: str) -> List[Dict[str, Any]]:
+        """Snapshots guardados del inventario, del más reciente al más viejo"""
+        with self._transaction() as conn:
+            rows = conn.execute("SELECT id, key_fields, created_at, rows FROM snapshots "
+                                "WHERE report = ? AND inventory = ? ORDER BY created_at DESC",
+                                (report, inventory)).fetchall()
+        return [{"id": sid, "key": key_fields.split(","), "created_at": created_at, "rows": count}
+                for sid, key_fields, created_at, count in rows]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "saved": self.saved, "deltas": self.deltas}
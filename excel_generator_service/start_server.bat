@@ -29,6 +29,10 @@ if not exist "venv\.dependencies_installed" (
     echo Dependencias instaladas
 )
 
+REM Compilar las plantillas (artefactos en assets\templates\compiled)
+echo Compilando plantillas...
+python template_artifacts.py
+
 echo.
 echo Iniciando servidor en http://localhost:8001
 echo Presiona Ctrl+C para detener el servidor
@@ -79,6 +79,12 @@ else
     echo -e "${GREEN}✅ Dependencias ya instaladas${NC}"
 fi
 
+# Compilar las plantillas (artefactos en assets/templates/compiled)
+echo -e "${BLUE}🧩 Compilando plantillas...${NC}"
+if ! $PYTHON_CMD template_artifacts.py; then
+    echo -e "${YELLOW}⚠️  No se pudieron compilar las plantillas; se parsearán en cada solicitud${NC}"
+fi
+
 echo ""
 echo -e "${GREEN}🚀 Iniciando servidor en http://0.0.0.0:8001${NC}"
 echo -e "${YELLOW}💡 Presiona Ctrl+C para detener el servidor${NC}"
@@ -0,0 +1,70 @@
+"""Codificación de cadenas por columna: en línea o en la tabla de cadenas compartidas.
+
+openpyxl escribe todas las cadenas en línea (``inlineStr``), lo que repite el
+mismo texto en cada fila de columnas como ``status``, ``marca`` o ``tipo``.
+Con ``shared`` esas columnas se guardan una sola vez en ``sharedStrings.xml``
+y las celdas sólo llevan el índice; las columnas casi únicas (``serie``,
+``observaciones``) conviene dejarlas en línea para no construir un diccionario
+enorme. ``auto`` decide por columna a partir de la cardinalidad de una muestra.
+"""
+from typing import Dict, Iterable, List, Optional
+
+STRINGS_INLINE = "inline"
+STRINGS_SHARED = "shared"
+STRINGS_AUTO = "auto"
+STRING_ENCODINGS = (STRINGS_INLINE, STRINGS_SHARED, STRINGS_AUTO)
+
+SAMPLE_SIZE = 1000
+# Una columna es repetitiva si sus valores distintos son a lo más esta fracción de la muestra
+SHARED_MAX_DISTINCT_RATIO = 0.5
+# Límite de entradas de la tabla; al llenarse, las cadenas nuevas se escriben en línea
+MAX_SHARED_STRINGS = 1 << 20
+
+SST_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" count="{count}" uniqueCount="{unique}">'
+)
+SST_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"
+SST_RELATIONSHIP = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings"
+
+
+def is_repetitive(values: Iterable[str]) -> bool:
+    """True si la muestra tiene pocos valores distintos en relación con su tamaño"""
+    sample = [value for value in values if value != ""][:SAMPLE_SIZE]
+    if len(sample) < 2:
+        return False
+    return len(set(sample)) <= SHARED_MAX_DISTINCT_RATIO * len(sample)
+
+
+def shared_columns(encoding: str, columns: Dict[str, List[str]]) -> set:
+    """Columnas que van a la tabla compartida según ``encoding`` y una muestra por columna"""
+    if encoding == STRINGS_SHARED:
+        return set(columns)
+    if encoding == STRINGS_AUTO:
+        return {key for key, values in columns.items() if is_repetitive(values)}
+    return set()
+
+
+class SharedStringTable:
+    """Tabla de cadenas compartidas; guarda el texto ya escapado para XML."""
+
+    def __init__(self, max_size: int = MAX_SHARED_STRINGS):
+        self.max_size = max_size
+        self._index: Dict[str, int] = {}
+        self.count = 0
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def add(self, escaped_text: str) -> Optional[int]:
+        index = self._index.get(escaped_text)
+        if index is None:
+            if len(self._index) >= self.max_size:
+                return None
+            index = self._index[escaped_text] = len(self._index)
+        self.count += 1
+        return index
+
+    def to_xml(self) -> str:
+        items = "".join(f'<si><t xml:space="preserve">{text}</t></si>' for text in self._index)
+        return SST_HEAD.format(count=self.count, unique=len(self._index)) + items + "</sst>"
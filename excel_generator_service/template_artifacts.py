@@ -0,0 +1,192 @@
+"""Plantillas precompiladas: el libro de openpyxl ya parseado, listo para cargar en cada solicitud.
+
+``openpyxl.load_workbook`` descomprime y parsea el XML de la plantilla en cada
+exportación (35-60 ms por plantilla). El paso de compilación (``start_server.sh``
+o ``python template_artifacts.py``) guarda cada plantilla de ``assets/templates``
+como un artefacto: un encabezado JSON con el hash de la plantilla de origen, la
+versión de openpyxl y la descripción de sus hojas (combinadas, primera fila
+libre), seguido del libro serializado con pickle. Al arrancar el servicio los
+artefactos se mapean en memoria; cada solicitud deserializa su propia copia del
+libro (3-9 ms). Si la plantilla cambió o el artefacto es de otra versión de
+openpyxl se parsea la plantilla como antes.
+
+Los artefactos contienen objetos pickle: el directorio debe ser tan confiable
+como el código del servicio.
+"""
+import argparse
+import glob
+import json
+import logging
+import mmap
+import os
+import pickle
+import struct
+import sys
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import openpyxl
+from openpyxl import Workbook
+
+from sheet_cache import template_version
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"XLTPL\x00"
+# Se incrementa cuando cambia el formato del artefacto
+ARTIFACT_FORMAT = 1
+ARTIFACT_SUFFIX = ".tpl"
+_HEADER_SIZE = struct.Struct("<I")
+
+DEFAULT_TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "templates")
+
+
+def _sheet_profile(wb: Workbook) -> List[Dict[str, Any]]:
+    return [{"title": ws.title, "first_free_row": ws.max_row + 1, "max_column": ws.max_column,
+             "merged": [str(r) for r in ws.merged_cells.ranges],
+             "conditional_formats": sum(len(cf.rules) for cf in ws.conditional_formatting)}
+            for ws in wb.worksheets]
+
+
+def compile_template(template_path: str, artifact_path: str) -> Dict[str, Any]:
+    """Parsea la plantilla y escribe su artefacto (de forma atómica); regresa el encabezado"""
+    wb = openpyxl.load_workbook(template_path)
+    header = {"format": ARTIFACT_FORMAT, "openpyxl": openpyxl.__version__,
+              "source": os.path.basename(template_path), "source_sha256": template_version(template_path),
+              "sheets": _sheet_profile(wb)}
+    encoded = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    payload = pickle.dumps(wb, protocol=pickle.HIGHEST_PROTOCOL)
+    tmp_path = f"{artifact_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + _HEADER_SIZE.pack(len(encoded)) + encoded + payload)
+    os.replace(tmp_path, artifact_path)
+    return header
+
+
+@dataclass
+class _Mapped:
+    """Artefacto mapeado en memoria y validado contra la plantilla"""
+    artifact_path: str
+    source_sha256: str
+    mapped: mmap.mmap
+    offset: int
+    header: Dict[str, Any]
+
+    def workbook(self) -> Workbook:
+        return pickle.loads(memoryview(self.mapped)[self.offset:])
+
+
+def _read_artifact(artifact_path: str) -> Optional[_Mapped]:
+    with open(artifact_path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    start = len(MAGIC) + _HEADER_SIZE.size
+    if mapped[:len(MAGIC)] != MAGIC:
+        mapped.close()
+        return None
+    (size,) = _HEADER_SIZE.unpack(mapped[len(MAGIC):start])
+    header = json.loads(mapped[start:start + size].decode("utf-8"))
+    return _Mapped(artifact_path, header.get("source_sha256", ""), mapped, start + size, header)
+
+
+class TemplateArtifacts:
+    """Carga las plantillas desde sus artefactos compilados; ``directory`` vacío lo desactiva."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        # plantilla -> (versión, artefacto mapeado o None si no hay uno vigente)
+        self._mapped: Dict[str, Tuple[Tuple[str, Optional[float]], Optional[_Mapped]]] = {}
+        self.hits = 0
+        self.fallbacks = 0
+        self.stale = 0
+
+    @classmethod
+    def from_env(cls) -> "TemplateArtifacts":
+        return cls(os.environ.get("EXCEL_TEMPLATE_ARTIFACTS", os.path.join(DEFAULT_TEMPLATES_DIR, "compiled")))
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    def artifact_path(self, template_path: str) -> str:
+        return os.path.join(self.directory, os.path.basename(template_path) + ARTIFACT_SUFFIX)
+
+    def _version(self, template_path: str) -> Tuple[str, Optional[float]]:
+        # Hash de la plantilla y mtime del artefacto: si alguno cambia se vuelve a validar
+        artifact_path = self.artifact_path(template_path)
+        artifact_mtime = os.stat(artifact_path).st_mtime if os.path.exists(artifact_path) else None
+        return template_version(template_path), artifact_mtime
+
+    def _entry(self, template_path: str) -> Optional[_Mapped]:
+        version = self._version(template_path)
+        cached = self._mapped.get(template_path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        with self._lock:
+            cached = self._mapped.get(template_path)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            artifact_path = self.artifact_path(template_path)
+            entry = None
+            if version[1] is not None:
+                try:
+                    entry = _read_artifact(artifact_path)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"⚠️ Artefacto ilegible {artifact_path}: {e}")
+            if entry is not None and (entry.header.get("format") != ARTIFACT_FORMAT
+                                      or entry.header.get("openpyxl") != openpyxl.__version__
+                                      or entry.source_sha256 != version[0]):
+                logger.warning(f"⚠️ Artefacto desactualizado para {os.path.basename(template_path)}, "
+                               f"se parseará la plantilla (ejecuta template_artifacts.py)")
+                self.stale += 1
+                entry = None
+            self._mapped[template_path] = (version, entry)
+            return entry
+
+    def load(self, template_path: str) -> Workbook:
+        """Copia nueva del libro de la plantilla (del artefacto si está vigente)"""
+        if self.enabled:
+            entry = self._entry(template_path)
+            if entry is not None:
+                try:
+                    wb = entry.workbook()
+                    self.hits += 1
+                    return wb
+                except Exception as e:
+                    logger.warning(f"⚠️ No se pudo cargar {entry.artifact_path}, se parseará la plantilla: {e}")
+        self.fallbacks += 1
+        return openpyxl.load_workbook(template_path)
+
+    def warm(self, template_paths: List[str]) -> int:
+        """Mapea los artefactos vigentes de ``template_paths`` (al arrancar); regresa cuántos"""
+        if not self.enabled:
+            return 0
+        return sum(1 for path in template_paths if os.path.exists(path) and self._entry(path) is not None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "mapped": sum(1 for _, entry in self._mapped.values() if entry is not None),
+                "hits": self.hits, "fallbacks": self.fallbacks, "stale": self.stale}
+
+
+def compile_all(templates: List[str], directory: str) -> int:
+    os.makedirs(directory, exist_ok=True)
+    store = TemplateArtifacts(directory)
+    for path in templates:
+        header = compile_template(path, store.artifact_path(path))
+        sheets = ", ".join(f"{s['title']} (fila libre {s['first_free_row']}, {len(s['merged'])} combinadas)"
+                           for s in header["sheets"])
+        print(f"✅ {os.path.basename(path)} -> {os.path.basename(store.artifact_path(path))}: {sheets}")
+    return len(templates)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("templates", nargs="*", help=f"plantillas .xlsx (default: {DEFAULT_TEMPLATES_DIR}/*.xlsx)")
+    parser.add_argument("--dir", default=TemplateArtifacts.from_env().directory, help="directorio de artefactos")
+    args = parser.parse_args()
+    if not args.dir:
+        print("EXCEL_TEMPLATE_ARTIFACTS está vacío: artefactos desactivados")
+        sys.exit(0)
+    templates = args.templates or sorted(glob.glob(os.path.join(DEFAULT_TEMPLATES_DIR, "*.xlsx")))
+    compile_all(templates, args.dir)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Los módulos del servicio se importan por nombre desde excel_generator_service/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,201 @@
+-- Esquema mínimo (sólo las columnas que leen las consultas de db_source.py) y datos de prueba.
+-- Borra y vuelve a crear las tablas: usar únicamente en una base de datos desechable.
+--   psql "$EXCEL_TEST_DATABASE_URL" -f tests/postgres_fixture.sql
+
+DROP TABLE IF EXISTS t_tarjetas_red, t_bitacora_envios, inventory_sessions, t_productos_categorias, t_productos,
+    t_inventarios, t_jumper_contenedores, t_computo_detalles_generales, t_computo_equipos_principales,
+    t_computo_ubicacion, t_computo_usuario_responsable, t_computo_software, t_computo_identificacion,
+    t_computo_usuario_final, t_computo_observaciones, t_accesorios_equipos CASCADE;
+
+CREATE TABLE t_tarjetas_red (
+  id_tarjeta_red integer GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+  en_stock text NOT NULL DEFAULT 'SI',
+  numero text NOT NULL,
+  codigo text,
+  serie text,
+  marca text,
+  posicion text,
+  comentarios text
+);
+
+CREATE TABLE t_bitacora_envios (
+  id_bitacora integer GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+  consecutivo text NOT NULL,
+  fecha text NOT NULL,
+  tecnico text,
+  tarjeta text,
+  codigo text,
+  serie text,
+  folio text,
+  envia text,
+  recibe text,
+  guia text,
+  anexos text,
+  observaciones text,
+  cobo text,
+  estado text
+);
+
+CREATE TABLE inventory_sessions (
+  id text PRIMARY KEY,
+  category_id integer NOT NULL,
+  category_name text NOT NULL,
+  quantities jsonb NOT NULL DEFAULT '{}'
+);
+
+CREATE TABLE t_productos (
+  id_producto integer PRIMARY KEY,
+  tamano integer,
+  rack integer,
+  contenedor text
+);
+
+CREATE TABLE t_productos_categorias (
+  id_producto integer NOT NULL,
+  id_categoria integer NOT NULL
+);
+
+CREATE TABLE t_inventarios (
+  id_producto integer NOT NULL,
+  cantidad integer NOT NULL DEFAULT 0
+);
+
+CREATE TABLE t_jumper_contenedores (
+  id_producto integer NOT NULL,
+  rack text,
+  contenedor text NOT NULL,
+  fecha_registro timestamp DEFAULT now()
+);
+
+CREATE TABLE t_computo_equipos_principales (
+  id_equipo_principal bigint PRIMARY KEY,
+  equipo_pm text NOT NULL
+);
+
+CREATE TABLE t_computo_ubicacion (
+  id_ubicacion bigint PRIMARY KEY,
+  direccion_fisica text NOT NULL,
+  estado text NOT NULL,
+  ciudad text NOT NULL,
+  tipo_edificio text,
+  nombre_edificio text
+);
+
+CREATE TABLE t_computo_usuario_responsable (
+  id_usuario_responsable bigint PRIMARY KEY,
+  expediente text,
+  apellido_paterno text,
+  apellido_materno text,
+  nombre text NOT NULL,
+  empresa text NOT NULL,
+  puesto text
+);
+
+CREATE TABLE t_computo_detalles_generales (
+  id_equipo_computo bigint PRIMARY KEY,
+  inventario text NOT NULL,
+  equipo_pm bigint,
+  fecha_registro date,
+  tipo_equipo text NOT NULL,
+  marca text,
+  modelo text,
+  procesador text,
+  numero_serie text,
+  disco_duro text,
+  memoria_ram text,
+  id_ubicacion bigint,
+  id_usuario_responsable bigint
+);
+
+CREATE TABLE t_computo_software (
+  id_equipo_computo bigint NOT NULL,
+  sistema_operativo_instalado text,
+  etiqueta_sistema_operativo text,
+  office_instalado text,
+  actualizado_en timestamptz DEFAULT now()
+);
+
+CREATE TABLE t_computo_identificacion (
+  id_equipo_computo bigint,
+  tipo_uso text,
+  nombre_equipo_dominio text,
+  status text NOT NULL DEFAULT 'ASIGNADO',
+  direccion_administrativa text,
+  subdireccion text,
+  gerencia text,
+  actualizado_en timestamptz DEFAULT now()
+);
+
+CREATE TABLE t_computo_usuario_final (
+  id_equipo_computo bigint,
+  expediente text,
+  apellido_paterno text,
+  apellido_materno text,
+  nombre text NOT NULL,
+  empresa text NOT NULL,
+  puesto text,
+  actualizado_en timestamptz DEFAULT now()
+);
+
+CREATE TABLE t_computo_observaciones (
+  id_equipo_computo text,
+  observaciones text,
+  actualizado_en timestamptz DEFAULT now()
+);
+
+CREATE TABLE t_accesorios_equipos (
+  id_accesorio bigint PRIMARY KEY,
+  inventario text,
+  id_equipo_computo bigint NOT NULL,
+  fecha_registro date,
+  tipo_equipo text,
+  marca text,
+  modelo text,
+  numero_serie text
+);
+
+-- SICOR: 5 tarjetas, 2 fuera de stock
+INSERT INTO t_tarjetas_red (en_stock, numero, codigo, serie, marca, posicion, comentarios)
+SELECT CASE WHEN n % 3 = 0 THEN 'NO' ELSE 'SI' END, n::text, '03' || lpad(n::text, 4, '0'), 'SER' || n,
+       CASE WHEN n % 2 = 0 THEN 'HUAWEI' ELSE 'NOKIA' END, 'A' || n, NULL
+FROM generate_series(1, 5) AS n;
+
+-- Bitácora: 3 envíos en 2024 y 2 en 2025
+INSERT INTO t_bitacora_envios (consecutivo, fecha, tecnico, tarjeta, codigo, serie, folio, envia, recibe, guia,
+                               anexos, observaciones, cobo, estado)
+VALUES ('2024-00001', '2024-02-10', 'JUAN PEREZ', 'TARJETA A', '030001', 'S1', 'F1', 'CDMX', 'MTY', 'G1', '', '', '', 'ENVIADO'),
+       ('2024-00002', '2024-05-03', 'MARIA LOPEZ', 'TARJETA B', '030002', 'S2', 'F2', 'CDMX', 'GDL', 'G2', '', '', '', 'RECIBIDO'),
+       ('2024-00003', '2024-11-21', 'JUAN PEREZ', 'TARJETA C', '030003', 'S3', 'F3', 'MTY', 'CDMX', 'G3', '', '', '', 'RECIBIDO'),
+       ('2025-00001', '2025-01-15', 'PEDRO RUIZ', 'TARJETA A', '030001', 'S4', 'F4', 'GDL', 'CDMX', 'G4', '', '', '', 'EN_TRANSITO'),
+       ('2025-00002', '2025-03-08', 'JUAN PEREZ', 'TARJETA D', '030004', 'S5', 'F5', 'CDMX', 'MTY', 'G5', '', '', '', 'ENVIADO');
+
+-- Jumpers: sesión "sesion-1" de la categoría 1 con 3 productos; el 2 tiene cantidad capturada en la sesión
+INSERT INTO inventory_sessions (id, category_id, category_name, quantities)
+VALUES ('sesion-1', 1, 'LC-LC', '{"2": 7}');
+INSERT INTO t_productos (id_producto, tamano, rack, contenedor)
+VALUES (1, 3, 1, 'C1'), (2, 5, NULL, ''), (3, 10, 2, 'C8');
+INSERT INTO t_productos_categorias (id_producto, id_categoria) VALUES (1, 1), (2, 1), (3, 1);
+INSERT INTO t_inventarios (id_producto, cantidad) VALUES (1, 4), (1, 2), (3, 1);
+INSERT INTO t_jumper_contenedores (id_producto, rack, contenedor) VALUES (3, '2', 'C8'), (3, NULL, 'C9');
+
+-- Cómputo: 2 equipos del mismo EQUIPO PM; el primero con un accesorio
+INSERT INTO t_computo_equipos_principales (id_equipo_principal, equipo_pm) VALUES (1, 'PM-001');
+INSERT INTO t_computo_ubicacion (id_ubicacion, direccion_fisica, estado, ciudad, tipo_edificio, nombre_edificio)
+VALUES (1, 'AV. REFORMA 1', 'CDMX', 'CIUDAD DE MEXICO', 'OFICINA', 'TORRE A');
+INSERT INTO t_computo_usuario_responsable (id_usuario_responsable, expediente, apellido_paterno, apellido_materno,
+                                           nombre, empresa, puesto)
+VALUES (1, '123456', 'PEREZ', 'GARCIA', 'JUAN', 'TELMEX', 'TECNICO');
+INSERT INTO t_computo_detalles_generales (id_equipo_computo, inventario, equipo_pm, fecha_registro, tipo_equipo,
+                                          marca, modelo, procesador, numero_serie, disco_duro, memoria_ram,
+                                          id_ubicacion, id_usuario_responsable)
+VALUES (1, 'INV-001', 1, '2024-03-01', 'CPU', 'DELL', 'OPTIPLEX 7090', 'I7', 'SN1', '512 GB', '16 GB', 1, 1),
+       (2, 'INV-002', 1, '2024-03-01', 'MONITOR', 'DELL', 'P2419H', '', 'SN2', '', '', 1, 1);
+INSERT INTO t_computo_software (id_equipo_computo, sistema_operativo_instalado, etiqueta_sistema_operativo,
+                                office_instalado)
+VALUES (1, 'WINDOWS 11', 'SI', 'SI');
+INSERT INTO t_computo_identificacion (id_equipo_computo, tipo_uso, nombre_equipo_dominio, status, gerencia)
+VALUES (1, 'ADMINISTRATIVO', 'PC-001', 'ASIGNADO', 'REDES');
+INSERT INTO t_computo_observaciones (id_equipo_computo, observaciones) VALUES ('1', 'SIN DETALLES');
+INSERT INTO t_accesorios_equipos (id_accesorio, inventario, id_equipo_computo, fecha_registro, tipo_equipo, marca,
+                                  modelo, numero_serie)
+VALUES (1, NULL, 1, NULL, 'teclado', 'DELL', 'KB216', 'SN3');
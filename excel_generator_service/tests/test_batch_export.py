@@ -0,0 +1,26 @@
+from batch_export import _is_current, job_fingerprint
+
+
+def _entry(tmp_path, job):
+    (tmp_path / "out.xlsx").write_bytes(b"xlsx")
+    return {"fingerprint": job_fingerprint(job), "output": "out.xlsx"}
+
+
+def test_unchanged_job_is_current(tmp_path):
+    job = {"report": "jumpers", "items": [{"tipo": "LC-LC", "tamano": 3, "cantidad": 1}]}
+    assert _is_current(job, _entry(tmp_path, job), job_fingerprint(job), str(tmp_path))
+
+
+def test_changed_or_missing_output_is_not_current(tmp_path):
+    job = {"report": "jumpers", "items": [{"tipo": "LC-LC", "tamano": 3, "cantidad": 1}]}
+    entry = _entry(tmp_path, job)
+    changed = dict(job, items=[{"tipo": "LC-LC", "tamano": 3, "cantidad": 2}])
+    assert not _is_current(changed, entry, job_fingerprint(changed), str(tmp_path))
+    (tmp_path / "out.xlsx").unlink()
+    assert not _is_current(job, entry, job_fingerprint(job), str(tmp_path))
+
+
+def test_source_job_is_never_current(tmp_path):
+    # Las filas de Postgres pueden cambiar aunque el job sea el mismo
+    job = {"report": "computo", "source": {"table": "equipos_computo"}}
+    assert not _is_current(job, _entry(tmp_path, job), job_fingerprint(job), str(tmp_path))
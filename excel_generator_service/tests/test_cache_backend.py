@@ -0,0 +1,80 @@
+import time
+
+import pytest
+
+from benchmarks.fake_redis import FakeRedisServer
+from cache_backend import LocalBackend, RedisBackend
+
+
+@pytest.fixture(scope="module")
+def redis_server():
+    server = FakeRedisServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture(params=["local", "redis"])
+def backend(request):
+    if request.param == "local":
+        return LocalBackend(1024 * 1024)
+    redis = RedisBackend(request.getfixturevalue("redis_server").url)
+    redis.command("FLUSHDB")
+    return redis
+
+
+def test_get_set_delete(backend):
+    assert backend.get("a") is None
+    backend.set("a", b"uno")
+    assert backend.get("a") == b"uno"
+    backend.delete("a")
+    assert backend.get("a") is None
+
+
+def test_set_expires(backend):
+    backend.set("a", b"uno", 0.05)
+    assert backend.get("a") == b"uno"
+    time.sleep(0.1)
+    assert backend.get("a") is None
+
+
+def test_add_only_when_missing(backend):
+    assert backend.add("lock", b"primero", 1)
+    assert not backend.add("lock", b"segundo", 1)
+    assert backend.get("lock") == b"primero"
+
+
+def test_add_after_expiry(backend):
+    assert backend.add("lock", b"primero", 0.05)
+    time.sleep(0.1)
+    assert backend.add("lock", b"segundo", 1)
+
+
+def test_delete_if_only_own_value(backend):
+    backend.set("lock", b"mio", 1)
+    backend.delete_if("lock", b"ajeno")
+    assert backend.get("lock") == b"mio"
+    backend.delete_if("lock", b"mio")
+    assert backend.get("lock") is None
+
+
+def test_expire_if_only_own_value(backend):
+    backend.set("lock", b"mio", 0.05)
+    assert not backend.expire_if("lock", b"ajeno", 1)
+    assert backend.expire_if("lock", b"mio", 1)
+    time.sleep(0.1)
+    assert backend.get("lock") == b"mio"
+
+
+def test_redis_keys_use_prefix(redis_server):
+    RedisBackend(redis_server.url).set("a", b"uno")
+    assert RedisBackend(redis_server.url, prefix="otro:").get("a") is None
+
+
+def test_redis_unavailable_counts_errors_and_lock_fallbacks():
+    backend = RedisBackend("redis://127.0.0.1:1/0", timeout=0.2)
+    assert backend.get("a") is None
+    # Sin Redis el candado no coordina nada: el llamador genera por su cuenta
+    assert backend.add("lock", b"mio", 1)
+    snapshot = backend.snapshot()
+    assert snapshot["errors"] == 1
+    assert snapshot["lock_fallbacks"] == 1
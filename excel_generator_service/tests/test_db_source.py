@@ -0,0 +1,100 @@
+import csv
+import io
+
+import openpyxl
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from db_source import InvalidSourceSpec, QuerySpec, build_query
+
+
+def test_build_query_binds_every_value():
+    spec = QuerySpec.from_payload({"filters": {"marca": "HUAWEI", "en_stock": ["SI", "NO"]}, "limit": 50})
+    sql, args = build_query("sicor", spec, max_rows=1000)
+    assert "t.marca = $1" in sql
+    assert "t.en_stock = ANY($2::text[])" in sql
+    assert sql.rstrip().endswith("LIMIT $3")
+    assert args == ["HUAWEI", ["SI", "NO"], 50]
+    assert "HUAWEI" not in sql
+
+
+def test_build_query_caps_limit_and_filters_years():
+    spec = QuerySpec.from_payload({"years": [2024, "2025"], "limit": 5000})
+    sql, args = build_query("bitacora", spec, max_rows=1000)
+    assert "left(b.fecha, 4) = ANY($1::text[])" in sql
+    assert args == [["2024", "2025"], 1000]
+
+
+def test_build_query_requires_inventory_for_jumpers():
+    sql, args = build_query("jumpers", QuerySpec(inventory_id="inv-1"), max_rows=10)
+    assert "s.id = $1" in sql and args == ["inv-1", 10]
+    with pytest.raises(InvalidSourceSpec, match="inventory_id"):
+        build_query("jumpers", QuerySpec(), max_rows=10)
+
+
+@pytest.mark.parametrize("report, spec, message", [
+    ("sdr", QuerySpec(), "not supported"),
+    ("sicor", QuerySpec(filters={"serie; DROP TABLE t_tarjetas_red": "x"}), "not allowed"),
+    ("sicor", QuerySpec(years=(2024,)), "years"),
+])
+def test_build_query_rejects_outside_whitelist(report, spec, message):
+    with pytest.raises(InvalidSourceSpec, match=message):
+        build_query(report, spec, max_rows=10)
+
+
+@pytest.mark.parametrize("source", ["x", {"filters": ["marca"]}, {"years": ["dos mil"]}])
+def test_invalid_source_spec(source):
+    with pytest.raises(InvalidSourceSpec):
+        QuerySpec.from_payload(source)
+
+
+class _BatchSource:
+    """Origen falso: entrega lotes fijos y registra si se cerró el iterador"""
+
+    max_rows = 1000
+
+    def __init__(self, batches):
+        self.batches = batches
+        self.closed = False
+        self.fetched = 0
+
+    async def iter_batches(self, report, spec):
+        try:
+            for batch in self.batches:
+                self.fetched += 1
+                yield batch
+        finally:
+            self.closed = True
+
+
+def _sicor(numero):
+    return {"en_stock": "SI", "numero": numero, "codigo": "030001", "serie": f"S{numero}", "marca": "HUAWEI",
+            "posicion": "A1", "comentarios": ""}
+
+
+def test_fast_format_streams_source_batches(monkeypatch):
+    source = _BatchSource([[_sicor(1), _sicor(2)], [_sicor(3)]])
+    monkeypatch.setattr(main, "DB_SOURCE", source)
+    response = TestClient(main.app).post("/api/generate-sicor-excel?format=csv", json={"source": {}})
+    assert response.status_code == 200
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert [row[1] for row in rows[1:]] == ["1", "2", "3"]
+    assert source.fetched == 2 and source.closed
+
+
+def test_empty_source_is_not_found(monkeypatch):
+    monkeypatch.setattr(main, "DB_SOURCE", _BatchSource([]))
+    response = TestClient(main.app).post("/api/generate-sicor-excel?format=csv", json={"source": {}})
+    assert response.status_code == 404
+
+
+def test_raw_xlsx_from_source_batches(monkeypatch):
+    source = _BatchSource([[_sicor(i) for i in range(1, 4)], [_sicor(4)]])
+    monkeypatch.setattr(main, "DB_SOURCE", source)
+    response = TestClient(main.app).post("/api/generate-sicor-excel?format=xlsx-raw&strings=auto",
+                                         json={"source": {}})
+    assert response.status_code == 200
+    ws = openpyxl.load_workbook(io.BytesIO(response.content)).active
+    assert [row[1] for row in ws.iter_rows(min_row=2, values_only=True)] == [1, 2, 3, 4]
+    assert source.closed
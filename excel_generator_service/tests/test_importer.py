@@ -0,0 +1,23 @@
+import json
+
+from fastapi.testclient import TestClient
+
+import main
+
+
+def _round_trip(items):
+    client = TestClient(main.app)
+    exported = client.post("/api/generate-jumpers-excel", json={"items": items})
+    assert exported.status_code == 200
+    imported = client.post("/api/import/jumpers", content=exported.content,
+                           headers={"Content-Type": "application/octet-stream"})
+    assert imported.status_code == 200
+    return [json.loads(line) for line in imported.text.splitlines() if line]
+
+
+def test_jumper_locations_are_always_lists():
+    items = _round_trip([
+        {"tipo": "LC-LC", "tamano": 3, "cantidad": 2, "contenedores": [{"rack": "1", "contenedor": "C8"}]},
+        {"tipo": "SC-SC", "tamano": 5, "cantidad": 1},
+    ])
+    assert [item["contenedores"] for item in items] == [[{"rack": "1", "contenedor": "C8"}], []]
@@ -0,0 +1,79 @@
+import hashlib
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from payload_precheck import PAYLOAD_CACHE_HEADER, PAYLOAD_HASH_HEADER, PayloadStore
+
+URL = "/api/generate-jumpers-excel"
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+def _body() -> bytes:
+    payload = {"items": [{"tipo": "LC-LC", "tamano": 3, "cantidad": 2, "rack": "1", "contenedor": "A"}]}
+    return json.dumps(payload, sort_keys=True).encode("utf-8")
+
+
+def _headers(body: bytes):
+    return {PAYLOAD_HASH_HEADER: hashlib.sha256(body).hexdigest(), "Content-Type": "application/json"}
+
+
+@pytest.fixture
+def payloads(monkeypatch):
+    store = PayloadStore(max_bytes=16 * 1024 * 1024, payload_ttl=60, result_ttl=60)
+    monkeypatch.setattr(main, "PAYLOADS", store)
+    return store
+
+
+def test_precheck_upload_then_result_hit(client, payloads):
+    body = _body()
+
+    response = client.post(URL, headers=_headers(body))
+    assert response.status_code == 428
+    assert response.json()["upload"] is True
+
+    uploaded = client.post(URL, headers=_headers(body), content=body)
+    assert uploaded.status_code == 200
+    assert uploaded.headers[PAYLOAD_CACHE_HEADER] == "upload"
+
+    cached = client.post(URL, headers=_headers(body))
+    assert cached.status_code == 200
+    assert cached.headers[PAYLOAD_CACHE_HEADER] == "result"
+    assert cached.content == uploaded.content
+
+    snapshot = payloads.snapshot()
+    assert (snapshot["uploads_required"], snapshot["uploads"], snapshot["result_hits"]) == (1, 1, 1)
+
+
+def test_precheck_uses_stored_payload_for_other_parameters(client, payloads):
+    body = _body()
+    client.post(URL, headers=_headers(body), content=body)
+
+    # Otro endpoint/parámetros: no hay resultado, pero el payload ya está en el servicio
+    response = client.post(URL + "?format=csv", headers=_headers(body))
+    assert response.status_code == 200
+    assert response.headers[PAYLOAD_CACHE_HEADER] == "payload"
+
+
+def test_body_not_matching_hash_is_rejected(client, payloads):
+    response = client.post(URL, headers=_headers(b"{}"), content=_body())
+    assert response.status_code == 400
+    assert payloads.mismatches == 1
+
+
+def test_disabled_store_requires_upload(client, monkeypatch):
+    monkeypatch.setattr(main, "PAYLOADS", PayloadStore(max_bytes=0, payload_ttl=60, result_ttl=60))
+    body = _body()
+
+    response = client.post(URL, headers=_headers(body))
+    assert response.status_code == 428
+
+    uploaded = client.post(URL, headers=_headers(body), content=body)
+    assert uploaded.status_code == 200
+    assert PAYLOAD_CACHE_HEADER not in uploaded.headers
@@ -0,0 +1,72 @@
+"""Consultas de ``source`` contra un Postgres real cargado con ``postgres_fixture.sql``.
+
+Se omiten si no hay ``asyncpg`` o ``EXCEL_TEST_DATABASE_URL`` (una base de datos
+desechable: el fixture borra y vuelve a crear las tablas).
+"""
+import asyncio
+import os
+
+import pytest
+
+from db_source import PostgresSource, QuerySpec
+
+asyncpg = pytest.importorskip("asyncpg")
+DATABASE_URL = os.environ.get("EXCEL_TEST_DATABASE_URL")
+pytestmark = pytest.mark.skipif(not DATABASE_URL, reason="EXCEL_TEST_DATABASE_URL is not set")
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "postgres_fixture.sql")
+
+
+@pytest.fixture(scope="module")
+def source():
+    async def load():
+        conn = await asyncpg.connect(DATABASE_URL)
+        try:
+            with open(FIXTURE, encoding="utf-8") as f:
+                await conn.execute(f.read())
+        finally:
+            await conn.close()
+
+    asyncio.run(load())
+    return PostgresSource(DATABASE_URL, min_size=1, max_size=2, max_rows=1000)
+
+
+def _run(source, coroutine_fn):
+    async def run():
+        try:
+            return await coroutine_fn()
+        finally:
+            await source.close()
+    return asyncio.run(run())
+
+
+def test_sicor_filters_are_bound(source):
+    items = _run(source, lambda: source.fetch_items("sicor", QuerySpec(filters={"marca": "HUAWEI"})))
+    assert [item["numero"] for item in items] == ["2", "4"]
+    assert all(item["comentarios"] == "" for item in items)
+
+
+def test_batches_cover_every_row(source, monkeypatch):
+    monkeypatch.setattr("db_source.CURSOR_PREFETCH", 2)
+
+    async def collect():
+        return [len(batch) async for batch in source.iter_batches("sicor", QuerySpec())]
+
+    assert _run(source, collect) == [2, 2, 1]
+
+
+def test_bitacora_years(source):
+    years = _run(source, lambda: source.fetch_years_data(QuerySpec(years=(2024,))))
+    assert [(entry["year"], len(entry["items"])) for entry in years] == [(2024, 3)]
+
+
+def test_jumpers_session_quantities_and_locations(source):
+    items = _run(source, lambda: source.fetch_items("jumpers", QuerySpec(inventory_id="sesion-1")))
+    assert [(item["tamano"], item["cantidad"]) for item in items] == [(3, 6), (5, 7), (10, 1)]
+    assert {entry["contenedor"] for entry in items[2]["contenedores"]} == {"C8", "C9"}
+
+
+def test_computo_accessories_share_the_group(source):
+    items = _run(source, lambda: source.fetch_items("computo", QuerySpec()))
+    assert [(item["id"], item["tipo_equipo"]) for item in items] == [(1, "CPU"), (1, "TECLADO"), (2, "MONITOR")]
+    assert {item["equipo_pm"] for item in items} == {"PM-001"}
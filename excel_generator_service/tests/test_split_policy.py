@@ -0,0 +1,46 @@
+import pytest
+
+from split_policy import EXCEL_MAX_ROWS, MODE_SHEETS, MODE_SINGLE, MODE_WORKBOOKS, SplitPolicy
+
+ITEMS = [{"tipo": "LC-LC", "tamano": 3, "cantidad": i} for i in range(100)]
+
+
+def test_defaults_split_only_by_rows(monkeypatch):
+    monkeypatch.delenv("EXCEL_SPLIT_MAX_BYTES_PER_FILE", raising=False)
+    monkeypatch.delenv("EXCEL_SPLIT_MAX_ROWS_PER_SHEET", raising=False)
+    policy = SplitPolicy.from_payload({}, 5)
+    assert policy.max_bytes_per_file == 0
+    assert policy.max_rows_per_sheet == EXCEL_MAX_ROWS - 4
+    assert policy.plan(ITEMS).mode == MODE_SINGLE
+
+
+def test_rows_per_sheet():
+    plan = SplitPolicy.from_payload({"split": {"max_rows_per_sheet": 40}}, 5).plan(ITEMS)
+    assert plan.mode == MODE_SHEETS
+    assert [len(chunk) for chunk in plan.chunks] == [40, 40, 20]
+
+
+def test_bytes_per_file_is_opt_in():
+    plan = SplitPolicy.from_payload({"split": {"max_bytes_per_file": 200}}, 5).plan(ITEMS)
+    assert plan.mode == MODE_WORKBOOKS
+    assert len(plan.chunks) > 1
+    assert sum(len(chunk) for chunk in plan.chunks) == len(ITEMS)
+
+
+@pytest.mark.parametrize("split", [
+    "sheets",
+    {"max_rows_per_sheet": "x"},
+    {"max_rows_per_sheet": 0},
+    {"max_bytes_per_file": -1},
+    {"max_bytes_per_file": True},
+    {"mode": "zip"},
+    {"max_rows": 10},
+])
+def test_invalid_split_is_rejected(split):
+    with pytest.raises(ValueError):
+        SplitPolicy.from_payload({"split": split}, 5)
+
+
+def test_invalid_rows_do_not_drop_valid_bytes():
+    with pytest.raises(ValueError, match="max_rows_per_sheet"):
+        SplitPolicy.from_payload({"split": {"max_rows_per_sheet": "x", "max_bytes_per_file": 1000}}, 5)
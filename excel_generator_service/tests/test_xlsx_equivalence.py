@@ -0,0 +1,33 @@
+import io
+
+import openpyxl
+from openpyxl.styles import Font
+
+from xlsx_equivalence import compare_workbooks
+
+
+def _workbook(value="EQUIPO", bold=True) -> bytes:
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Inventario"
+    ws["A1"] = value
+    ws["A1"].font = Font(bold=bold)
+    ws["B2"] = 42
+    ws.merge_cells("C1:D1")
+    ws.column_dimensions["A"].width = 18
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def test_same_content_is_equivalent():
+    comparison = compare_workbooks(_workbook(), _workbook())
+    assert comparison.equivalent
+    assert comparison.report() == "equivalentes"
+
+
+def test_different_value_and_style_are_reported():
+    comparison = compare_workbooks(_workbook(), _workbook(value="MONITOR", bold=False))
+    assert not comparison.equivalent
+    assert comparison.total == 2
+    assert {(d.where, d.aspect) for d in comparison.differences} == {("A1", "value"), ("A1", "font")}
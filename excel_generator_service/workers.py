@@ -0,0 +1,40 @@
+"""Pool de procesos compartido para construir libros en paralelo.
+
+openpyxl es CPU-bound y no libera el GIL, así que las partes que se pueden
+construir de forma independiente (libros de una exportación dividida, hojas
+por año de la bitácora) se reparten entre procesos.
+"""
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+_POOL: Optional[ProcessPoolExecutor] = None
+
+
+def worker_count() -> int:
+    try:
+        return max(1, int(os.environ.get("EXCEL_WORKER_PROCESSES", os.cpu_count() or 1)))
+    except (TypeError, ValueError):
+        return os.cpu_count() or 1
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Crea el pool la primera vez que se necesita (no al importar el módulo)."""
+    global _POOL
+    if _POOL is None:
+        _POOL = ProcessPoolExecutor(max_workers=worker_count())
+    return _POOL
+
+
+def run_in_process(fn, *args) -> "asyncio.Future":
+    """Ejecuta ``fn(*args)`` en el pool y devuelve un futuro awaitable."""
+    loop = asyncio.get_running_loop()
+    return loop.run_in_executor(get_process_pool(), fn, *args)
+
+
+def shutdown_process_pool():
+    global _POOL
+    if _POOL is not None:
+        _POOL.shutdown(wait=False, cancel_futures=True)
+        _POOL = None
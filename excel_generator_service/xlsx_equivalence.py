@@ -0,0 +1,261 @@
+"""Comparación semántica de dos libros .xlsx (para validar motores de generación más rápidos).
+
+Dos libros son equivalentes si Excel los muestra igual, aunque el XML sea
+distinto (índices de estilo, cadenas en línea o compartidas, orden de los
+atributos...). Se comparan:
+
+- orden y nombre de las hojas, paneles inmovilizados;
+- valor de cada celda y su estilo ya resuelto (fuente, relleno, bordes,
+  alineación, formato de número y protección);
+- rangos combinados, anchos de columna y altos de fila;
+- formatos condicionales (rango, tipo, operador, fórmulas y estilo diferencial).
+
+Los atributos en falso, cero o vacío equivalen a no declararlos (openpyxl omite
+``wrapText="0"`` al guardar, por ejemplo). Una celda con ``""`` equivale a una
+celda sin valor, y en las celdas sin valor sólo se comparan bordes y relleno:
+la fuente, la alineación o el formato de número no se ven si no hay nada escrito.
+
+Uso:
+    python xlsx_equivalence.py esperado.xlsx generado.xlsx
+"""
+import io
+import sys
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+import openpyxl
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.descriptors.serialisable import Serialisable
+from openpyxl.styles import PatternFill
+from openpyxl.styles.colors import Color
+from openpyxl.styles.numbers import BUILTIN_FORMATS, BUILTIN_FORMATS_MAX_SIZE
+from openpyxl.utils import get_column_letter
+from openpyxl.workbook import Workbook
+
+# Diferencias que se reportan como máximo (el resto sólo se cuenta)
+MAX_DIFFERENCES = 200
+
+# Lo único del estilo que se ve en una celda vacía
+EMPTY_CELL_ASPECTS = ("border", "fill")
+
+WorkbookSource = Union[bytes, str, Workbook]
+
+
+@dataclass(frozen=True)
+class Difference:
+    sheet: str
+    where: str
+    aspect: str
+    expected: Any
+    actual: Any
+
+    def __str__(self) -> str:
+        return f"[{self.sheet}] {self.where} {self.aspect}: esperado {self.expected!r}, obtenido {self.actual!r}"
+
+
+# Valores que equivalen a no declarar el atributo
+_DEFAULTS = {
+    ("Alignment", "horizontal"): "general",
+    ("Alignment", "vertical"): "bottom",
+    ("Protection", "locked"): True,
+}
+
+
+def _normalize(value: Any) -> Any:
+    """Valor comparable de un objeto de estilo de openpyxl: (clase, (campo, valor)...) sólo con los
+    campos declarados; falso, cero, vacío y los valores por defecto cuentan como no declarados"""
+    if isinstance(value, Color):
+        return ("Color", ("type", value.type), ("value", value.value)) + ((("tint", value.tint),) if value.tint else ())
+    if isinstance(value, PatternFill) and value.patternType is None:
+        # Sin patrón los colores no se muestran
+        return ("PatternFill",)
+    if isinstance(value, Serialisable):
+        name = type(value).__name__
+        fields = tuple(getattr(value, "__attrs__", ())) + tuple(getattr(value, "__elements__", ()))
+        normalized = ((field, _normalize(getattr(value, field, None))) for field in fields)
+        return (name,) + tuple((field, item) for field, item in normalized
+                               if item is not None and _DEFAULTS.get((name, field)) != item)
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(item) for item in value) or None
+    if value is False or value == "" or (isinstance(value, (int, float)) and value == 0):
+        return None
+    return value
+
+
+def _changed_fields(expected: Any, actual: Any) -> Tuple[Any, Any]:
+    """Sólo los campos que cambiaron entre dos estilos normalizados de la misma clase"""
+    if not (isinstance(expected, tuple) and isinstance(actual, tuple) and expected[:1] == actual[:1]):
+        return expected, actual
+    before, after = dict(expected[1:]), dict(actual[1:])
+    keys = [key for key in dict.fromkeys(list(before) + list(after)) if before.get(key) != after.get(key)]
+    return {key: before.get(key) for key in keys}, {key: after.get(key) for key in keys}
+
+
+class _StyleResolver:
+    """Estilo resuelto de las celdas de un libro, memoizado por su arreglo de índices de estilo"""
+
+    def __init__(self, wb: Workbook):
+        self.wb = wb
+        self._cache: Dict[Tuple[int, ...], Dict[str, Any]] = {}
+        # Una celda que no existe tiene el estilo 0 del libro
+        self.default = self.resolve(wb._cell_styles[0] if len(wb._cell_styles) else StyleArray())
+
+    def resolve(self, style: StyleArray) -> Dict[str, Any]:
+        key = tuple(style)
+        resolved = self._cache.get(key)
+        if resolved is None:
+            wb = self.wb
+            if style.numFmtId < BUILTIN_FORMATS_MAX_SIZE:
+                number_format = BUILTIN_FORMATS.get(style.numFmtId, "General")
+            else:
+                number_format = wb._number_formats[style.numFmtId - BUILTIN_FORMATS_MAX_SIZE]
+            resolved = self._cache[key] = {
+                "font": _normalize(wb._fonts[style.fontId]), "fill": _normalize(wb._fills[style.fillId]),
+                "border": _normalize(wb._borders[style.borderId]),
+                "alignment": _normalize(wb._alignments[style.alignmentId]),
+                "number_format": number_format, "protection": _normalize(wb._protections[style.protectionId]),
+            }
+        return resolved
+
+    def __call__(self, cell) -> Dict[str, Any]:
+        return self.resolve(cell._style) if cell is not None and cell._style else self.default
+
+
+def load(source: WorkbookSource) -> Workbook:
+    if isinstance(source, Workbook):
+        return source
+    if isinstance(source, bytes):
+        return openpyxl.load_workbook(io.BytesIO(source))
+    return openpyxl.load_workbook(source)
+
+
+def _column_widths(ws) -> Dict[str, float]:
+    widths = {}
+    for dim in ws.column_dimensions.values():
+        if not dim.customWidth or dim.width is None:
+            continue
+        for col in range((dim.min or 1), (dim.max or dim.min or 1) + 1):
+            widths[get_column_letter(col)] = round(dim.width, 4)
+    return widths
+
+
+def _row_heights(ws) -> Dict[int, float]:
+    return {row: round(dim.ht, 4) for row, dim in ws.row_dimensions.items() if dim.ht is not None}
+
+
+def _conditional_formats(ws) -> List[Tuple[Any, ...]]:
+    rules = []
+    for cf in ws.conditional_formatting:
+        for position, rule in enumerate(cf.rules):
+            rules.append((str(cf.sqref), position, rule.type, rule.operator, tuple(rule.formula or ()),
+                          bool(rule.stopIfTrue), _normalize(rule.dxf), _normalize(rule.colorScale),
+                          _normalize(rule.dataBar), _normalize(rule.iconSet), rule.text))
+    return sorted(rules, key=repr)
+
+
+def _compare_dict(sheet: str, aspect: str, expected: Dict[Any, Any], actual: Dict[Any, Any]) -> Iterator[Difference]:
+    for key in sorted(set(expected) | set(actual), key=lambda k: (len(str(k)), str(k))):
+        if expected.get(key) != actual.get(key):
+            yield Difference(sheet, str(key), aspect, expected.get(key), actual.get(key))
+
+
+def _compare_sheet(expected_ws, actual_ws, resolve_expected: _StyleResolver,
+                   resolve_actual: _StyleResolver) -> Iterator[Difference]:
+    sheet = expected_ws.title
+    if expected_ws.freeze_panes != actual_ws.freeze_panes:
+        yield Difference(sheet, "-", "freeze_panes", expected_ws.freeze_panes, actual_ws.freeze_panes)
+
+    expected_merged = {str(r) for r in expected_ws.merged_cells.ranges}
+    actual_merged = {str(r) for r in actual_ws.merged_cells.ranges}
+    for ref in sorted(expected_merged - actual_merged):
+        yield Difference(sheet, ref, "merged", "combinado", None)
+    for ref in sorted(actual_merged - expected_merged):
+        yield Difference(sheet, ref, "merged", None, "combinado")
+
+    yield from _compare_dict(sheet, "column_width", _column_widths(expected_ws), _column_widths(actual_ws))
+    yield from _compare_dict(sheet, "row_height", _row_heights(expected_ws), _row_heights(actual_ws))
+
+    expected_cf, actual_cf = _conditional_formats(expected_ws), _conditional_formats(actual_ws)
+    for rule in expected_cf:
+        if rule not in actual_cf:
+            yield Difference(sheet, rule[0], "conditional_format", rule[2:5], None)
+    for rule in actual_cf:
+        if rule not in expected_cf:
+            yield Difference(sheet, rule[0], "conditional_format", None, rule[2:5])
+
+    expected_cells, actual_cells = expected_ws._cells, actual_ws._cells
+    for position in sorted(set(expected_cells) | set(actual_cells)):
+        expected_cell, actual_cell = expected_cells.get(position), actual_cells.get(position)
+        where = f"{get_column_letter(position[1])}{position[0]}"
+        expected_value = expected_cell.value if expected_cell is not None else None
+        actual_value = actual_cell.value if actual_cell is not None else None
+        if expected_value == "":
+            expected_value = None
+        if actual_value == "":
+            actual_value = None
+        if expected_value != actual_value:
+            yield Difference(sheet, where, "value", expected_value, actual_value)
+        expected_style, actual_style = resolve_expected(expected_cell), resolve_actual(actual_cell)
+        if expected_style is actual_style:
+            continue
+        aspects = expected_style if expected_value is not None or actual_value is not None else EMPTY_CELL_ASPECTS
+        for aspect in aspects:
+            value = expected_style[aspect]
+            if actual_style[aspect] != value:
+                yield Difference(sheet, where, aspect, *_changed_fields(value, actual_style[aspect]))
+
+
+def iter_differences(expected: WorkbookSource, actual: WorkbookSource) -> Iterator[Difference]:
+    """Diferencias semánticas de ``actual`` respecto de ``expected``"""
+    expected_wb, actual_wb = load(expected), load(actual)
+    expected_titles, actual_titles = expected_wb.sheetnames, actual_wb.sheetnames
+    if expected_titles != actual_titles:
+        yield Difference("-", "-", "sheet_order", expected_titles, actual_titles)
+
+    resolve_expected, resolve_actual = _StyleResolver(expected_wb), _StyleResolver(actual_wb)
+    for title in expected_titles:
+        if title in actual_titles:
+            yield from _compare_sheet(expected_wb[title], actual_wb[title], resolve_expected, resolve_actual)
+
+
+@dataclass
+class Comparison:
+    differences: List[Difference]
+    total: int
+
+    @property
+    def equivalent(self) -> bool:
+        return self.total == 0
+
+    def report(self) -> str:
+        """Diferencias legibles, una por línea, con un resumen por aspecto"""
+        if self.equivalent:
+            return "equivalentes"
+        counts: Dict[str, int] = {}
+        for difference in self.differences:
+            counts[difference.aspect] = counts.get(difference.aspect, 0) + 1
+        lines = [str(difference) for difference in self.differences]
+        if self.total > len(self.differences):
+            lines.append(f"... y {self.total - len(self.differences)} diferencias más")
+        lines.append(f"{self.total} diferencias (mostradas por aspecto: "
+                     + ", ".join(f"{aspect} {count}" for aspect, count in sorted(counts.items())) + ")")
+        return "\n".join(lines)
+
+
+def compare_workbooks(expected: WorkbookSource, actual: WorkbookSource,
+                      max_differences: Optional[int] = MAX_DIFFERENCES) -> Comparison:
+    differences, total = [], 0
+    for difference in iter_differences(expected, actual):
+        total += 1
+        if max_differences is None or len(differences) < max_differences:
+            differences.append(difference)
+    return Comparison(differences, total)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(__doc__.strip().splitlines()[-1].strip())
+        sys.exit(2)
+    comparison = compare_workbooks(sys.argv[1], sys.argv[2])
+    print(comparison.report())
+    sys.exit(0 if comparison.equivalent else 1)
@@ -0,0 +1,291 @@
+"""Utilidades para manipular el paquete .xlsx (ZIP + XML) sin pasar por openpyxl.
+
+Permiten extraer las hojas de un libro ya generado como XML autocontenido
+(cadenas en línea en lugar de sharedStrings) y volver a ensamblar un libro con
+varias hojas a partir de esas partes, reutilizando estilos, tema y demás
+miembros del paquete base.
+
+Todo lo que se escribe aquí es reproducible: los miembros del ZIP llevan fecha
+y atributos fijos y ``docProps/core.xml`` no guarda la hora de generación, así
+que los mismos datos dan los mismos bytes (la única fecha es la visible en los
+encabezados de las hojas).
+"""
+import io
+import re
+import struct
+import zipfile
+import zlib
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+from xml.sax.saxutils import escape
+
+from string_table import (SAMPLE_SIZE, SST_CONTENT_TYPE, SST_RELATIONSHIP, STRINGS_INLINE, SharedStringTable,
+                          shared_columns)
+
+NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL_WORKSHEET = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"
+REL_SHARED_STRINGS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings"
+CT_WORKSHEET = "application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"
+
+_SHARED_CELL = re.compile(r'<c ([^>]*?)t="s"([^>]*)><v>(\d+)</v></c>')
+_SHEETS_BLOCK = re.compile(r'<sheets>.*?</sheets>', re.S)
+_SHEET_ENTRY = re.compile(r'<sheet [^>]*?name="([^"]*)"[^>]*?r:id="([^"]*)"[^>]*/>')
+_RELATIONSHIP = re.compile(r'<Relationship [^>]*?/>')
+_OVERRIDE = re.compile(r'<Override [^>]*?/>')
+_INLINE_CELL = re.compile(r'<c r="([A-Z]+)(\d+)"([^>]*?) t="inlineStr"([^>]*)><is><t(?: [^>]*)?>([^<]*)</t></is></c>')
+
+# Miembros que se reconstruyen al ensamblar
+_REBUILT = ("[Content_Types].xml", "xl/workbook.xml", "xl/_rels/workbook.xml.rels", "xl/sharedStrings.xml")
+
+# Fecha de todos los miembros del ZIP (la mínima que admite el formato) y de creación/modificación en docProps
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+DOC_PROPS_DATE = "1980-01-01T00:00:00Z"
+CORE_PROPERTIES = "docProps/core.xml"
+_DOC_PROPS_DATES = re.compile(r'(<dcterms:(created|modified)\b[^>]*>)[^<]*(</dcterms:\2>)')
+# Atributos de un archivo normal creado en Unix, como los que pone zipfile en Linux
+_CREATE_SYSTEM = 3
+_EXTERNAL_ATTR = 0o600 << 16
+_LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+
+
+def zip_entry(name: str, compress_type: int = zipfile.ZIP_DEFLATED,
+              compresslevel: Optional[int] = None) -> zipfile.ZipInfo:
+    """``ZipInfo`` con fecha y atributos fijos para ``writestr``/``open``: no dependen de la hora ni del sistema"""
+    info = zipfile.ZipInfo(name, date_time=ZIP_DATE_TIME)
+    info.compress_type = compress_type
+    info._compresslevel = compresslevel
+    info.create_system = _CREATE_SYSTEM
+    info.external_attr = _EXTERNAL_ATTR
+    return info
+
+
+def pin_doc_props(core_xml: bytes) -> bytes:
+    """``docProps/core.xml`` con fechas de creación y modificación fijas"""
+    return _DOC_PROPS_DATES.sub(lambda m: f"{m.group(1)}{DOC_PROPS_DATE}{m.group(3)}",
+                                core_xml.decode("utf-8")).encode("utf-8")
+
+
+@dataclass
+class ZipMember:
+    """Miembro de un paquete con los datos ya comprimidos"""
+    name: bytes
+    crc: int
+    size: int
+    compressed: bytes
+    compress_type: int = zipfile.ZIP_DEFLATED
+
+
+def deflated_member(name: bytes, data: bytes, level: int = 6) -> ZipMember:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return ZipMember(name, zlib.crc32(data), len(data), compressor.compress(data) + compressor.flush())
+
+
+def _dos_datetime(date_time: Tuple[int, int, int, int, int, int]) -> Tuple[int, int]:
+    year, month, day, hour, minute, second = date_time
+    return (hour << 11) | (minute << 5) | (second // 2), ((year - 1980) << 9) | (month << 5) | day
+
+
+def write_zip(members: Sequence[ZipMember]) -> bytes:
+    """ZIP con miembros ya comprimidos y fecha fija; equivalente a lo que escribe ``zipfile``"""
+    out = io.BytesIO()
+    central = []
+    dos_time, dos_date = _dos_datetime(ZIP_DATE_TIME)
+    for member in members:
+        offset = out.tell()
+        # Bit 11: nombre en UTF-8
+        flags = 0 if member.name.isascii() else 0x800
+        out.write(_LOCAL_HEADER.pack(0x04034B50, 20, flags, member.compress_type, dos_time, dos_date,
+                                     member.crc, len(member.compressed), member.size, len(member.name), 0))
+        out.write(member.name)
+        out.write(member.compressed)
+        central.append(struct.pack("<IHHHHHHIIIHHHHHII", 0x02014B50, (_CREATE_SYSTEM << 8) | 20, 20, flags,
+                                   member.compress_type, dos_time, dos_date, member.crc, len(member.compressed),
+                                   member.size, len(member.name), 0, 0, 0, 0, _EXTERNAL_ATTR, offset) + member.name)
+    directory_offset = out.tell()
+    directory = b"".join(central)
+    out.write(directory)
+    out.write(struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, len(members), len(members), len(directory),
+                          directory_offset, 0))
+    return out.getvalue()
+
+
+def _member_order(member: ZipMember) -> Tuple[bool, bytes]:
+    # [Content_Types].xml primero, como lo escriben Excel y openpyxl; el resto por nombre
+    return member.name != b"[Content_Types].xml", member.name
+
+
+def reproducible_package(package_bytes: bytes) -> bytes:
+    """El paquete con fecha fija en cada miembro, miembros ordenados por nombre y ``docProps/core.xml``
+    sin la hora de guardado. Los datos comprimidos se copian sin descomprimir."""
+    members = []
+    view = memoryview(package_bytes)
+    with zipfile.ZipFile(io.BytesIO(package_bytes)) as package:
+        for info in package.infolist():
+            name = info.filename.encode("utf-8")
+            if info.filename == CORE_PROPERTIES:
+                members.append(deflated_member(name, pin_doc_props(package.read(info.filename))))
+                continue
+            fields = _LOCAL_HEADER.unpack_from(view, info.header_offset)
+            start = info.header_offset + _LOCAL_HEADER.size + fields[9] + fields[10]
+            members.append(ZipMember(name, info.CRC, info.file_size,
+                                     bytes(view[start:start + info.compress_size]), info.compress_type))
+    members.sort(key=_member_order)
+    return write_zip(members)
+
+
+def _shared_strings(package: zipfile.ZipFile) -> List[str]:
+    try:
+        root = ET.fromstring(package.read("xl/sharedStrings.xml"))
+    except KeyError:
+        return []
+    strings = []
+    for si in root.findall(f"{{{NS_MAIN}}}si"):
+        strings.append("".join(t.text or "" for t in si.iter(f"{{{NS_MAIN}}}t")))
+    return strings
+
+
+def _inline_shared_strings(sheet_xml: str, strings: List[str]) -> str:
+    def replace(match):
+        text = escape(strings[int(match.group(3))])
+        return f'<c {match.group(1)}t="inlineStr"{match.group(2)}><is><t xml:space="preserve">{text}</t></is></c>'
+    return _SHARED_CELL.sub(replace, sheet_xml)
+
+
+def workbook_sheets(package: zipfile.ZipFile) -> List[Tuple[str, str]]:
+    """Lista (nombre, ruta del XML) de las hojas en el orden del libro"""
+    rels = package.read("xl/_rels/workbook.xml.rels").decode("utf-8")
+    targets = {}
+    for rel in _RELATIONSHIP.findall(rels):
+        rel_id = re.search(r'Id="([^"]*)"', rel).group(1)
+        target = re.search(r'Target="([^"]*)"', rel).group(1)
+        targets[rel_id] = target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+    workbook = package.read("xl/workbook.xml").decode("utf-8")
+    return [(name, targets[rel_id]) for name, rel_id in _SHEET_ENTRY.findall(workbook)]
+
+
+def styles_signature(package_bytes: bytes) -> bytes:
+    """Contenido de styles.xml: dos partes sólo se pueden combinar si comparten estilos"""
+    with zipfile.ZipFile(io.BytesIO(package_bytes)) as package:
+        return package.read("xl/styles.xml")
+
+
+def extract_sheets(package_bytes: bytes) -> List[Tuple[str, bytes]]:
+    """Hojas del libro como (nombre, XML con cadenas en línea), listas para otro paquete"""
+    with zipfile.ZipFile(io.BytesIO(package_bytes)) as package:
+        strings = _shared_strings(package)
+        sheets = []
+        for name, path in workbook_sheets(package):
+            xml = package.read(path).decode("utf-8")
+            xml = _inline_shared_strings(xml, strings).replace(' tabSelected="1"', "")
+            sheets.append((name, xml.encode("utf-8")))
+        return sheets
+
+
+def assemble_workbook(base_package: bytes, sheets: List[Tuple[str, bytes]]) -> bytes:
+    """Arma un libro con ``sheets`` usando estilos, tema y propiedades de ``base_package``"""
+    output = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(base_package)) as base, \
+            zipfile.ZipFile(output, mode="w", compression=zipfile.ZIP_DEFLATED) as out:
+        old_sheet_paths = {path for _, path in workbook_sheets(base)}
+
+        content_types = base.read("[Content_Types].xml").decode("utf-8")
+        overrides = "".join(
+            o for o in _OVERRIDE.findall(content_types)
+            if CT_WORKSHEET not in o and "sharedStrings" not in o
+        )
+        overrides += "".join(
+            f'<Override PartName="/xl/worksheets/sheet{n}.xml" ContentType="{CT_WORKSHEET}"/>'
+            for n in range(1, len(sheets) + 1)
+        )
+        content_types = _OVERRIDE.sub("", content_types).replace("</Types>", overrides + "</Types>")
+        out.writestr(zip_entry("[Content_Types].xml"), content_types)
+
+        rels = base.read("xl/_rels/workbook.xml.rels").decode("utf-8")
+        kept = "".join(r for r in _RELATIONSHIP.findall(rels)
+                       if REL_WORKSHEET not in r and REL_SHARED_STRINGS not in r)
+        sheet_rels = "".join(
+            f'<Relationship Id="rIdSheet{n}" Type="{REL_WORKSHEET}" Target="worksheets/sheet{n}.xml"/>'
+            for n in range(1, len(sheets) + 1)
+        )
+        rels = re.sub(r'<Relationships([^>]*)>.*</Relationships>',
+                      lambda m: f'<Relationships{m.group(1)}>{kept}{sheet_rels}</Relationships>',
+                      rels, flags=re.S)
+        out.writestr(zip_entry("xl/_rels/workbook.xml.rels"), rels)
+
+        entries = "".join(
+            f'<sheet name="{escape(name, {chr(34): "&quot;"})}" sheetId="{n}" r:id="rIdSheet{n}"/>'
+            for n, (name, _) in enumerate(sheets, start=1)
+        )
+        workbook = base.read("xl/workbook.xml").decode("utf-8")
+        workbook = _SHEETS_BLOCK.sub(lambda _: f"<sheets>{entries}</sheets>", workbook)
+        out.writestr(zip_entry("xl/workbook.xml"), workbook)
+
+        for n, (_, sheet_xml) in enumerate(sheets, start=1):
+            out.writestr(zip_entry(f"xl/worksheets/sheet{n}.xml"), sheet_xml)
+
+        for info in base.infolist():
+            if info.filename in _REBUILT or info.filename in old_sheet_paths:
+                continue
+            if info.filename.startswith("xl/worksheets/_rels/"):
+                continue
+            data = base.read(info.filename)
+            if info.filename == CORE_PROPERTIES:
+                data = pin_doc_props(data)
+            out.writestr(zip_entry(info.filename), data)
+    return output.getvalue()
+
+
+def share_strings(package_bytes: bytes, encoding: str) -> bytes:
+    """Pasa a ``sharedStrings.xml`` las cadenas en línea de las columnas elegidas por ``encoding``"""
+    if encoding == STRINGS_INLINE:
+        return package_bytes
+    with zipfile.ZipFile(io.BytesIO(package_bytes)) as package:
+        if "xl/sharedStrings.xml" in package.namelist():
+            return package_bytes
+
+        table = SharedStringTable()
+        sheets = {}
+        for _, path in workbook_sheets(package):
+            xml = package.read(path).decode("utf-8")
+            samples = {}
+            for match in _INLINE_CELL.finditer(xml):
+                values = samples.setdefault(match.group(1), [])
+                if len(values) < SAMPLE_SIZE:
+                    values.append(match.group(5))
+            shared = shared_columns(encoding, samples)
+            if not shared:
+                continue
+
+            def replace(match):
+                if match.group(1) not in shared:
+                    return match.group(0)
+                index = table.add(match.group(5))
+                if index is None:
+                    return match.group(0)
+                return f'<c r="{match.group(1)}{match.group(2)}"{match.group(3)} t="s"{match.group(4)}><v>{index}</v></c>'
+            sheets[path] = _INLINE_CELL.sub(replace, xml)
+
+        if not len(table):
+            return package_bytes
+
+        output = io.BytesIO()
+        with zipfile.ZipFile(output, mode="w", compression=zipfile.ZIP_DEFLATED) as out:
+            for info in package.infolist():
+                data = package.read(info.filename)
+                if info.filename in sheets:
+                    data = sheets[info.filename].encode("utf-8")
+                elif info.filename == "[Content_Types].xml":
+                    data = data.decode("utf-8").replace(
+                        "</Types>",
+                        f'<Override PartName="/xl/sharedStrings.xml" ContentType="{SST_CONTENT_TYPE}"/></Types>'
+                    ).encode("utf-8")
+                elif info.filename == "xl/_rels/workbook.xml.rels":
+                    data = data.decode("utf-8").replace(
+                        "</Relationships>",
+                        f'<Relationship Id="rIdSharedStrings" Type="{SST_RELATIONSHIP}" '
+                        f'Target="sharedStrings.xml"/></Relationships>'
+                    ).encode("utf-8")
+                out.writestr(zip_entry(info.filename), data)
+            out.writestr(zip_entry("xl/sharedStrings.xml"), table.to_xml())
+        return output.getvalue()
@@ -50,6 +50,9 @@ echo "✅ Iniciando servidor en http://localhost:8001"
 echo "   Presiona Ctrl+C para detener el servidor"
 echo ""
 
+# Compilar las plantillas
+python3 template_artifacts.py || echo "⚠️  No se pudieron compilar las plantillas"
+
 # Iniciar el servidor
 python3 -m uvicorn main:app --host 0.0.0.0 --port 8001 --reload
 
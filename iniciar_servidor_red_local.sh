@@ -171,6 +171,7 @@ if [ ! -d "venv" ]; then
 else
     source venv/bin/activate
 fi
+python template_artifacts.py > /tmp/excel_templates.log 2>&1
 uvicorn main:app --host 0.0.0.0 --port $PORT_EXCEL > /tmp/excel_service.log 2>&1 &
 EXCEL_PID=$!
 echo -e "${GREEN}✅ Excel Service iniciado (PID: $EXCEL_PID)${NC}"
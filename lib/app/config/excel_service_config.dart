@@ -104,6 +104,17 @@ class ExcelServiceConfig {
   // UTILIDADES
   // ============================================
   
+  /// Encabezados de una solicitud de generación con el plazo del cliente
+  ///
+  /// El servicio deja de generar el archivo cuando vence `X-Deadline-Ms`, así el
+  /// reintento contra el servidor local no duplica el trabajo del primer intento.
+  static Map<String, String> requestHeaders(Duration timeout) {
+    return {
+      'Content-Type': 'application/json',
+      'X-Deadline-Ms': timeout.inMilliseconds.toString(),
+    };
+  }
+
   /// Verifica si la URL es de producción (HTTPS)
   static bool isProductionUrl(String url) {
     return url.startsWith('https://');
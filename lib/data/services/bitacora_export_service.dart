@@ -1,9 +1,9 @@
-import 'dart:convert';
 import 'package:flutter/foundation.dart' show kIsWeb;
 import 'package:http/http.dart' as http;
 import '../../app/config/excel_service_config.dart';
 import '../../core/utils/file_saver_helper.dart';
 import '../../core/utils/web_file_helper.dart' if (dart.library.io) '../../core/utils/web_file_helper_stub.dart';
+import 'excel_export_client.dart';
 import '../../domain/entities/bitacora_envio.dart';
 
 /// Servicio para exportar datos de bitácora de envíos a Excel
@@ -65,11 +65,7 @@ class BitacoraExportService {
       
       http.Response response;
       try {
-        response = await http.post(
-          url,
-          headers: {'Content-Type': 'application/json'},
-          body: jsonEncode(payload),
-        ).timeout(
+        response = await ExcelExportClient.post(url, payload, Duration(seconds: timeoutSeconds)).timeout(
           Duration(seconds: timeoutSeconds),
           onTimeout: () {
             throw Exception(
@@ -92,11 +88,7 @@ class BitacoraExportService {
           final localUri = Uri.parse('$localUrl/api/generate-bitacora-excel');
           print('🔗 Intentando con URL local: $localUrl');
           try {
-            response = await http.post(
-              localUri,
-              headers: {'Content-Type': 'application/json'},
-              body: jsonEncode(payload),
-            ).timeout(
+            response = await ExcelExportClient.post(localUri, payload, Duration(seconds: timeoutSeconds)).timeout(
               Duration(seconds: timeoutSeconds),
               onTimeout: () {
                 throw Exception(
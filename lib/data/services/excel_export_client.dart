@@ -0,0 +1,64 @@
+import 'dart:async';
+import 'dart:convert';
+import 'package:crypto/crypto.dart';
+import 'package:http/http.dart' as http;
+import '../../app/config/excel_service_config.dart';
+
+/// Envío de exportaciones al servicio de Excel sin volver a subir payloads repetidos
+///
+/// Primero se envía sólo el hash del payload (`X-Payload-Sha256`, sin cuerpo).
+/// Si el servicio ya generó ese archivo hoy o conserva el payload, responde
+/// directamente con el Excel; si responde 428 (o cualquier error, por ejemplo un
+/// servicio anterior a este protocolo), se repite la solicitud con el payload
+/// completo. Así reexportar el mismo año de bitácora casi no usa datos.
+class ExcelExportClient {
+  /// Encabezado con el sha256 (hex) de los bytes exactos del cuerpo
+  static const String payloadHashHeader = 'X-Payload-Sha256';
+
+  /// POST de una exportación con verificación previa del hash
+  static Future<http.Response> post(
+    Uri url,
+    Map<String, dynamic> payload,
+    Duration timeout,
+  ) async {
+    // Llaves ordenadas: el mismo payload produce siempre los mismos bytes y el mismo hash
+    final body = utf8.encode(jsonEncode(_canonical(payload)));
+    final digest = sha256.convert(body).toString();
+    final stopwatch = Stopwatch()..start();
+
+    final precheck = await http
+        .post(url, headers: _headers(timeout, digest))
+        .timeout(timeout);
+    if (precheck.statusCode >= 200 && precheck.statusCode < 300) {
+      return precheck;
+    }
+
+    // La subida sólo tiene lo que queda del plazo: el servidor no debe creer que tiene más tiempo
+    final remaining = timeout - stopwatch.elapsed;
+    if (remaining <= Duration.zero) {
+      throw TimeoutException('Excel export timed out before uploading the payload', timeout);
+    }
+    return http
+        .post(url, headers: _headers(remaining, digest), body: body)
+        .timeout(remaining);
+  }
+
+  static Map<String, String> _headers(Duration timeout, String digest) {
+    return {
+      ...ExcelServiceConfig.requestHeaders(timeout),
+      payloadHashHeader: digest,
+    };
+  }
+
+  static Object? _canonical(Object? value) {
+    if (value is Map) {
+      final entries = value.entries.toList()
+        ..sort((a, b) => a.key.toString().compareTo(b.key.toString()));
+      return {for (final entry in entries) entry.key.toString(): _canonical(entry.value)};
+    }
+    if (value is Iterable) {
+      return value.map(_canonical).toList();
+    }
+    return value;
+  }
+}
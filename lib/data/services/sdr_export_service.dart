@@ -1,4 +1,3 @@
-import 'dart:convert';
 import 'package:flutter/foundation.dart' show kIsWeb;
 import 'package:flutter/services.dart';
 import 'package:http/http.dart' as http;
@@ -6,11 +5,15 @@ import 'package:excel/excel.dart';
 import '../../app/config/excel_service_config.dart';
 import '../../core/utils/file_saver_helper.dart';
 import '../../core/utils/web_file_helper.dart' if (dart.library.io) '../../core/utils/web_file_helper_stub.dart';
+import 'excel_export_client.dart';
 
 /// Servicio para exportar datos SDR a Excel usando la plantilla
 class SdrExportService {
   /// Obtiene la URL del servicio según la plataforma (web/móvil)
   static String get _excelServiceUrl => ExcelServiceConfig.getServiceUrl();
+
+  /// Tiempo máximo de espera; también se envía al servicio como plazo (X-Deadline-Ms)
+  static const Duration _requestTimeout = Duration(seconds: 60);
   
   /// Exporta datos SDR a Excel usando la plantilla
   /// 
@@ -75,11 +78,7 @@ class SdrExportService {
       
       http.Response response;
       try {
-        response = await http.post(
-          url,
-          headers: {'Content-Type': 'application/json'},
-          body: jsonEncode(payload),
-        ).timeout(const Duration(seconds: 60));
+        response = await ExcelExportClient.post(url, payload, _requestTimeout).timeout(_requestTimeout);
       } on http.ClientException catch (e) {
         // Si el servidor de producción no está disponible, intentar con local como fallback
         if (_excelServiceUrl.contains('https://')) {
@@ -88,11 +87,7 @@ class SdrExportService {
           final localUri = Uri.parse('$localUrl/api/generate-sdr-excel');
           print('🔗 Intentando con URL local: $localUrl');
           try {
-            response = await http.post(
-              localUri,
-              headers: {'Content-Type': 'application/json'},
-              body: jsonEncode(payload),
-            ).timeout(const Duration(seconds: 60));
+            response = await ExcelExportClient.post(localUri, payload, _requestTimeout).timeout(_requestTimeout);
           } catch (e2) {
             // Si ambos fallan, usar método local con plantilla
             if (e2.toString().contains('Connection refused') || 
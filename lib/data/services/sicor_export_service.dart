@@ -1,14 +1,17 @@
-import 'dart:convert';
 import 'package:flutter/foundation.dart' show kIsWeb;
 import 'package:http/http.dart' as http;
 import '../../app/config/excel_service_config.dart';
 import '../../core/utils/file_saver_helper.dart';
 import '../../core/utils/web_file_helper.dart' if (dart.library.io) '../../core/utils/web_file_helper_stub.dart';
+import 'excel_export_client.dart';
 
 /// Servicio para exportar datos de tarjetas de red (SICOR) a Excel
 class SicorExportService {
   /// Obtiene la URL del servicio según la plataforma (web/móvil)
   static String get _excelServiceUrl => ExcelServiceConfig.getServiceUrl();
+
+  /// Tiempo máximo de espera; también se envía al servicio como plazo (X-Deadline-Ms)
+  static const Duration _requestTimeout = Duration(seconds: 60);
   
   /// Exporta datos de tarjetas de red a Excel
   /// 
@@ -40,11 +43,7 @@ class SicorExportService {
       
       http.Response response;
       try {
-        response = await http.post(
-          url,
-          headers: {'Content-Type': 'application/json'},
-          body: jsonEncode(payload),
-        ).timeout(const Duration(seconds: 60));
+        response = await ExcelExportClient.post(url, payload, _requestTimeout).timeout(_requestTimeout);
       } on http.ClientException catch (e) {
         // Si el servidor de producción no está disponible, intentar con local como fallback
         if (_excelServiceUrl.contains('https://')) {
@@ -53,11 +52,7 @@ class SicorExportService {
           final localUri = Uri.parse('$localUrl/api/generate-sicor-excel');
           print('🔗 Intentando con URL local: $localUrl');
           try {
-            response = await http.post(
-              localUri,
-              headers: {'Content-Type': 'application/json'},
-              body: jsonEncode(payload),
-            ).timeout(const Duration(seconds: 60));
+            response = await ExcelExportClient.post(localUri, payload, _requestTimeout).timeout(_requestTimeout);
           } catch (e2) {
             throw Exception(
               'Error al conectar con el servicio de Excel.\n\n'